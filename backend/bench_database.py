@@ -0,0 +1,130 @@
+"""
+Benchmark: default SQLite engine vs the tuned engine from database.py.
+
+For each engine, on a throwaway database:
+  - writes: single-row Interaction inserts, one commit each (the pattern
+    the request path used to follow)
+  - mixed: reader threads doing point lookups by id while one thread keeps
+    committing inserts, which is where WAL stops readers waiting on the
+    writer
+  - async reads: the same point lookups through the AsyncSession path,
+    issued concurrently from one event loop
+
+Run from the project root:
+    python backend/bench_database.py
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, FAQ, Interaction, make_engine, make_async_engine
+
+WRITES = 2000
+SEED_FAQS = 5000
+READERS = 4
+READS_PER_READER = 2000
+ASYNC_READS = 2000
+ASYNC_CONCURRENCY = 16
+
+
+def write_rate(Session) -> float:
+    start = time.perf_counter()
+    for i in range(WRITES):
+        db = Session()
+        db.add(Interaction(user_text=f"q{i}", bot_response="a", response_time_ms=float(i)))
+        db.commit()
+        db.close()
+    return WRITES / (time.perf_counter() - start)
+
+
+def mixed_read_rate(Session) -> float:
+    stop = threading.Event()
+
+    def writer():
+        db = Session()
+        i = 0
+        while not stop.is_set():
+            db.add(Interaction(user_text=f"m{i}", bot_response="a", response_time_ms=1.0))
+            db.commit()
+            i += 1
+        db.close()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        db = Session()
+        for _ in range(READS_PER_READER):
+            db.get(FAQ, rng.randint(1, SEED_FAQS))
+            db.expunge_all()
+        db.close()
+
+    write_thread = threading.Thread(target=writer)
+    write_thread.start()
+    readers = [threading.Thread(target=reader, args=(n,)) for n in range(READERS)]
+    start = time.perf_counter()
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    write_thread.join()
+    return READERS * READS_PER_READER / elapsed
+
+
+async def async_read_rate(url: str, tuned: bool) -> float:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    engine = make_async_engine(url, tuned=tuned)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    rng = random.Random(0)
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    async def lookup(faq_id):
+        async with semaphore, Session() as db:
+            await db.execute(select(FAQ).where(FAQ.id == faq_id))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(lookup(rng.randint(1, SEED_FAQS)) for _ in range(ASYNC_READS)))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return ASYNC_READS / elapsed
+
+
+def run(label: str, tuned: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = make_engine(url, tuned=tuned)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        db.bulk_insert_mappings(FAQ, [{"question": f"question {i}", "answer": f"answer {i}"}
+                                      for i in range(SEED_FAQS)])
+        db.commit()
+        db.close()
+
+        writes = write_rate(Session)
+        mixed = mixed_read_rate(Session)
+        engine.dispose()
+        async_reads = asyncio.run(async_read_rate(f"sqlite+aiosqlite:///{tmp}/bench.db", tuned))
+
+    print(f"{label:>8} | writes {writes:9.0f} commits/s | "
+          f"reads under write load {mixed:9.0f} /s | async reads {async_reads:8.0f} /s")
+    return writes, mixed
+
+
+if __name__ == "__main__":
+    base_writes, base_mixed = run("default", tuned=False)
+    tuned_writes, tuned_mixed = run("tuned", tuned=True)
+    print(f"write speedup {tuned_writes / base_writes:.1f}x, "
+          f"read-under-write speedup {tuned_mixed / base_mixed:.1f}x")
@@ -0,0 +1,96 @@
+"""
+Benchmark: legacy word-overlap FAQ scan vs the BM25 inverted index.
+
+Builds throwaway SQLite databases with 20, 10k and 100k synthetic FAQs and
+times both matchers on the same queries. The legacy timing includes the
+`db.query(FAQ).all()` table read it performs on every request.
+
+Run from the project root:
+    python backend/bench_faq_index.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, FAQ
+from backend.services.faq_index import FAQIndex
+
+SIZES = [20, 10_000, 100_000]
+QUERIES_PER_SIZE = 20
+WORDS = [f"w{i}" for i in range(5000)] + [
+    "account", "balance", "transfer", "password", "card", "loan", "deposit",
+    "hours", "fees", "rates", "support", "mobile", "app", "check", "limit",
+]
+
+
+def legacy_match(db, user_text):
+    """The matcher query_database used before the index."""
+    text_lower = user_text.lower()
+    faqs = db.query(FAQ).all()
+    best_match = None
+    best_score = 0
+    for faq in faqs:
+        faq_words = set(faq.question.lower().split())
+        user_words = set(text_lower.split())
+        score = len(faq_words.intersection(user_words))
+        if score > best_score and score >= 2:
+            best_score = score
+            best_match = faq
+    return best_match
+
+
+def make_questions(n, rng):
+    questions = set()
+    while len(questions) < n:
+        questions.add(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 9))))
+    return list(questions)
+
+
+def run(n):
+    rng = random.Random(n)
+    questions = make_questions(n, rng)
+    queries = [" ".join(rng.sample(q.split(), 3)) + " please" for q in rng.sample(questions, QUERIES_PER_SIZE)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        db.bulk_insert_mappings(FAQ, [{"question": q, "answer": f"answer {i}"} for i, q in enumerate(questions)])
+        db.commit()
+
+        start = time.perf_counter()
+        for q in queries:
+            legacy_match(db, q)
+        legacy_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        start = time.perf_counter()
+        index = FAQIndex()
+        index.build(db.query(FAQ.id, FAQ.question, FAQ.answer).all())
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for q in queries:
+            index.search(q, limit=1)
+        index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        db.close()
+        engine.dispose()
+
+    print(f"{n:>8} FAQs | legacy scan {legacy_ms:10.3f} ms/query | "
+          f"index {index_ms:8.3f} ms/query | index build {build_ms:9.1f} ms | "
+          f"speedup {legacy_ms / index_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        run(size)
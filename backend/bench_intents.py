@@ -0,0 +1,132 @@
+"""
+Benchmark: routing accuracy and latency of the intent router.
+
+Seeds a throwaway database with the standard FAQs, then routes a labeled
+set of utterances that are not in the training data (paraphrases of the
+FAQs, account requests, small talk and general questions) two ways:
+
+  - legacy: the keyword scan query_database used (any "account" or
+    "balance" -> account lookup), then the FAQ lookup (BM25, then
+    vectors), else the LLM; canned replies were only reached after the
+    LLM failed
+  - router: the intent router (patterns, then the classifier)
+
+and reports per-intent accuracy for both, plus the router's training time
+and per-request latency on the pattern and classifier paths.
+
+Run from the project root:
+    python backend/bench_intents.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/bench.db"
+
+import seed_db  # noqa: E402  (creates the tables in the throwaway database)
+from backend.services.faq_index import match_faq  # noqa: E402
+from backend.services.faq_vectors import match_faq_vector  # noqa: E402
+from backend.services.intents import IntentRouter  # noqa: E402
+
+LEGACY_ACCOUNT_KEYWORDS = ["account", "balance", "my account", "account details", "account info"]
+
+LABELED = {
+    "account": [
+        "what's my balance", "how much money do I have right now", "can you tell me my account number",
+        "read me my account details please", "how much is in my savings", "give me my balance",
+        "what is the current balance on my account", "is my account still active",
+        "what email address do you have for me", "what kind of account do I have",
+        "balance", "tell me how much money I have",
+    ],
+    "faq": [
+        "how do I open an account", "I want to close my account", "what fees do accounts have",
+        "when are you open", "how can I reach customer service", "I forgot my password",
+        "my card was stolen", "how long does a wire transfer take", "what's the daily transfer limit",
+        "I want to dispute a charge", "can I get a loan", "what are your mortgage interest rates",
+        "where do I get the mobile app", "can I deposit a check with my phone",
+        "do you have investment services", "how do I set up direct deposit for my paycheck",
+        "is my personal information safe with you", "what services does the bank offer",
+        "I lost my debit card", "what's the phone number for support",
+    ],
+    "rule": [
+        "hello", "hi there", "good morning", "thanks so much", "thank you", "bye",
+        "goodbye", "that's all, thanks", "help", "what can you do", "who are you",
+    ],
+    "llm": [
+        "tell me a joke about money", "what is the stock market", "how do I make a monthly budget",
+        "explain what a certificate of deposit is", "what counts as a good credit score",
+        "should I rent or buy a home", "what will the weather be tomorrow",
+        "what's the difference between debit and credit cards", "write a short poem",
+        "how are taxes calculated on savings interest", "what is a hedge fund",
+        "how do I start investing with little money",
+    ],
+}
+
+
+def legacy_route(text: str) -> str:
+    text_lower = text.lower()
+    if any(keyword in text_lower for keyword in LEGACY_ACCOUNT_KEYWORDS):
+        return "account"
+    if match_faq(text) is not None or match_faq_vector(text) is not None:
+        return "faq"
+    return "llm"
+
+
+def accuracy(route_fn) -> dict:
+    scores = {}
+    for label, utterances in LABELED.items():
+        correct = sum(route_fn(text) == label for text in utterances)
+        scores[label] = (correct, len(utterances))
+    return scores
+
+
+def time_routes(router, utterances, repeats: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in utterances:
+            router.route(text)
+    return (time.perf_counter() - start) * 1e6 / (repeats * len(utterances))
+
+
+def main():
+    seed_db.seed_data()
+    router = IntentRouter()
+
+    start = time.perf_counter()
+    router.warm()
+    train_ms = (time.perf_counter() - start) * 1000
+
+    legacy = accuracy(legacy_route)
+    routed = accuracy(lambda text: router.route(text).intent)
+    print(f"{'intent':>8} | {'legacy':>12} | {'router':>12}")
+    for label in LABELED:
+        lc, n = legacy[label]
+        rc, _ = routed[label]
+        print(f"{label:>8} | {lc:>5}/{n:<3} {lc / n:4.0%} | {rc:>5}/{n:<3} {rc / n:4.0%}")
+    total = sum(n for _, n in legacy.values())
+    print(f"{'overall':>8} | {sum(c for c, _ in legacy.values()) / total:12.0%} | "
+          f"{sum(c for c, _ in routed.values()) / total:12.0%}")
+
+    misrouted = [(text, label, router.route(text)) for label, utterances in LABELED.items()
+                 for text in utterances if router.route(text).intent != label]
+    for text, label, route in misrouted:
+        print(f"  router: {text!r} -> {route.intent} ({route.method}, {route.confidence}; expected {label})")
+
+    by_method = {"pattern": [], "classifier": []}
+    for utterances in LABELED.values():
+        for text in utterances:
+            by_method[router.route(text).method].append(text)
+    print(f"classifier training: {train_ms:.1f} ms")
+    for method, utterances in by_method.items():
+        if utterances:
+            print(f"{method:>10} path: {time_routes(router, utterances):7.1f} us/route ({len(utterances)} utterances)")
+
+
+if __name__ == "__main__":
+    main()
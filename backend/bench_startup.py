@@ -0,0 +1,123 @@
+"""
+Benchmark: import time and cold start of the app.
+
+Each run starts a fresh interpreter (as an autoscaled instance does) with
+a throwaway database and measures:
+
+  - import: `import main`
+  - ready: process start until the lifespan startup has finished and the
+    app would take its first request
+  - first use: the first openai_client() call after that
+
+in three modes:
+
+  - eager: every provider is built during startup, before ready, which is
+    what importing the services used to do (SDK imports, three OpenAI
+    clients)
+  - lazy: providers are built by the first request that needs them
+  - warm: lazy, plus the background warm-up the app runs by default
+    (PROVIDERS_WARM=true); first use waits for it if it is still running
+
+and then lists the slowest imports of `import main` (python -X importtime).
+
+Run from the project root:
+    python backend/bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, os, sys, time
+start = time.perf_counter()
+import main
+from backend.services.providers import openai_client, providers
+imported = time.perf_counter()
+mode = sys.argv[1]
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        if mode == "eager":
+            providers.warm()
+        ready = time.perf_counter()
+        openai_client()
+        first_use = time.perf_counter()
+    return ready, first_use
+
+ready, first_use = asyncio.run(run())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_use_ms": (first_use - ready) * 1000,
+    "ready_at": time.time() - (time.perf_counter() - ready),
+}))
+"""
+
+
+def child_env(tmp: str, warm: bool) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env.update(
+        PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "backend")]),
+        DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench.db"),
+        PROVIDERS_WARM="true" if warm else "false",
+        FAQ_RETRIEVAL="bm25",
+    )
+    return env
+
+
+def run_once(mode: str, tmp: str) -> dict:
+    env = child_env(tmp, warm=mode == "warm")
+    launched = time.time()
+    result = subprocess.run([sys.executable, "-c", CHILD, mode], cwd=tmp, env=env,
+                            capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["ready_ms"] = (report.pop("ready_at") - launched) * 1000
+    return report
+
+
+def slowest_imports(tmp: str, count: int = 12) -> list:
+    env = child_env(tmp, warm=False)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=tmp, env=env,
+                            capture_output=True, text=True, timeout=300)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Modules main imports directly (one level of indent under it)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{runs} cold starts per mode; medians in ms")
+    print(f"{'mode':>6} {'import':>8} {'ready':>8} {'first use':>10}")
+    for mode in ("eager", "lazy", "warm"):
+        reports = []
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as tmp:
+                reports.append(run_once(mode, tmp))
+        median = {key: statistics.median(r[key] for r in reports) for key in reports[0]}
+        print(f"{mode:>6} {median['import_ms']:>8.0f} {median['ready_ms']:>8.0f} {median['first_use_ms']:>10.1f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("\nslowest imports of `import main` (cumulative ms):")
+        for cumulative_us, name in slowest_imports(tmp):
+            print(f"{cumulative_us / 1000:>8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: normalizing uploads ahead of STT.
+
+Generates 48 kHz stereo WAV clips (what browsers record) and converts each
+to the 16 kHz mono WAV the STT backends take, three ways:
+
+  - pydub: the per-request conversion transcribe_google used (one ffmpeg
+    process per upload, output left at the input rate); skipped when
+    pydub or ffmpeg is missing
+  - inline: transcode.normalize() in this process
+  - pool: Transcoder.normalize_stream() on the warm worker pool, fed from
+    a thread per worker as the app's request threads would
+
+and reports clips/s, seconds of audio processed per second, and how many
+bytes each upload shrinks to.
+
+Run from the project root:
+    python backend/bench_transcode.py [clips] [seconds per clip]
+"""
+
+import io
+import os
+import shutil
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.endpointing import pcm_to_wav  # noqa: E402
+from backend.services.transcode import Transcoder, normalize  # noqa: E402
+
+
+def make_clip(seconds: float, rate: int = 48000, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * seconds)) / rate
+    speechlike = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    stereo = np.stack([speechlike + 0.01 * rng.standard_normal(len(t))] * 2, axis=1)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((stereo * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def pydub_convert(data: bytes) -> bytes:
+    from backend.services.audio_io import to_wav_buffer
+    return to_wav_buffer(io.BytesIO(data), "wav").getvalue()
+
+
+def report(name: str, clips: list, seconds: float, elapsed: float, out_bytes: int):
+    in_bytes = len(clips[0])
+    print(f"{name:>8}: {len(clips) / elapsed:8.1f} clips/s  {len(clips) * seconds / elapsed:8.0f} audio-s/s  "
+          f"{in_bytes} -> {out_bytes} bytes ({out_bytes / in_bytes:.0%})")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    clips = [make_clip(seconds, seed=i) for i in range(count)]
+    print(f"{count} clips of {seconds:.0f} s, 48 kHz stereo; {os.cpu_count()} CPUs")
+
+    has_pydub = shutil.which("ffmpeg") is not None
+    if has_pydub:
+        try:
+            import pydub  # noqa: F401
+        except ImportError:
+            has_pydub = False
+    if has_pydub:
+        start = time.perf_counter()
+        out = [pydub_convert(clip) for clip in clips]
+        report("pydub", clips, seconds, time.perf_counter() - start, len(out[0]))
+    else:
+        print("   pydub: skipped (pydub or ffmpeg not installed)")
+
+    start = time.perf_counter()
+    out = [normalize(clip, "wav") for clip in clips]
+    report("inline", clips, seconds, time.perf_counter() - start, len(out[0]["wav"]))
+
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        transcoder = Transcoder(workers=workers)
+        start = time.perf_counter()
+        transcoder.start()
+        warm_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            out = list(threads.map(lambda clip: transcoder.normalize_stream(io.BytesIO(clip), "wav"), clips))
+        elapsed = time.perf_counter() - start
+        transcoder.shutdown()
+        report(f"pool x{workers}", clips, seconds, elapsed, len(out[0]["wav"]))
+        print(f"{'':>10}pool start-up {warm_ms:.0f} ms (paid once, at app start)")
+
+    pcm_bytes = len(pcm_to_wav(b"\0\0" * int(16000 * seconds), 16000))
+    print(f"16 kHz mono WAV is {pcm_bytes} bytes; STT_UPLOAD_FORMAT=opus shrinks it further (needs ffmpeg)")
+
+
+if __name__ == "__main__":
+    main()
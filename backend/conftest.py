@@ -0,0 +1,38 @@
+"""
+Shared test setup: import paths and a throwaway database.
+
+The tests import both `main` and `backend.services` (from the repository
+root) and `database` (from backend/), so both directories go on sys.path
+whether pytest is run from the root or from backend/. DATABASE_URL points
+at a temporary SQLite file before `database` is first imported, so a test
+run never writes voicebot.db (or the FAQ vectors next to it) into the tree.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+for path in (BACKEND_DIR, ROOT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+_DB_DIR = tempfile.mkdtemp(prefix="voicebot-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'voicebot.db')}"
+os.environ.pop("DATABASE_ASYNC_URL", None)
+os.environ.pop("FAQ_VECTOR_PATH", None)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """Tables of the temporary database, removed with it after the run."""
+    from database import engine, init_db
+
+    init_db()
+    yield
+    engine.dispose()
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
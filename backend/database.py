@@ -1,12 +1,96 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+import os
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Float, DateTime
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
-URL_DATABASE = "sqlite:///./voicebot.db"
+URL_DATABASE = os.getenv("DATABASE_URL", "sqlite:///./voicebot.db")
 
-engine = create_engine(URL_DATABASE, connect_args={"check_same_thread": False})
+# SQLite tuning: WAL lets readers run alongside the writer, NORMAL only
+# fsyncs at checkpoints (safe in WAL mode), and reads go through mmap and a
+# larger page cache
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_MB", "256")) * 1024 * 1024,
+    "cache_size": -int(os.getenv("SQLITE_CACHE_MB", "64")) * 1024,  # negative = KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+# Async drivers for each sync dialect
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def _is_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def _engine_options(url) -> dict:
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    if not _is_memory(url):
+        # In-memory SQLite uses a single shared connection instead of a pool
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "10"))
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        options["pool_timeout"] = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        options["pool_pre_ping"] = url.get_backend_name() != "sqlite"
+    return options
+
+def make_engine(url: str = URL_DATABASE, tuned: bool = True):
+    """
+    Sync engine for `url` with pooling from DB_POOL_* and, for SQLite, the
+    pragmas above applied to every new connection (unless `tuned` is False).
+    """
+    url = make_url(url)
+    engine = create_engine(url, **_engine_options(url))
+    if tuned and url.get_backend_name() == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+def async_url(url: str = URL_DATABASE) -> str:
+    """The async-driver form of `url` (DATABASE_ASYNC_URL overrides it)."""
+    override = os.getenv("DATABASE_ASYNC_URL")
+    if override:
+        return override
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False) if driver else str(url)
+
+def make_async_engine(url: str = None, tuned: bool = True):
+    """Async engine for the same database; needs the async driver installed."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(url or async_url())
+    engine = create_async_engine(url, **_engine_options(url))
+    if tuned and url.get_backend_name() == "sqlite":
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+except ImportError as e:
+    # Async driver (e.g. aiosqlite) not installed: only the sync path is available
+    print(f"DEBUG: Async database engine unavailable: {e}")
+    async_engine = None
+    AsyncSessionLocal = None
+
 Base = declarative_base()
 
 class Interaction(Base):
@@ -16,6 +100,33 @@ class Interaction(Base):
     bot_response = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
     response_time_ms = Column(Float)
+    # Per-stage breakdown: endpoint, stage timings and who served each stage
+    endpoint = Column(String)
+    stt_ms = Column(Float)
+    nlu_ms = Column(Float)
+    tts_ms = Column(Float)
+    stt_provider = Column(String)
+    nlu_source = Column(String)  # faq, account, gpt, ollama or rules
+    tts_provider = Column(String)
+
+class LatencyRollup(Base):
+    """Response time sketch for one minute, one hour or all time (see latency_stats.py)"""
+    __tablename__ = "latency_rollups"
+    period = Column(String, primary_key=True)  # minute, hour or all
+    start = Column(Integer, primary_key=True)  # minutes/hours since the epoch; 0 for all
+    count = Column(Integer, nullable=False)
+    zero_count = Column(Integer, nullable=False)
+    total_ms = Column(Float, nullable=False)
+    min_ms = Column(Float)
+    max_ms = Column(Float)
+
+class LatencyRollupBin(Base):
+    """Count of one quantile sketch bucket of a LatencyRollup"""
+    __tablename__ = "latency_rollup_bins"
+    period = Column(String, primary_key=True)
+    start = Column(Integer, primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False)
 
 class FAQ(Base):
     __tablename__ = "faqs"
@@ -34,4 +145,64 @@ class Account(Base):
     account_type = Column(String)  # e.g., "Savings", "Checking"
     status = Column(String)
 
-Base.metadata.create_all(bind=engine)
+def migrate(bind=engine):
+    """
+    Add columns introduced after a table was first created. create_all only
+    creates missing tables, so existing databases get new nullable columns
+    here.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"DEBUG: Added column {table.name}.{column.name}")
+
+# Full-text index over FAQs (SQLite FTS5), an external-content table kept in
+# sync with faqs by triggers
+FAQ_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS faqs_fts USING fts5(
+        question, answer, content='faqs', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS faqs_fts_insert AFTER INSERT ON faqs BEGIN
+        INSERT INTO faqs_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS faqs_fts_delete AFTER DELETE ON faqs BEGIN
+        INSERT INTO faqs_fts(faqs_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS faqs_fts_update AFTER UPDATE ON faqs BEGIN
+        INSERT INTO faqs_fts(faqs_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO faqs_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+]
+
+def create_faq_fts(bind=engine) -> bool:
+    """
+    Create the FAQ full-text index and its triggers, and fill it if it is
+    new. Returns False when the database is not SQLite or lacks FTS5.
+    """
+    if bind.dialect.name != "sqlite":
+        return False
+    try:
+        with bind.begin() as conn:
+            is_new = not inspect(conn).has_table("faqs_fts")
+            for statement in FAQ_FTS_DDL:
+                conn.execute(text(statement))
+            if is_new:
+                conn.execute(text("INSERT INTO faqs_fts(faqs_fts) VALUES ('rebuild')"))
+        return True
+    except Exception as e:
+        print(f"DEBUG: FAQ full-text index unavailable: {e}")
+        return False
+
+def init_db(bind=engine):
+    """Create missing tables and columns. Called on startup, not on import."""
+    Base.metadata.create_all(bind=bind)
+    migrate(bind)
+    create_faq_fts(bind)
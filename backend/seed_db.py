@@ -1,7 +1,7 @@
-from database import SessionLocal, FAQ, Account, engine, Base
+from database import SessionLocal, FAQ, Account, init_db
 
 # Ensure tables exist
-Base.metadata.create_all(bind=engine)
+init_db()
 
 def seed_data():
     db = SessionLocal()
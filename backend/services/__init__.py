@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# Load .env once, before any service module reads its settings
+load_dotenv()
@@ -0,0 +1,237 @@
+"""
+Lifecycle and HTTP caching of the generated audio under static/audio.
+
+- AudioJanitor: a background thread that sweeps the audio directory every
+  few minutes with a single os.scandir pass (no per-file stat calls beyond
+  what scandir already returns). Clips older than the TTL are deleted,
+  then the oldest clips until the directory is under its disk quota, and
+  temporary files left behind by interrupted syntheses. A clip younger
+  than `min_age_s` is never deleted, so a URL just handed to a client
+  stays valid long enough to be fetched.
+- AudioStaticFiles: StaticFiles for the audio. Uncached clips are renamed
+  to a hash of their bytes (rename_to_content_hash), so such a name never
+  changes meaning and is served with a year-long `Cache-Control:
+  immutable`. Clips from the TTS cache are named by a hash of the *input*
+  (text, provider, voice, format; see tts_cache.py), and re-synthesizing
+  one can change its bytes under the same name, so those must be
+  revalidated. Which is which is checked against the bytes, and the ETag
+  is always derived from them. Range requests are answered by Starlette's
+  FileResponse.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.datastructures import Headers
+
+_HASHED_NAME_RE = re.compile(r"^[0-9a-f]{64}\.\w+$")
+_TMP_SUFFIX = ".tmp"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Cacheable, but checked with the ETag before every reuse
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Content hashes of served clips, keyed by (path, size, mtime)
+_DIGEST_CACHE_SIZE = 4096
+
+
+def is_content_addressed(name: str) -> bool:
+    """Whether `name` looks like a hash (of the bytes, or of a TTS cache key)."""
+    return bool(_HASHED_NAME_RE.match(name))
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rename_to_content_hash(path: str) -> str:
+    """
+    Move a freshly written clip to a name derived from its bytes and return
+    the new path. If that clip already exists, the duplicate is dropped.
+    """
+    extension = os.path.splitext(path)[1]
+    target = os.path.join(os.path.dirname(path), content_hash(path) + extension)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.replace(path, target)
+    return target
+
+
+class AudioJanitor:
+    """
+    Deletes clips in `directory` older than `ttl_s`, then oldest first while
+    the directory holds more than `max_bytes`. `on_delete(name)` is called
+    for every removed clip (the TTS cache uses it to forget the entry).
+    """
+
+    def __init__(self, directory: str, ttl_s: float, max_bytes: int, interval_s: float = 300,
+                 min_age_s: float = 300, tmp_ttl_s: float = 3600, on_delete=None):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.interval_s = interval_s
+        self.min_age_s = min_age_s
+        self.tmp_ttl_s = tmp_ttl_s
+        self.on_delete = on_delete
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.sweeps = 0
+        self.expired = 0
+        self.evicted = 0
+        self.tmp_removed = 0
+        self.bytes_freed = 0
+        self.last_sweep = None
+
+    def _remove(self, name: str, size: int) -> bool:
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"DEBUG: Could not delete audio file {name}: {e}")
+            return False
+        self.bytes_freed += size
+        if self.on_delete is not None and not name.endswith(_TMP_SUFFIX):
+            self.on_delete(name)
+        return True
+
+    def sweep(self) -> dict:
+        """One pass over the directory. Returns what it found and removed."""
+        with self._lock:
+            now = time.time()
+            clips = []   # (mtime, name, size)
+            expired = tmp_removed = 0
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                        age = now - stat.st_mtime
+                        if entry.name.endswith(_TMP_SUFFIX):
+                            # Left behind by a synthesis that never finished
+                            if age > self.tmp_ttl_s and self._remove(entry.name, stat.st_size):
+                                tmp_removed += 1
+                        elif age > self.ttl_s and age > self.min_age_s:
+                            if self._remove(entry.name, stat.st_size):
+                                expired += 1
+                        else:
+                            clips.append((stat.st_mtime, entry.name, stat.st_size))
+            except FileNotFoundError:
+                clips = []
+
+            total = sum(size for _, _, size in clips)
+            evicted = 0
+            if total > self.max_bytes:
+                clips.sort()
+                for mtime, name, size in clips:
+                    if total <= self.max_bytes or now - mtime < self.min_age_s:
+                        break
+                    if self._remove(name, size):
+                        evicted += 1
+                    total -= size
+
+            self.sweeps += 1
+            self.expired += expired
+            self.evicted += evicted
+            self.tmp_removed += tmp_removed
+            self.last_sweep = {
+                "at": now,
+                "duration_ms": round((time.time() - now) * 1000, 2),
+                "files": len(clips) - evicted,
+                "bytes": total,
+                "expired": expired,
+                "evicted": evicted,
+                "tmp_removed": tmp_removed,
+            }
+            return self.last_sweep
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"DEBUG: Audio janitor sweep failed: {e}")
+            self._stop.wait(self.interval_s)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audio-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "ttl_s": self.ttl_s,
+            "max_bytes": self.max_bytes,
+            "interval_s": self.interval_s,
+            "sweeps": self.sweeps,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "tmp_removed": self.tmp_removed,
+            "bytes_freed": self.bytes_freed,
+            "last_sweep": self.last_sweep,
+        }
+
+
+class AudioStaticFiles(StaticFiles):
+    """
+    StaticFiles that marks clips named by the hash of their bytes as
+    immutable, and gives every hashed clip an ETag from its bytes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._digests = OrderedDict()
+        self._digests_lock = threading.Lock()
+
+    def _content_hash(self, full_path, stat_result) -> str:
+        key = (full_path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self._digests_lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+        digest = content_hash(full_path)
+        with self._digests_lock:
+            self._digests[key] = digest
+            while len(self._digests) > _DIGEST_CACHE_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        name = os.path.basename(full_path)
+        if not is_content_addressed(name):
+            return super().file_response(full_path, stat_result, scope, status_code)
+        digest = self._content_hash(full_path, stat_result)
+        immutable = digest == name.split(".")[0]
+        headers = {
+            "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            # From the bytes: a cache hit touching the mtime must not change
+            # the tag, a re-synthesized clip must
+            "etag": f'"{digest[:32]}-{stat_result.st_size}"',
+        }
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
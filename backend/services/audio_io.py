@@ -0,0 +1,135 @@
+"""
+In-memory audio ingestion helpers.
+
+Uploads are handed to the STT providers as file objects instead of being
+copied into temp files in the working directory. The container format is
+sniffed from the first bytes so providers that care about it (Whisper
+infers it from the file name, speech_recognition needs WAV/AIFF/FLAC) get
+the right hint.
+"""
+
+import io
+import os
+
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+# Uploads larger than this spill from memory to a temporary file
+AUDIO_SPOOL_MAX_BYTES = int(os.getenv("AUDIO_SPOOL_MAX_BYTES", str(10 * 1024 * 1024)))
+# Larger uploads are refused (Whisper takes at most 25 MB)
+AUDIO_UPLOAD_MAX_BYTES = int(os.getenv("AUDIO_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+
+SNIFF_BYTES = 16
+
+# Formats speech_recognition.AudioFile can read without conversion
+NATIVE_SR_FORMATS = ("wav", "flac", "aiff")
+
+CONTENT_TYPES = {
+    "wav": "audio/wav",
+    "webm": "audio/webm",
+    "ogg": "audio/ogg",
+    "flac": "audio/flac",
+    "mp3": "audio/mpeg",
+    "mp4": "audio/mp4",
+    "aiff": "audio/aiff",
+}
+
+
+class UploadTooLarge(Exception):
+    """The request body is larger than the upload limit."""
+
+
+class AudioUploadParser(MultiPartParser):
+    """
+    Multipart parser for audio uploads: the file stays in memory up to
+    AUDIO_SPOOL_MAX_BYTES. A subclass, so other forms keep Starlette's default.
+    """
+    spool_max_size = AUDIO_SPOOL_MAX_BYTES
+
+
+async def _limited(stream, max_bytes: int):
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        yield chunk
+
+
+async def read_audio_upload(request, field: str = "file", max_bytes: int = None):
+    """
+    The UploadFile in `field` of a multipart request, read through
+    AudioUploadParser. Raises UploadTooLarge past `max_bytes` (default
+    AUDIO_UPLOAD_MAX_BYTES), ValueError if the body is not a multipart
+    form with that file.
+    """
+    max_bytes = AUDIO_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise ValueError("Expected a multipart/form-data upload")
+    parser = AudioUploadParser(request.headers, _limited(request.stream(), max_bytes))
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise ValueError(e.message)
+    upload = form.get(field)
+    if upload is None or isinstance(upload, str):
+        await form.close()
+        raise ValueError(f"Missing file field '{field}'")
+    return upload
+
+
+def sniff_format(head: bytes):
+    """
+    Guess the audio container from its leading bytes.
+    Returns a short format name such as "wav" or "webm", or None if unknown.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"  # EBML header: WebM / Matroska
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+def sniff_stream(fileobj):
+    """Sniff the format of a seekable binary stream, leaving it at offset 0."""
+    fileobj.seek(0)
+    head = fileobj.read(SNIFF_BYTES)
+    fileobj.seek(0)
+    return sniff_format(head)
+
+
+def as_named_upload(fileobj, audio_format):
+    """
+    (filename, file, content_type) tuple for multipart uploads. Whisper
+    infers the container from the file name extension.
+    """
+    fileobj.seek(0)
+    ext = audio_format or "wav"
+    return (f"audio.{ext}", fileobj, CONTENT_TYPES.get(ext, "application/octet-stream"))
+
+
+def to_wav_buffer(fileobj, audio_format):
+    """
+    Decode any ffmpeg-readable stream into an in-memory WAV buffer.
+    The input is piped to ffmpeg, so no intermediate file is written.
+    """
+    from pydub import AudioSegment
+
+    fileobj.seek(0)
+    sound = AudioSegment.from_file(fileobj, format=audio_format)
+    out = io.BytesIO()
+    sound.export(out, format="wav")
+    out.seek(0)
+    return out
@@ -0,0 +1,179 @@
+"""
+Per-request deadline budget for the STT -> NLU -> TTS pipeline.
+
+Each API request starts a Deadline, like its RequestTrace, in a context
+variable. The stage pools and the LLM hedger copy the context into their
+worker threads, so every provider call can size its own timeout from the
+time that is left without any change to the services' signatures.
+
+The budget comes from the endpoint's configuration (DEADLINE_MS, or
+DEADLINE_<ENDPOINT>_MS such as DEADLINE_PROCESS_AUDIO_MS), and a client may
+ask for a different one with the X-Deadline-Ms header, within
+[DEADLINE_MIN_MS, DEADLINE_MAX_MS].
+
+A stage does not get all that is left: it keeps back a reserve for the
+stages after it (DEADLINE_RESERVE_NLU_MS, DEADLINE_RESERVE_TTS_MS, at most
+half of a short budget), so a slow transcription cannot leave nothing for
+the reply. A provider or LLM
+call that would get less than DEADLINE_MIN_CALL_MS is not started.
+Instead the stage degrades: the NLU answers with a canned reply, and TTS
+returns no audio so the reply goes out as text only.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+
+from backend.services.metrics import record_degraded
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+DEFAULT_BUDGET_MS = float(os.getenv("DEADLINE_MS", "15000"))
+MIN_BUDGET_MS = float(os.getenv("DEADLINE_MIN_MS", "1000"))
+MAX_BUDGET_MS = float(os.getenv("DEADLINE_MAX_MS", "60000"))
+MIN_CALL_S = float(os.getenv("DEADLINE_MIN_CALL_MS", "300")) / 1000
+
+# Time a stage leaves for the stages after it
+_RESERVE_NLU_S = float(os.getenv("DEADLINE_RESERVE_NLU_MS", "3000")) / 1000
+_RESERVE_TTS_S = float(os.getenv("DEADLINE_RESERVE_TTS_MS", "2000")) / 1000
+STAGE_RESERVE_S = {
+    "stt": _RESERVE_NLU_S + _RESERVE_TTS_S,
+    "nlu": _RESERVE_TTS_S,
+    "tts": 0.0,
+}
+
+# A reserve never holds back more than this share of the request's budget
+MAX_RESERVE_SHARE = 0.5
+
+_current_deadline = contextvars.ContextVar("voicebot_deadline", default=None)
+
+_lock = threading.Lock()
+_degraded = {}   # stage -> count
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage runs out of its share of the budget."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} stage ran out of time")
+        self.stage = stage
+
+
+def budget_ms(endpoint: str, requested=None) -> float:
+    """
+    Budget for one request to `endpoint`: the client's `requested` value
+    (header) if it is a number, clamped to the allowed range, else the
+    endpoint's configured budget.
+    """
+    try:
+        requested = float(requested)
+    except (TypeError, ValueError):
+        requested = None
+    if requested is not None and requested > 0:
+        return min(MAX_BUDGET_MS, max(MIN_BUDGET_MS, requested))
+    key = "DEADLINE_" + endpoint.upper().replace("-", "_") + "_MS"
+    return float(os.getenv(key, DEFAULT_BUDGET_MS))
+
+
+class Deadline:
+    """The time budget of one request and the stages it had to cut short."""
+
+    def __init__(self, endpoint: str, budget_ms: float):
+        self.endpoint = endpoint
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000
+        self.degraded = {}   # stage -> reason
+
+    def remaining_s(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def time_left(self, stage: str = None, cap: float = None) -> float:
+        """Seconds `stage` may still spend (at most `cap`), keeping the reserve for later stages."""
+        reserve = min(STAGE_RESERVE_S.get(stage, 0.0), self.budget_ms / 1000 * MAX_RESERVE_SHARE)
+        left = max(0.0, self.remaining_s() - reserve)
+        return left if cap is None else min(cap, left)
+
+    def degrade(self, stage: str, reason: str):
+        if stage in self.degraded:
+            return
+        self.degraded[stage] = reason
+        print(f"DEBUG: Deadline: {stage} degraded ({reason}), {self.remaining_s() * 1000:.0f} ms left")
+        record_degraded(stage)
+        with _lock:
+            _degraded[stage] = _degraded.get(stage, 0) + 1
+
+
+def start_deadline(endpoint: str, requested_ms=None) -> Deadline:
+    deadline = Deadline(endpoint, budget_ms(endpoint, requested_ms))
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+def time_left(stage: str, cap: float = None):
+    """
+    Timeout for a call made by `stage`: its share of the current request's
+    budget, at most `cap`. Outside a request this is just `cap`.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    return deadline.time_left(stage, cap)
+
+
+def has_time(stage: str, min_s: float = None) -> bool:
+    """Whether `stage` may still start a call (always, outside a request)."""
+    deadline = _current_deadline.get()
+    return deadline is None or deadline.time_left(stage) >= (MIN_CALL_S if min_s is None else min_s)
+
+
+def out_of_time(stage: str) -> bool:
+    """Whether `stage` has used up its share of the budget."""
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.time_left(stage) <= 0
+
+
+def degrade(stage: str, reason: str):
+    """Note that `stage` gave a reduced answer to stay within the budget."""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.degrade(stage, reason)
+
+
+def degraded(stage: str) -> bool:
+    deadline = _current_deadline.get()
+    return deadline is not None and stage in deadline.degraded
+
+
+async def within_deadline(stage: str, awaitable):
+    """
+    Await `awaitable` for at most `stage`'s share of the budget; raises
+    DeadlineExceeded after that. The work itself is not interrupted (a
+    thread cannot be), but the request no longer waits for it.
+    """
+    timeout = time_left(stage)
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage)
+
+
+def deadline_stats() -> dict:
+    endpoints = ("process-audio", "ws-process-audio", "process-text", "process-text-stream",
+                 "process-text-sse")
+    with _lock:
+        degraded_counts = dict(_degraded)
+    return {
+        "budget_ms": {endpoint: budget_ms(endpoint) for endpoint in endpoints},
+        "allowed_ms": [MIN_BUDGET_MS, MAX_BUDGET_MS],
+        "reserve_ms": {stage: round(s * 1000) for stage, s in STAGE_RESERVE_S.items()},
+        "min_call_ms": round(MIN_CALL_S * 1000),
+        "degraded": degraded_counts,
+    }
@@ -0,0 +1,155 @@
+"""
+Server-side endpointing for streamed speech input.
+
+Audio arrives as 16-bit little-endian mono PCM frames over a WebSocket.
+The Endpointer buffers it, decides per 20 ms frame whether the user is
+speaking from its energy relative to an adaptive noise floor, and reports
+end-of-utterance once enough trailing silence follows speech.
+"""
+
+import io
+import os
+import wave
+
+import numpy as np
+
+FRAME_MS = 20
+
+# Sample rates a client may stream at
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+def frame_energy_db(samples: np.ndarray) -> np.ndarray:
+    """
+    Energy in dBFS of each row of an int16 frame matrix (frames x samples).
+    """
+    x = samples.astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(x * x, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-6))
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap raw 16-bit mono PCM in a WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class Endpointer:
+    """
+    Incremental end-of-utterance detector.
+
+    feed() returns "speech_start" when speech begins, "end" when the
+    utterance is complete (trailing silence or maximum length reached) and
+    None otherwise. After "end", take_utterance() returns the buffered PCM,
+    including a short pre-roll before speech started, and resets.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        silence_ms: int = None,
+        max_utterance_ms: int = None,
+        min_speech_ms: int = 60,
+        pre_roll_ms: int = 300,
+        margin_db: float = 10.0,
+        min_threshold_db: float = None,
+    ):
+        if silence_ms is None:
+            silence_ms = int(os.getenv("ENDPOINT_SILENCE_MS", "700"))
+        if max_utterance_ms is None:
+            max_utterance_ms = int(os.getenv("ENDPOINT_MAX_UTTERANCE_MS", "15000"))
+        if min_threshold_db is None:
+            min_threshold_db = float(os.getenv("ENDPOINT_MIN_DB", "-50"))
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"sample_rate must be {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz")
+
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * FRAME_MS // 1000
+        self.silence_frames = max(1, silence_ms // FRAME_MS)
+        self.max_frames = max(1, max_utterance_ms // FRAME_MS)
+        self.start_frames = max(1, min_speech_ms // FRAME_MS)
+        self.pre_roll_frames = pre_roll_ms // FRAME_MS
+        self.margin_db = margin_db
+        self.min_threshold_db = min_threshold_db
+        self.noise_floor_db = None
+        self.reset()
+
+    def reset(self):
+        self._pending = b""        # bytes not yet forming a whole frame
+        self._frames = []          # frames of the current utterance
+        self.in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._ended = False
+
+    @property
+    def buffered_ms(self) -> int:
+        return len(self._frames) * FRAME_MS
+
+    def feed(self, pcm: bytes):
+        data = self._pending + pcm
+        frame_bytes = self.frame_samples * 2
+        whole = len(data) // frame_bytes * frame_bytes
+        self._pending = data[whole:]
+        if not whole or self._ended:
+            return None
+
+        frames = np.frombuffer(data[:whole], dtype="<i2").reshape(-1, self.frame_samples)
+        energies = frame_energy_db(frames)
+
+        event = None
+        for frame, energy in zip(frames, energies):
+            voiced = energy > self._threshold()
+            if not voiced:
+                # Track background noise only outside speech
+                if self.noise_floor_db is None:
+                    self.noise_floor_db = float(energy)
+                elif not self.in_speech:
+                    self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(energy)
+
+            self._frames.append(frame.tobytes())
+            if not self.in_speech:
+                self._voiced_run = self._voiced_run + 1 if voiced else 0
+                if self._voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self._silent_run = 0
+                    event = "speech_start"
+                else:
+                    # Keep only the pre-roll while waiting for speech
+                    keep = self.pre_roll_frames + self._voiced_run
+                    if len(self._frames) > keep:
+                        del self._frames[:len(self._frames) - keep]
+                continue
+
+            self._silent_run = 0 if voiced else self._silent_run + 1
+            if self._silent_run >= self.silence_frames or len(self._frames) >= self.max_frames:
+                self._ended = True
+                return "end"
+        return event
+
+    def _threshold(self) -> float:
+        if self.noise_floor_db is None:
+            return self.min_threshold_db
+        return max(self.min_threshold_db, self.noise_floor_db + self.margin_db)
+
+    def take_utterance(self, force: bool = False) -> bytes:
+        """
+        Buffered PCM of the current utterance; resets for the next one.
+        Without speech detected this is empty unless `force` is set (the
+        client explicitly ended the utterance, e.g. push-to-talk release).
+        """
+        pcm = b"".join(self._frames)
+        if not (self.in_speech or force):
+            pcm = b""
+        self.reset()
+        return pcm
+
+    def snapshot(self) -> bytes:
+        """Buffered PCM so far, without resetting (for partial transcripts)."""
+        return b"".join(self._frames) if self.in_speech else b""
@@ -0,0 +1,297 @@
+"""
+In-memory inverted index over FAQ questions, ranked with BM25.
+
+The index is built once from the FAQ table on first use and then kept in
+sync with ORM writes: inserts, updates and deletes of FAQ rows are applied
+incrementally when their transaction commits. Bulk query-level deletes or
+updates cannot be tracked row by row, so they mark the index stale and the
+next search rebuilds it.
+"""
+
+import math
+import os
+import re
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, FAQ
+
+STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could did do does doing for
+from had has have how i if in into is it its me my of on or our please should so
+than that the their them then there these they this to us was we were what when
+where which who why will with would you your yours
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Ordered longest first so the most specific suffix is stripped
+_SUFFIXES = ("ations", "ation", "ments", "ment", "ness", "ing", "ies", "ied",
+             "ed", "ly", "s")
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix-stripping stemmer. Not a full Porter stemmer, but enough to
+    make "transfers", "transferred" and "transferring" land on the same term.
+    """
+    if len(word) <= 3:
+        return word
+    for suffix in _SUFFIXES:
+        if not word.endswith(suffix) or len(word) - len(suffix) < 3:
+            continue
+        if suffix == "s" and word.endswith(("ss", "us", "is")):
+            break
+        word = word[:-len(suffix)]
+        if suffix in ("ies", "ied"):
+            word += "y"
+        elif suffix in ("ing", "ed") and word[-1] == word[-2] and word[-1] not in "lsz":
+            # "transferring" -> "transferr" -> "transfer"
+            word = word[:-1]
+        break
+    # "close", "closed" and "closing" all become "clos"
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem."""
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class FAQIndex:
+    """
+    Inverted index of FAQ questions with BM25 scoring.
+
+    Besides the raw BM25 score every hit carries a confidence in [0, 1]. It is
+    the geometric mean of how much of the query the question covers (the
+    hit's score over the score it would get if it contained every query term)
+    and how much of the question the query covers (idf-weighted). Unknown
+    query terms count against the first and unmatched question terms against
+    the second, so one shared word is not enough for a confident match.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = {}   # term -> {faq_id: term frequency}
+        self._doc_len = {}    # faq_id -> number of terms
+        self._doc_terms = {}  # faq_id -> set of distinct terms
+        self._docs = {}       # faq_id -> (question, answer)
+        self._total_len = 0
+        self.built = False
+        self.version = 0      # bumped on every change, for caches of answers
+
+    def __len__(self):
+        return len(self._docs)
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._doc_len = {}
+            self._doc_terms = {}
+            self._docs = {}
+            self._total_len = 0
+            self.built = False
+            self.version += 1
+
+    def build(self, rows):
+        """Rebuild from an iterable of (id, question, answer) tuples."""
+        with self._lock:
+            self.clear()
+            for faq_id, question, answer in rows:
+                self._add(faq_id, question, answer)
+            self.built = True
+
+    def add(self, faq_id: int, question: str, answer: str):
+        """Insert or replace a single FAQ."""
+        with self._lock:
+            self._remove(faq_id)
+            self._add(faq_id, question, answer)
+            self.version += 1
+
+    def documents(self) -> list:
+        """All indexed FAQs as (question, answer) pairs."""
+        with self._lock:
+            return list(self._docs.values())
+
+    def remove(self, faq_id: int):
+        with self._lock:
+            self._remove(faq_id)
+            self.version += 1
+
+    def _add(self, faq_id, question, answer):
+        terms = tokenize(question or "")
+        for term in terms:
+            postings = self._postings.setdefault(term, {})
+            postings[faq_id] = postings.get(faq_id, 0) + 1
+        self._doc_len[faq_id] = len(terms)
+        self._doc_terms[faq_id] = set(terms)
+        self._docs[faq_id] = (question, answer)
+        self._total_len += len(terms)
+
+    def _remove(self, faq_id):
+        if faq_id not in self._docs:
+            return
+        del self._docs[faq_id]
+        for term in self._doc_terms.pop(faq_id):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(faq_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(faq_id)
+
+    def _idf(self, df: int, n: int) -> float:
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, text: str, limit: int = 1) -> list:
+        """
+        Rank FAQs against `text`.
+        Returns up to `limit` dicts with id, question, answer, score and
+        confidence, best first.
+        """
+        terms = tokenize(text)
+        if not terms:
+            return []
+
+        with self._lock:
+            n = len(self._docs)
+            if n == 0:
+                return []
+            avg_len = self._total_len / n or 1.0
+            k1, b = self.k1, self.b
+
+            # Ideal score weight for each query term: idf of the term, where
+            # terms absent from the index get the maximum idf
+            query_terms = set(terms)
+            query_weight = 0.0
+            scores = {}
+            for term in query_terms:
+                postings = self._postings.get(term, {})
+                idf = self._idf(len(postings), n)
+                query_weight += idf
+                for faq_id, tf in postings.items():
+                    norm = k1 * (1 - b + b * self._doc_len[faq_id] / avg_len)
+                    scores[faq_id] = scores.get(faq_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            results = []
+            for faq_id, score in ranked:
+                # Same document containing every query term exactly once
+                norm = k1 * (1 - b + b * self._doc_len[faq_id] / avg_len)
+                ideal = query_weight * (k1 + 1) / (1 + norm)
+                query_cov = min(1.0, score / ideal) if ideal else 0.0
+
+                doc_terms = self._doc_terms[faq_id]
+                doc_weight = matched_weight = 0.0
+                for term in doc_terms:
+                    idf = self._idf(len(self._postings[term]), n)
+                    doc_weight += idf
+                    if term in query_terms:
+                        matched_weight += idf
+                doc_cov = matched_weight / doc_weight if doc_weight else 0.0
+
+                question, answer = self._docs[faq_id]
+                results.append({
+                    "id": faq_id,
+                    "question": question,
+                    "answer": answer,
+                    "score": score,
+                    "confidence": math.sqrt(query_cov * doc_cov),
+                })
+            return results
+
+
+# Minimum confidence for a FAQ answer to be returned directly
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.65"))
+
+faq_index = FAQIndex(
+    k1=float(os.getenv("FAQ_BM25_K1", "1.5")),
+    b=float(os.getenv("FAQ_BM25_B", "0.75")),
+)
+
+
+def _load_index():
+    db = SessionLocal()
+    try:
+        rows = db.query(FAQ.id, FAQ.question, FAQ.answer).all()
+        faq_index.build(rows)
+        print(f"DEBUG: FAQ index built with {len(rows)} entries")
+    finally:
+        db.close()
+
+
+def get_faq_index() -> FAQIndex:
+    """Return the shared index, building it from the database if needed."""
+    if not faq_index.built:
+        with faq_index._lock:
+            if not faq_index.built:
+                _load_index()
+    return faq_index
+
+
+def match_faq(text: str, threshold: float = None):
+    """
+    Best FAQ for `text` if its confidence clears the threshold, else None.
+    """
+    if threshold is None:
+        threshold = FAQ_MATCH_THRESHOLD
+    results = get_faq_index().search(text, limit=1)
+    if results and results[0]["confidence"] >= threshold:
+        return results[0]
+    return None
+
+
+# --- Keep the index in sync with FAQ writes -------------------------------
+
+_PENDING_KEY = "faq_index_pending"
+_REBUILD_KEY = "faq_index_rebuild"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_faq_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, FAQ):
+            pending[obj.id] = (obj.question, obj.answer)
+    for obj in session.deleted:
+        if isinstance(obj, FAQ):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_faq_changes(session):
+    if session.info.pop(_REBUILD_KEY, False):
+        faq_index.clear()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if not faq_index.built:
+        # Nothing to patch, but answers cached against the old FAQs are stale
+        faq_index.version += 1
+        return
+    for faq_id, values in pending.items():
+        if values is None:
+            faq_index.remove(faq_id)
+        else:
+            faq_index.add(faq_id, *values)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_faq_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_REBUILD_KEY, None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_write(orm_execute_state):
+    # query(FAQ).delete() / .update() bypass the unit of work
+    if orm_execute_state.is_delete or orm_execute_state.is_update:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is FAQ:
+            orm_execute_state.session.info[_REBUILD_KEY] = True
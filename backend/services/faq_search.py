@@ -0,0 +1,94 @@
+"""
+Keyword search over FAQs for /api/search/faq.
+
+On SQLite the search runs against the faqs_fts FTS5 index (see
+database.create_faq_fts): terms are stemmed, the last one or any term
+ending in "*" matches as a prefix, results are ranked with bm25 (question
+hits weigh more than answer hits), and matches come back highlighted. All
+terms must match; if nothing does, any term may. Other databases, or an
+SQLite build without FTS5, get the plain substring search.
+"""
+
+import re
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+from database import FAQ
+from backend.services.faq_index import STOPWORDS
+
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+SNIPPET_TOKENS = 16
+
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+_FTS_SQL = text(f"""
+    SELECT f.id, f.question, f.answer,
+           bm25(faqs_fts, 2.0, 1.0) AS rank,
+           highlight(faqs_fts, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}') AS question_highlight,
+           snippet(faqs_fts, 1, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '…', {SNIPPET_TOKENS}) AS answer_snippet
+    FROM faqs_fts JOIN faqs AS f ON f.id = faqs_fts.rowid
+    WHERE faqs_fts MATCH :match
+    ORDER BY rank
+    LIMIT :limit
+""")
+
+
+def fts_terms(query: str) -> list:
+    """
+    FTS5 terms for a free-text query: each word quoted (so FTS syntax in
+    user input is inert), stopwords dropped unless nothing else is left,
+    and the last word (or any ending in "*") matched as a prefix.
+    """
+    words = _TERM_RE.findall(query.lower())
+    if not words:
+        return []
+    content = [w for w in words if w.rstrip("*") not in STOPWORDS]
+    words = content or words
+    terms = []
+    for i, word in enumerate(words):
+        prefix = word.endswith("*") or i == len(words) - 1
+        terms.append('"' + word.rstrip("*") + '"' + ("*" if prefix else ""))
+    return terms
+
+
+async def _search_fts(db, terms: list, limit: int) -> list:
+    rows = []
+    # All terms first; only if that finds nothing, any of them
+    for operator in (" AND ", " OR "):
+        result = await db.execute(_FTS_SQL, {"match": operator.join(terms), "limit": limit})
+        rows = result.mappings().all()
+        if rows or len(terms) == 1:
+            break
+    return [{
+        "id": row["id"],
+        "question": row["question"],
+        "answer": row["answer"],
+        # bm25() is lower-is-better; flip it so higher means more relevant
+        "score": round(-row["rank"], 4),
+        "question_highlight": row["question_highlight"],
+        "answer_snippet": row["answer_snippet"],
+    } for row in rows]
+
+
+async def _search_like(db, query: str, limit: int) -> list:
+    stmt = select(FAQ).where(FAQ.question.contains(query) | FAQ.answer.contains(query)) \
+        .order_by(FAQ.id).limit(limit)
+    faqs = (await db.execute(stmt)).scalars().all()
+    return [{"id": faq.id, "question": faq.question, "answer": faq.answer} for faq in faqs]
+
+
+async def search_faqs(db, query: str, limit: int = 10) -> list:
+    """Ranked FAQ matches for `query` (an AsyncSession `db`), best first."""
+    if db.bind.dialect.name == "sqlite":
+        terms = fts_terms(query)
+        if not terms:
+            return []
+        try:
+            return await _search_fts(db, terms, limit)
+        except OperationalError as e:
+            # No FTS5 in this SQLite build, or the index was never created
+            print(f"DEBUG: FTS search unavailable, using substring search: {e}")
+            await db.rollback()
+    return await _search_like(db, query, limit)
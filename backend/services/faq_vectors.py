@@ -0,0 +1,346 @@
+"""
+Dense-vector FAQ retrieval.
+
+The BM25 index needs shared words, so paraphrases such as "I forgot my
+login" for "How do I reset my password" miss it and fall through to the
+LLM. Here every FAQ question is embedded once into a row of a single
+contiguous float32 matrix, L2-normalized, so one matrix-vector product
+gives the cosine similarity of a query with every FAQ.
+
+Embeddings come from a sentence-transformers model when FAQ_EMBED_MODEL
+names one (CPU only), otherwise from a hashing vectorizer over stemmed
+words, word bigrams and a small table of banking concepts, which needs no
+model at all. The matrix is saved next to the database as an .npy file and
+memory-mapped at startup; it is rebuilt when the FAQ table changes.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, FAQ, engine
+from backend.services.faq_index import stem
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Function words that carry no meaning for retrieval. "when", "where" and
+# "much" are kept: they say what kind of answer is wanted
+VECTOR_STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could did do does doing for
+from get had has have how i if in into is it its like me my need of on or our
+please should so some than that the their them then there these they this to
+us want was we were what which who why will with would you your yours
+""".split())
+
+# Words that mean the same thing in customer questions, mapped to a shared
+# concept feature so different wordings land close together
+CONCEPTS = {
+    "time": ["when", "hours", "operating", "schedule", "time", "weekend", "holiday"],
+    "contact": ["contact", "call", "phone", "email", "reach", "speak", "talk", "support", "agent", "someone"],
+    "password": ["password", "login", "log", "sign", "pin", "forgot", "locked", "credentials"],
+    "cost": ["fee", "fees", "charge", "cost", "price", "much", "rate", "interest", "pay"],
+    "transfer": ["transfer", "send", "move", "wire", "zelle"],
+    "card": ["card", "debit", "credit", "atm"],
+    "lost": ["lost", "stolen", "missing", "fraud", "suspicious", "blocked"],
+    "loan": ["loan", "mortgage", "borrow", "lend"],
+    "deposit": ["deposit", "check", "cheque", "cash"],
+    "location": ["where", "branch", "location", "nearest", "closest", "address"],
+    "security": ["secure", "security", "safe", "protect", "encryption", "privacy"],
+}
+_CONCEPT_OF = {}
+for _concept, _words in CONCEPTS.items():
+    for _word in _words:
+        _CONCEPT_OF.setdefault(stem(_word), []).append(f"concept:{_concept}")
+
+HASH_DIM = int(os.getenv("FAQ_VECTOR_DIM", "4096"))
+BIGRAM_WEIGHT = 0.5
+CONCEPT_WEIGHT = 1.5
+
+
+def _stems(text: str) -> list:
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in VECTOR_STOPWORDS]
+
+
+def _features(text: str) -> dict:
+    stems = _stems(text)
+    features = {}
+    for s in stems:
+        features[s] = features.get(s, 0.0) + 1.0
+        for concept in _CONCEPT_OF.get(s, ()):
+            features[concept] = features.get(concept, 0.0) + CONCEPT_WEIGHT
+    for left, right in zip(stems, stems[1:]):
+        bigram = f"{left} {right}"
+        features[bigram] = features.get(bigram, 0.0) + BIGRAM_WEIGHT
+    return features
+
+
+class HashingEncoder:
+    """Signed feature hashing into `dim` buckets; no model or training."""
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def encode(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in _features(text).items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                # Sublinear term frequency
+                if weight > 1:
+                    weight = 1.0 + math.log(weight)
+                matrix[row, h % self.dim] += sign * weight
+        return _normalize(matrix)
+
+    def matched_words(self, query: str, text: str) -> int:
+        """
+        How many distinct query words `text` shares, either as the word itself
+        or through a concept. One shared concept word ("time", "call") alone
+        is not evidence that two questions are about the same thing.
+        """
+        stems = set(_stems(text))
+        concepts = {c for s in stems for c in _CONCEPT_OF.get(s, ())}
+        return sum(1 for s in set(_stems(query))
+                   if s in stems or concepts.intersection(_CONCEPT_OF.get(s, ())))
+
+
+class SentenceTransformerEncoder:
+    """Local sentence-transformers model, run on the CPU."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"st-{model_name}"
+
+    def encode(self, texts: list) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def make_encoder():
+    model_name = os.getenv("FAQ_EMBED_MODEL")
+    if model_name:
+        try:
+            return SentenceTransformerEncoder(model_name)
+        except Exception as e:
+            print(f"DEBUG: Embedding model {model_name} unavailable ({e}), using hashing vectorizer")
+    return HashingEncoder()
+
+
+def default_vector_path():
+    """`<db name>.faq_vectors.npy` next to a file-backed SQLite database."""
+    path = os.getenv("FAQ_VECTOR_PATH")
+    if path:
+        return path
+    if engine.url.get_backend_name() == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        return os.path.splitext(engine.url.database)[0] + ".faq_vectors.npy"
+    return None
+
+
+class FAQVectorIndex:
+    """
+    FAQ questions as rows of one L2-normalized float32 matrix.
+
+    `path` is where the matrix is persisted (None keeps it in memory only);
+    a JSON sidecar records the row ids and a fingerprint of the questions
+    and encoder, so a saved matrix is reused only if it still matches.
+    """
+
+    def __init__(self, encoder=None, path: str = None):
+        self.encoder = encoder or make_encoder()
+        self.path = path
+        self._lock = threading.RLock()
+        self.matrix = np.zeros((0, 1), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self._docs = {}
+        self.built = False
+
+    @property
+    def _meta_path(self):
+        return self.path[:-len(".npy")] + ".json" if self.path.endswith(".npy") else self.path + ".json"
+
+    def _fingerprint(self, rows) -> str:
+        digest = hashlib.sha256(self.encoder.name.encode("utf-8"))
+        for faq_id, question, _ in rows:
+            digest.update(f"\x1e{faq_id}\x1f{question or ''}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _load_saved(self, fingerprint: str) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("fingerprint") != fingerprint:
+                return False
+            matrix = np.load(self.path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Could not load FAQ vectors from {self.path}: {e}")
+            return False
+        self.matrix = matrix
+        self.ids = np.asarray(meta["ids"], dtype=np.int64)
+        return True
+
+    def _save(self, fingerprint: str):
+        # Write next to the target and rename, so a reader never maps a
+        # half-written file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, self.matrix)
+        os.replace(tmp_path, self.path)
+        tmp_meta = f"{self._meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "encoder": self.encoder.name,
+                       "ids": self.ids.tolist()}, f)
+        os.replace(tmp_meta, self._meta_path)
+        # Serve from the memory-mapped copy like a fresh start would
+        self.matrix = np.load(self.path, mmap_mode="r")
+
+    def build(self, rows):
+        """
+        Index (id, question, answer) rows, reusing the saved matrix when the
+        questions have not changed since it was written.
+        """
+        rows = list(rows)
+        fingerprint = self._fingerprint(rows)
+        with self._lock:
+            self._docs = {faq_id: (question, answer) for faq_id, question, answer in rows}
+            if not self._load_saved(fingerprint):
+                self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+                self.matrix = self.encoder.encode([row[1] or "" for row in rows]) if rows \
+                    else np.zeros((0, 1), dtype=np.float32)
+                if self.path and rows:
+                    try:
+                        self._save(fingerprint)
+                    except OSError as e:
+                        print(f"DEBUG: Could not save FAQ vectors to {self.path}: {e}")
+                print(f"DEBUG: Embedded {len(rows)} FAQ questions with {self.encoder.name}")
+            self.built = True
+
+    def search(self, text: str, limit: int = 1) -> list:
+        """
+        Top `limit` FAQs by cosine similarity, best first. Each hit has id,
+        question, answer, score and confidence (the cosine, clipped to [0, 1]).
+        """
+        with self._lock:
+            matrix, ids, docs = self.matrix, self.ids, self._docs
+        if len(ids) == 0 or not text.strip():
+            return []
+        query = self.encoder.encode([text])[0]
+        scores = matrix @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            score = float(scores[i])
+            if score <= 0:
+                break
+            faq_id = int(ids[i])
+            question, answer = docs.get(faq_id, (None, None))
+            results.append({
+                "id": faq_id,
+                "question": question,
+                "answer": answer,
+                "score": score,
+                "confidence": min(1.0, score),
+            })
+        return results
+
+    def match(self, text: str, threshold: float):
+        """
+        Best FAQ for `text`, or None unless it clears `threshold` and is backed
+        by more than one word: with the hashing encoder at least
+        FAQ_VECTOR_MIN_WORDS shared query words, with a model a clear gap
+        (FAQ_VECTOR_MARGIN) to the second-best FAQ.
+        """
+        results = self.search(text, limit=2)
+        if not results or results[0]["confidence"] < threshold:
+            return None
+        best = results[0]
+        matched_words = getattr(self.encoder, "matched_words", None)
+        if matched_words is not None:
+            if matched_words(text, best["question"] or "") < FAQ_VECTOR_MIN_WORDS:
+                return None
+        elif len(results) > 1 and best["score"] - results[1]["score"] < FAQ_VECTOR_MARGIN:
+            return None
+        return best
+
+
+# Minimum cosine similarity for a FAQ answer to be returned directly
+FAQ_VECTOR_THRESHOLD = float(os.getenv("FAQ_VECTOR_THRESHOLD", "0.5"))
+# ...and how much the best match must be backed: shared query words for the
+# hashing encoder, lead over the runner-up for an embedding model
+FAQ_VECTOR_MIN_WORDS = int(os.getenv("FAQ_VECTOR_MIN_WORDS", "2"))
+FAQ_VECTOR_MARGIN = float(os.getenv("FAQ_VECTOR_MARGIN", "0.05"))
+
+faq_vectors = FAQVectorIndex(path=default_vector_path())
+
+
+def get_faq_vectors() -> FAQVectorIndex:
+    """Return the shared vector index, (re)building it if the FAQs changed."""
+    if not faq_vectors.built:
+        with faq_vectors._lock:
+            if not faq_vectors.built:
+                db = SessionLocal()
+                try:
+                    faq_vectors.build(db.query(FAQ.id, FAQ.question, FAQ.answer).order_by(FAQ.id).all())
+                finally:
+                    db.close()
+    return faq_vectors
+
+
+def match_faq_vector(text: str, threshold: float = None):
+    """
+    Most similar FAQ for `text` if it is a confident match (see
+    FAQVectorIndex.match), else None.
+    """
+    if threshold is None:
+        threshold = FAQ_VECTOR_THRESHOLD
+    return get_faq_vectors().match(text, threshold)
+
+
+# --- Rebuild after FAQ writes ---------------------------------------------
+
+_STALE_KEY = "faq_vectors_stale"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_faq_writes(session, flush_context):
+    if any(isinstance(obj, FAQ) for obj in session.new | session.dirty | session.deleted):
+        session.info[_STALE_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_faq_writes(orm_execute_state):
+    if orm_execute_state.is_delete or orm_execute_state.is_update:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is FAQ:
+            orm_execute_state.session.info[_STALE_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_stale(session):
+    if session.info.pop(_STALE_KEY, False):
+        # Rebuilt (and re-saved) on the next search
+        faq_vectors.built = False
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_faq_writes(session):
+    session.info.pop(_STALE_KEY, None)
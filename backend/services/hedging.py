@@ -0,0 +1,198 @@
+"""
+Hedged requests across interchangeable LLM backends.
+
+In "hedge" mode the primary backend is called first; if it has not
+answered within the hedge delay (by default the primary's observed p90
+latency), the next backend is started as well, and the first good answer
+wins. In "race" mode every backend starts at once. A backend that fails
+outright hands over to the next one immediately, as the plain fallback
+chain did. When an answer wins, the other calls are cancelled through the
+`cancel` event they were given, so a streaming backend can close its
+connection instead of generating a reply nobody will read. With a
+`timeout`, nothing is waited for past it: every call still running is
+cancelled and the caller falls back.
+
+Each backend runs on its own threads, as many as there are NLU workers
+(each worker makes one call at a time). A backend that hangs, which is
+what hedging is for, can then only tie up its own threads: the hedge
+requests to the other backends still start on time.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from backend.services.workers import nlu_pool
+
+MODES = ("off", "hedge", "race")
+
+
+class Hedger:
+    """
+    Runs callables `func(cancel_event) -> result or None` for a list of
+    named backends and returns the first truthy result.
+
+    `delay_ms` fixes the hedge delay; when None it is the `quantile` of the
+    primary's recent successful latencies, or `default_delay_ms` until
+    `min_samples` of them have been seen. Every backend gets its own
+    `max_workers` threads.
+    """
+
+    def __init__(self, mode: str = "hedge", delay_ms: float = None, default_delay_ms: float = 1500,
+                 quantile: float = 0.9, min_samples: int = 20, window: int = 200, max_workers: int = 8):
+        if mode not in MODES:
+            raise ValueError(f"Unknown hedging mode: {mode}")
+        self.mode = mode
+        self.delay_ms = delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_workers = max_workers
+        self._executors = {}   # backend -> its ThreadPoolExecutor
+        self._lock = threading.RLock()
+        self._latencies = {}   # backend -> recent successful latencies in ms
+        self.calls = 0
+        self.hedged = 0
+        self.timeouts = 0
+        self.wins = {}
+        self.failures = {}
+
+    def hedge_delay_s(self, backend: str) -> float:
+        if self.delay_ms is not None:
+            return self.delay_ms / 1000
+        with self._lock:
+            samples = sorted(self._latencies.get(backend, ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay_ms / 1000
+        return samples[min(len(samples) - 1, int(self.quantile * len(samples)))] / 1000
+
+    def _executor(self, backend: str) -> ThreadPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(backend)
+            if executor is None:
+                executor = self._executors[backend] = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"llm-{backend}"
+                )
+            return executor
+
+    def _timed(self, name: str, func, cancel: threading.Event):
+        start = time.monotonic()
+        result = func(cancel)
+        if result and not cancel.is_set():
+            with self._lock:
+                history = self._latencies.get(name)
+                if history is None:
+                    history = self._latencies[name] = deque(maxlen=self.window)
+                history.append((time.monotonic() - start) * 1000)
+        return result
+
+    def _count(self, counter: dict, name: str):
+        with self._lock:
+            counter[name] = counter.get(name, 0) + 1
+
+    def call(self, backends: list, mode: str = None, on_hedge=None, timeout: float = None):
+        """
+        Try `backends` [(name, func), ...] in order of preference. Returns
+        (name, result) of the winning answer, or (None, None) if all fail
+        or none answers within `timeout` seconds.
+        `on_hedge(primary)` is called whenever a hedge request is fired.
+        """
+        mode = mode or self.mode
+        waiting = list(backends)
+        running = {}   # future -> (name, cancel event)
+        with self._lock:
+            self.calls += 1
+
+        def start(name, func):
+            cancel = threading.Event()
+            # Each task needs its own copy: a context can't be entered twice at once
+            ctx = contextvars.copy_context()
+            future = self._executor(name).submit(ctx.run, self._timed, name, func, cancel)
+            running[future] = (name, cancel)
+
+        primary = waiting[0][0] if waiting else None
+        if mode == "race":
+            while waiting:
+                start(*waiting.pop(0))
+        elif waiting:
+            start(*waiting.pop(0))
+        hedge_at = time.monotonic() + self.hedge_delay_s(primary) if mode == "hedge" else None
+        give_up_at = time.monotonic() + timeout if timeout is not None else None
+
+        try:
+            while running:
+                wait_s = None
+                if waiting and hedge_at is not None:
+                    wait_s = max(0.0, hedge_at - time.monotonic())
+                if give_up_at is not None:
+                    left = max(0.0, give_up_at - time.monotonic())
+                    wait_s = left if wait_s is None else min(wait_s, left)
+                done, _ = wait(running, timeout=wait_s, return_when=FIRST_COMPLETED)
+                if not done and give_up_at is not None and time.monotonic() >= give_up_at:
+                    with self._lock:
+                        self.timeouts += 1
+                    return None, None
+                if not done:
+                    # Hedge delay passed without an answer: start the next backend too
+                    with self._lock:
+                        self.hedged += 1
+                    if on_hedge is not None:
+                        on_hedge(primary)
+                    start(*waiting.pop(0))
+                    hedge_at = time.monotonic() + self.hedge_delay_s(primary)
+                    continue
+                for future in done:
+                    name, _ = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"DEBUG: LLM backend {name} failed: {e}")
+                        result = None
+                    if result:
+                        self._count(self.wins, name)
+                        return name, result
+                    self._count(self.failures, name)
+                    if waiting and not running:
+                        # Nothing else in flight: fall back right away
+                        start(*waiting.pop(0))
+            return None, None
+        finally:
+            for future, (name, cancel) in running.items():
+                cancel.set()
+                future.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.calls
+            total_wins = sum(self.wins.values())
+            return {
+                "mode": self.mode,
+                "threads_per_backend": self.max_workers,
+                "calls": calls,
+                "hedged": self.hedged,
+                "hedge_rate": round(self.hedged / calls, 3) if calls else 0.0,
+                "timeouts": self.timeouts,
+                "wins": dict(self.wins),
+                "win_rate": {name: round(n / total_wins, 3) for name, n in self.wins.items()},
+                "failures": dict(self.failures),
+                "hedge_delay_ms": {name: round(self.hedge_delay_s(name) * 1000, 1)
+                                   for name in self._latencies} if self.mode == "hedge" else None,
+            }
+
+
+def _delay_from_env():
+    value = os.getenv("LLM_HEDGE_DELAY_MS", "auto").strip().lower()
+    return None if value in ("", "auto") else float(value)
+
+
+llm_hedger = Hedger(
+    mode=os.getenv("LLM_HEDGE_MODE", "hedge").lower(),
+    delay_ms=_delay_from_env(),
+    default_delay_ms=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1500")),
+    # One thread per backend for every NLU worker that may be calling it
+    max_workers=nlu_pool.max_workers,
+)
@@ -0,0 +1,298 @@
+"""
+Intent routing ahead of the database and LLM.
+
+Every request is routed once, before any lookup, to one of:
+
+- "account": the caller wants their own account details;
+- "rule":    small talk with a canned reply (greeting, thanks, ...);
+- "faq":     a banking question to look up in the FAQ index (which still
+             falls through to the LLM when nothing matches);
+- "llm":     anything else, sent to the LLM without an FAQ lookup.
+
+Two stages, both CPU-only and in-process. A compiled pattern matcher
+catches the unambiguous cases: whole-utterance small talk and explicit
+requests for one's own balance or account details. Everything else goes to
+a small multinomial logistic regression over hashed word unigrams and
+bigrams, trained at startup from the FAQ questions plus the example
+utterances below, and retrained when the FAQ index changes. When the
+classifier is unsure, the request takes the FAQ path, which is what every
+request did before routing.
+"""
+
+import math
+import os
+import random
+import re
+import threading
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from backend.services.faq_index import get_faq_index, stem
+from backend.services.response_cache import normalize_query
+
+Route = namedtuple("Route", "intent rule confidence method")
+
+CLASSES = ("account", "faq", "llm")
+
+# Whole-utterance small talk (matched against the normalized query)
+RULE_PATTERNS = {
+    "greeting": r"(?:hi|hello|hey|hiya|good (?:morning|afternoon|evening))(?: there)?(?: bot)?",
+    "goodbye": r"(?:bye|goodbye|bye bye|see you(?: later)?|thats all|that is all)(?: thanks| thank you)?",
+    "thanks": r"(?:great )?(?:thanks|thank you)(?: (?:so |very )?much| a lot)?|cheers|much appreciated",
+    "help": r"(?:help|help me|i need help|what can you do|what can you help (?:me )?with)",
+    "name": r"(?:whats|what is) your name|who are you",
+}
+
+# What a caller may ask to hear about their own account
+_ACCOUNT_THING = (r"(?:current |available )?"
+                  r"(?:(?:account )?(?:balance|details|info|information|number|status|summary|type)"
+                  r"|account(?: details)?)")
+
+# Explicit requests for the caller's own account, matched against the whole
+# normalized utterance: "I lost my account number" or "my account status is
+# wrong" mention the account but ask for help, not for its details
+ACCOUNT_PATTERNS = [
+    rf"(?:(?:can|could|will|would) you )?(?:tell|show|give|read|check|get)(?: me)? my {_ACCOUNT_THING}"
+    r"(?: for me)?",
+    rf"(?:what|whats|what is|how much is) my {_ACCOUNT_THING}",
+    rf"(?:i (?:want|would like|need|wanna)|id like) (?:to )?(?:know|see|check|hear) my {_ACCOUNT_THING}",
+    r"how much (?:money )?(?:do i have|have i got|is (?:in|on) my account)"
+    r"(?: in (?:my )?(?:account|savings|checking))?",
+    rf"(?:my )?(?:balance|{_ACCOUNT_THING})",
+]
+
+# Keyword fallback for canned replies when no LLM answered, in priority order
+RULE_KEYWORDS = [
+    ("greeting", r"\b(?:hello|hi|hey)\b"),
+    ("help", r"\bhelp\b"),
+    ("name", r"\bname\b"),
+    ("goodbye", r"\b(?:bye|goodbye|see you)\b"),
+    ("thanks", r"\bthank"),
+]
+
+_RULE_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in RULE_PATTERNS.items()))
+_ACCOUNT_RE = re.compile("|".join(f"(?:{pattern})" for pattern in ACCOUNT_PATTERNS))
+_RULE_KEYWORD_RES = [(name, re.compile(pattern)) for name, pattern in RULE_KEYWORDS]
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Training utterances besides the FAQ questions
+ACCOUNT_EXAMPLES = [
+    "what is my balance", "how much money do i have", "check my balance",
+    "tell me my account details", "what is my account number", "show my account",
+    "account balance please", "how much is in my account", "what type of account do i have",
+    "is my account active", "what email is on my account", "what phone number do you have for me",
+    "read me my balance", "what is the status of my account", "give me my account information",
+    "how much do i have in savings", "whats my current balance", "my account details",
+]
+LLM_EXAMPLES = [
+    "tell me a joke", "what is the weather like today", "explain compound interest",
+    "should i save or invest my bonus", "what is inflation", "how does a credit score work",
+    "write me a budget plan", "what is the difference between a roth ira and a 401k",
+    "can you recommend a good book", "how do i save for retirement", "what is a mutual fund",
+    "how do stocks work", "what is cryptocurrency", "translate hello into spanish",
+    "who won the game last night", "how can i improve my credit", "what is an index fund",
+    "how should i pay off debt", "what does apr mean", "what is a good emergency fund",
+    "give me tips to spend less", "what are bonds", "explain how mortgages work in general",
+    "is it a good time to buy a house", "what is the capital of france", "how are you today",
+]
+# Problems with an account are support questions, not requests for its details
+SUPPORT_EXAMPLES = [
+    "i lost my account number", "i forgot my account number", "my account status is wrong",
+    "my balance is wrong", "someone changed my account details", "who do i contact about my account",
+    "my account is locked", "i cant get into my account", "there is a mistake on my account",
+    "how do i update my account details", "my account number does not work",
+    "why was my account closed", "the balance on my account is incorrect",
+]
+FAQ_PREFIXES = ["", "can you tell me ", "i want to know ", "i would like to know "]
+
+HASH_DIM = 4096
+MAX_FAQ_EXAMPLES = 2000
+
+
+def _features(text: str) -> dict:
+    # Stopwords are kept: "my" and "how do i" carry the intent
+    stems = [stem(t) for t in _TOKEN_RE.findall(text.lower())]
+    features = {}
+    for s in stems:
+        features[s] = features.get(s, 0.0) + 1.0
+    for left, right in zip(stems, stems[1:]):
+        bigram = f"{left} {right}"
+        features[bigram] = features.get(bigram, 0.0) + 1.0
+    return features
+
+
+def hash_features(text: str, dim: int = HASH_DIM):
+    """(bucket indices, values) of the L2-normalized hashed feature vector."""
+    buckets = {}
+    for feature, weight in _features(text).items():
+        index = zlib.crc32(feature.encode("utf-8")) % dim
+        buckets[index] = buckets.get(index, 0.0) + (1.0 + math.log(weight))
+    indices = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+    values = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+    norm = float(np.linalg.norm(values))
+    if norm > 0:
+        values /= norm
+    return indices, values
+
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed n-grams, trained with full-batch gradient descent."""
+
+    def __init__(self, classes=CLASSES, dim: int = HASH_DIM):
+        self.classes = tuple(classes)
+        self.dim = dim
+        self.weights = np.zeros((dim, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+
+    def fit(self, texts: list, labels: list, epochs: int = 300, learning_rate: float = 2.0,
+            l2: float = 1e-4):
+        rows = [hash_features(text, self.dim) for text in texts]
+        # Train only on the buckets some example uses; the rest stay zero
+        used = np.unique(np.concatenate([indices for indices, _ in rows]))
+        column = np.zeros(self.dim, dtype=np.int64)
+        column[used] = np.arange(len(used))
+        x = np.zeros((len(texts), len(used)), dtype=np.float32)
+        for row, (indices, values) in enumerate(rows):
+            np.add.at(x[row], column[indices], values)
+        y = np.zeros((len(texts), len(self.classes)), dtype=np.float32)
+        y[np.arange(len(texts)), [self.classes.index(label) for label in labels]] = 1.0
+        # Balance the classes: there are far more FAQ questions than anything else
+        sample_weight = (1.0 / np.maximum(y.sum(axis=0), 1.0))[np.argmax(y, axis=1)]
+        sample_weight /= sample_weight.sum()
+        w = np.zeros((len(used), len(self.classes)), dtype=np.float32)
+        b = np.zeros_like(self.bias)
+        for _ in range(epochs):
+            logits = x @ w + b
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            error = (probs - y) * sample_weight[:, None]
+            w -= learning_rate * (x.T @ error + l2 * w)
+            b -= learning_rate * error.sum(axis=0)
+        self.weights = np.zeros((self.dim, len(self.classes)), dtype=np.float32)
+        self.weights[used] = w
+        self.bias = b
+        return self
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        indices, values = hash_features(text, self.dim)
+        logits = values @ self.weights[indices] + self.bias
+        probs = np.exp(logits - logits.max())
+        return probs / probs.sum()
+
+    def predict(self, text: str) -> tuple:
+        """(class, probability) of the most likely class."""
+        probs = self.predict_proba(text)
+        best = int(np.argmax(probs))
+        return self.classes[best], float(probs[best])
+
+
+def training_data(faqs: list, max_faq_examples: int = MAX_FAQ_EXAMPLES) -> tuple:
+    """
+    (texts, labels) from the FAQs [(question, answer), ...] and the built-in
+    examples. Each question is used with a few lead-ins, and the answer is
+    added too, for the vocabulary the question alone does not use.
+    """
+    per_faq = len(FAQ_PREFIXES) + 1
+    faqs = list(faqs)
+    if len(faqs) * per_faq > max_faq_examples:
+        faqs = random.Random(0).sample(faqs, max(1, max_faq_examples // per_faq))
+    texts, labels = [], []
+    for question, answer in faqs:
+        for prefix in FAQ_PREFIXES:
+            texts.append(prefix + (question or "").lower())
+        texts.append((answer or "").lower())
+        labels.extend(["faq"] * per_faq)
+    for label, examples in (("account", ACCOUNT_EXAMPLES), ("faq", SUPPORT_EXAMPLES), ("llm", LLM_EXAMPLES)):
+        texts.extend(examples)
+        labels.extend([label] * len(examples))
+    return texts, labels
+
+
+def match_rule(text: str, normalized: str = None):
+    """Canned-reply rule whose pattern covers the whole utterance, or None."""
+    match = _RULE_RE.fullmatch(normalized if normalized is not None else normalize_query(text))
+    return match.lastgroup if match else None
+
+
+def fallback_rule(text: str):
+    """Canned-reply rule for any rule keyword in `text`, used once the LLMs have failed."""
+    text_lower = text.lower()
+    for name, pattern in _RULE_KEYWORD_RES:
+        if pattern.search(text_lower):
+            return name
+    return None
+
+
+class IntentRouter:
+    """
+    Patterns first, then the classifier. Below `min_confidence` the
+    classifier's answer is not trusted and the request takes the FAQ path:
+    sending an LLM question there costs one index lookup before it reaches
+    the LLM anyway, while sending an FAQ question to the LLM or the account
+    path loses its answer.
+
+    The classifier is trained on first use (warm() does that at startup).
+    When the FAQ index changes it is retrained in the background, and the
+    previous model keeps serving until the new one is ready.
+    """
+
+    def __init__(self, min_confidence: float = 0.75, index_getter=get_faq_index):
+        self.min_confidence = min_confidence
+        self._index_getter = index_getter
+        self._lock = threading.Lock()
+        self._classifier = None
+        self._trained_version = None
+        self._retraining = False
+        self.routed = {}
+
+    def _train(self, index):
+        with self._lock:
+            try:
+                version, faqs = index.version, index.documents()
+                if self._classifier is None or version != self._trained_version:
+                    self._classifier = IntentClassifier().fit(*training_data(faqs))
+                    self._trained_version = version
+                    print(f"DEBUG: Intent classifier trained on {len(faqs)} FAQs")
+            finally:
+                self._retraining = False
+
+    def _get_classifier(self) -> IntentClassifier:
+        index = self._index_getter()
+        if index.version != self._trained_version:
+            if self._classifier is None:
+                self._train(index)
+            elif not self._retraining:
+                self._retraining = True
+                threading.Thread(target=self._train, args=(index,), daemon=True).start()
+        return self._classifier
+
+    def warm(self):
+        self._get_classifier()
+
+    def route(self, text: str) -> Route:
+        normalized = normalize_query(text)
+        rule = match_rule(text, normalized)
+        if rule is not None:
+            route = Route("rule", rule, 1.0, "pattern")
+        elif _ACCOUNT_RE.fullmatch(normalized):
+            route = Route("account", None, 1.0, "pattern")
+        else:
+            intent, confidence = self._get_classifier().predict(text)
+            if confidence < self.min_confidence:
+                intent = "faq"
+            route = Route(intent, None, round(confidence, 3), "classifier")
+        self.routed[route.intent] = self.routed.get(route.intent, 0) + 1
+        return route
+
+    def stats(self) -> dict:
+        return {
+            "min_confidence": self.min_confidence,
+            "trained_on_version": self._trained_version,
+            "routed": dict(self.routed),
+        }
+
+
+intent_router = IntentRouter(min_confidence=float(os.getenv("INTENT_MIN_CONFIDENCE", "0.75")))
@@ -0,0 +1,177 @@
+"""
+Background, batched logging of Interaction rows.
+
+The request path only puts the interaction's fields on a bounded in-process
+queue. A single writer thread drains it and inserts the rows in one
+transaction per batch, flushing every `flush_ms` milliseconds or as soon as
+`batch_size` rows are waiting, so a turn never waits on an SQLite commit
+and concurrent requests no longer serialize on the database lock.
+
+When the queue is full the `policy` decides: "drop" discards the new row
+(and counts it), "block" waits up to `block_ms` for room before dropping.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from database import SessionLocal, Interaction
+
+
+class InteractionWriter:
+    """Single-threaded batched writer for Interaction rows."""
+
+    POLICIES = ("drop", "block")
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = 50, flush_ms: float = 200,
+                 max_queue: int = 1000, policy: str = "drop", block_ms: float = 250):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown interaction queue policy: {policy}")
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_s = flush_ms / 1000
+        self.policy = policy
+        self.block_s = block_ms / 1000
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._flush_now = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="interaction-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Write everything still queued, then stop the writer thread."""
+        self._stop.set()
+        self._flush_now.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=timeout)
+            self._thread = None
+
+    def submit(self, fields: dict) -> bool:
+        """
+        Queue one interaction (keyword arguments for Interaction). Returns
+        False if it was dropped because the queue is full.
+        """
+        if self._thread is None:
+            self.start()
+        # Stamp now, not when the batch happens to be written
+        fields.setdefault("timestamp", datetime.utcnow())
+        with self._lock:
+            self._pending += 1
+        try:
+            if self.policy == "block":
+                self._queue.put(fields, timeout=self.block_s)
+            else:
+                self._queue.put_nowait(fields)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._pending -= 1
+                self._dropped += 1
+                self._idle.notify_all()
+            print("DEBUG: Interaction log queue full, dropping row")
+            return False
+
+    async def submit_async(self, fields: dict) -> bool:
+        """submit() for the event loop: only a blocking wait leaves the loop."""
+        if self.policy == "block" and self._queue.full():
+            return await asyncio.to_thread(self.submit, fields)
+        return self.submit(fields)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write queued rows now and wait for them. Returns False on timeout."""
+        self._flush_now.set()
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _collect(self) -> list:
+        """Block for the first row, then gather a batch until it is full or due."""
+        try:
+            # Short poll so stop() is noticed promptly
+            batch = [self._queue.get(timeout=min(self.flush_s, 0.1))]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_s
+        while len(batch) < self.batch_size:
+            if self._flush_now.is_set():
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.05)))
+            except queue.Empty:
+                pass
+        return batch
+
+    def _write(self, batch: list):
+        db = self.session_factory()
+        try:
+            db.add_all([Interaction(**fields) for fields in batch])
+            db.commit()
+            ok = True
+        except Exception as e:
+            db.rollback()
+            print(f"DEBUG: Failed to write {len(batch)} interactions: {e}")
+            ok = False
+        finally:
+            db.close()
+        with self._lock:
+            if ok:
+                self._written += len(batch)
+                self._batches += 1
+            else:
+                self._failed += len(batch)
+            self._pending -= len(batch)
+            self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+            elif self._stop.is_set():
+                return
+            if self._queue.empty():
+                self._flush_now.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "queue_limit": self._queue.maxsize,
+                "policy": self.policy,
+                "written": self._written,
+                "batches": self._batches,
+                "dropped": self._dropped,
+                "failed": self._failed,
+            }
+
+
+interaction_writer = InteractionWriter(
+    batch_size=int(os.getenv("INTERACTION_BATCH_SIZE", "50")),
+    flush_ms=float(os.getenv("INTERACTION_FLUSH_MS", "200")),
+    max_queue=int(os.getenv("INTERACTION_QUEUE_SIZE", "1000")),
+    policy=os.getenv("INTERACTION_QUEUE_POLICY", "drop"),
+    block_ms=float(os.getenv("INTERACTION_BLOCK_MS", "250")),
+)
@@ -0,0 +1,274 @@
+"""
+Running latency aggregates for /api/stats.
+
+Instead of loading every Interaction row on each dashboard poll, response
+times are folded into running aggregates as interactions are written.
+Percentiles come from a mergeable log-bucket quantile sketch (the DDSketch
+scheme): every value lands in a bucket whose width is a fixed fraction of
+its magnitude, so quantiles are accurate to within that relative error and
+two sketches merge by adding bucket counts.
+
+The sketches live in the database (latency_rollups and latency_rollup_bins),
+updated in the same transaction that inserts the interactions, so every
+worker process serves the same numbers and a cold start reads a few
+rollup rows instead of the whole interactions table. Time windows are kept
+as per-minute sketches for the last hour and per-hour sketches for the last
+day; a window query merges at most 60 small sketches in SQL, however large
+the interactions table grows.
+"""
+
+import calendar
+import math
+import time
+
+from sqlalchemy import case, delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Interaction, LatencyRollup, LatencyRollupBin
+
+_ROLLUPS = LatencyRollup.__table__
+_BINS = LatencyRollupBin.__table__
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error."""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        for index, n in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i]
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        def rounded(value):
+            return round(value, 1) if value is not None else None
+        return {
+            "count": self.count,
+            "avg_ms": rounded(self.total / self.count) if self.count else 0,
+            "p50_ms": rounded(self.quantile(0.50)),
+            "p95_ms": rounded(self.quantile(0.95)),
+            "p99_ms": rounded(self.quantile(0.99)),
+        }
+
+
+def _epoch(ts):
+    return calendar.timegm(ts.utctimetuple()) if ts else None
+
+
+def _upsert_insert(conn):
+    """The dialect's INSERT ... ON CONFLICT construct, or None if it has none."""
+    if conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+
+def _upsert(conn, table, rows: list, added: tuple, lowest: tuple = (), highest: tuple = ()):
+    """
+    Insert `rows` into `table`, or fold each into the existing row with the
+    same primary key: `added` columns are summed, `lowest`/`highest` keep the
+    smaller/larger value.
+    """
+    keys = [column.name for column in table.primary_key]
+    insert = _upsert_insert(conn)
+    if insert is not None:
+        stmt = insert(table)
+        merged = {name: table.c[name] + stmt.excluded[name] for name in added}
+        merged.update({name: case((stmt.excluded[name] < table.c[name], stmt.excluded[name]),
+                                  else_=table.c[name]) for name in lowest})
+        merged.update({name: case((stmt.excluded[name] > table.c[name], stmt.excluded[name]),
+                                  else_=table.c[name]) for name in highest})
+        conn.execute(stmt.on_conflict_do_update(index_elements=keys, set_=merged), rows)
+        return
+    for row in rows:
+        values = {name: table.c[name] + row[name] for name in added}
+        values.update({name: case((table.c[name] > row[name], row[name]), else_=table.c[name])
+                       for name in lowest})
+        values.update({name: case((table.c[name] < row[name], row[name]), else_=table.c[name])
+                       for name in highest})
+        result = conn.execute(update(table).where(*(table.c[key] == row[key] for key in keys))
+                              .values(**values))
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(**row))
+
+
+class LatencyStats:
+    """All-time and time-windowed latency aggregates, stored as rollup rows."""
+
+    WINDOWS = {"5m": 5 * 60, "1h": 60 * 60, "24h": 24 * 60 * 60}
+    # period -> (seconds per row, rows kept)
+    PERIODS = {"minute": (60, 60), "hour": (3600, 24)}
+
+    def __init__(self, session_factory=SessionLocal, relative_accuracy: float = 0.01):
+        self.session_factory = session_factory
+        self.relative_accuracy = relative_accuracy
+
+    def rollup(self, conn, values):
+        """
+        Fold (response time ms, epoch timestamp) pairs into the rollup rows,
+        on `conn` and inside its caller's transaction.
+        """
+        now = time.time()
+        sketches = {}   # (period, start) -> sketch
+        for value_ms, timestamp in values:
+            if value_ms is None:
+                continue
+            if timestamp is None:
+                timestamp = now
+            keys = [("all", 0)]
+            for period, (seconds, keep) in self.PERIODS.items():
+                start = int(timestamp // seconds)
+                if start > now // seconds - keep:
+                    keys.append((period, start))
+            for key in keys:
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = QuantileSketch(self.relative_accuracy)
+                sketch.add(value_ms)
+        if not sketches:
+            return
+        _upsert(conn, _ROLLUPS, [
+            {"period": period, "start": start, "count": sketch.count, "zero_count": sketch.zero_count,
+             "total_ms": sketch.total, "min_ms": sketch.min, "max_ms": sketch.max}
+            for (period, start), sketch in sketches.items()
+        ], added=("count", "zero_count", "total_ms"), lowest=("min_ms",), highest=("max_ms",))
+        _upsert(conn, _BINS, [
+            {"period": period, "start": start, "bin": index, "count": n}
+            for (period, start), sketch in sketches.items() for index, n in sketch.bins.items()
+        ], added=("count",))
+        # Drop the minutes and hours that have left every window
+        for period, (seconds, keep) in self.PERIODS.items():
+            oldest = now // seconds - keep
+            for table in (_ROLLUPS, _BINS):
+                conn.execute(delete(table).where(table.c.period == period, table.c.start <= oldest))
+
+    def _merged(self, db, period: str, first: int = None) -> QuantileSketch:
+        """Sketch of the `period` rows starting at `first` or later, merged in SQL."""
+        def rows_of(table):
+            where = [table.c.period == period]
+            if first is not None:
+                where.append(table.c.start >= first)
+            return where
+
+        merged = QuantileSketch(self.relative_accuracy)
+        count, zero_count, total, low, high = db.execute(
+            select(func.sum(_ROLLUPS.c.count), func.sum(_ROLLUPS.c.zero_count),
+                   func.sum(_ROLLUPS.c.total_ms), func.min(_ROLLUPS.c.min_ms),
+                   func.max(_ROLLUPS.c.max_ms)).where(*rows_of(_ROLLUPS))
+        ).one()
+        if not count:
+            return merged
+        merged.count, merged.zero_count, merged.total = int(count), int(zero_count), float(total)
+        merged.min, merged.max = low, high
+        merged.bins = dict(db.execute(
+            select(_BINS.c.bin, func.sum(_BINS.c.count)).where(*rows_of(_BINS)).group_by(_BINS.c.bin)
+        ).all())
+        return merged
+
+    def window(self, seconds: int, db=None) -> QuantileSketch:
+        """Merged sketch covering roughly the last `seconds` seconds."""
+        if db is None:
+            db = self.session_factory()
+            try:
+                return self.window(seconds, db)
+            finally:
+                db.close()
+        now = time.time()
+        period = "minute" if seconds <= 3600 else "hour"
+        size = self.PERIODS[period][0]
+        return self._merged(db, period, int(now // size - seconds // size + 1))
+
+    def snapshot(self) -> dict:
+        db = self.session_factory()
+        try:
+            overall = self._merged(db, "all").summary()
+            overall["windows"] = {name: self.window(seconds, db).summary()
+                                  for name, seconds in self.WINDOWS.items()}
+        finally:
+            db.close()
+        return overall
+
+    def backfill(self, batch_size: int = 10000) -> bool:
+        """
+        Build the rollups from the interactions already in the database, for
+        one logged before the rollups existed. Once there are rollup rows
+        this is a single indexed lookup, so later starts skip the scan.
+        Returns whether it scanned.
+        """
+        db = self.session_factory()
+        try:
+            if db.query(LatencyRollup.period).first() is not None \
+                    or db.query(Interaction.id).first() is None:
+                return False
+            rows = db.query(Interaction.response_time_ms, Interaction.timestamp) \
+                .execution_options(yield_per=batch_size)
+            batch = []
+            for response_time_ms, ts in rows:
+                batch.append((response_time_ms, _epoch(ts)))
+                if len(batch) >= batch_size:
+                    self.rollup(db.connection(), batch)
+                    batch = []
+            self.rollup(db.connection(), batch)
+            db.commit()
+            print("DEBUG: Built latency rollups from the interactions table")
+            return True
+        finally:
+            db.close()
+
+
+latency_stats = LatencyStats()
+
+
+# --- Fold written interactions into the rollups ---------------------------
+
+@event.listens_for(Session, "after_flush")
+def _rollup_interactions(session, flush_context):
+    # Same transaction as the INSERTs: both are committed, or neither
+    values = [(obj.response_time_ms, _epoch(obj.timestamp)) for obj in session.new
+              if isinstance(obj, Interaction)]
+    if values:
+        latency_stats.rollup(session.connection(), values)
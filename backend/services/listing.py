@@ -0,0 +1,119 @@
+"""
+Helpers for the bulk listing endpoints (/api/faqs, /api/accounts).
+
+- Keyset pagination on the primary key: a page is `WHERE id > :after
+  ORDER BY id LIMIT :n`, served from the index however deep the client
+  pages, with an opaque cursor naming the last id returned.
+- `fields=` projection: only the requested columns are selected.
+- NDJSON export: rows are streamed from a server-side cursor in batches
+  instead of being collected into one list.
+- ETags: a JSON page's ETag is a hash of the page itself, so a poll with a
+  matching If-None-Match is answered 304 without sending the rows again.
+  Deriving it from the data, not from a counter of this process's writes,
+  keeps it right when another worker or seed_db.py writes the table. The
+  page query still runs, but it is one indexed keyset read. NDJSON exports
+  have no ETag: validating one would take reading every row.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+
+# --- Cursors and projections ----------------------------------------------
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """The last id of the previous page; 400 if the cursor is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str, model, allowed: list) -> list:
+    """
+    Columns to select for a comma-separated `fields` parameter (all allowed
+    columns when empty). The id is always included, since cursors need it.
+    """
+    if not fields:
+        names = list(allowed)
+    else:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}"
+            )
+    if "id" not in names:
+        names.insert(0, "id")
+    return [getattr(model, name) for name in names]
+
+
+def page_query(model, columns: list, after: int = None, limit: int = None):
+    """SELECT of `columns` for the page after id `after`, ordered by id."""
+    stmt = select(*columns).order_by(model.id)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+async def fetch_page(db, model, columns: list, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """(rows as dicts, next cursor or None) for one keyset page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row tells whether there is a next page
+    result = await db.execute(page_query(model, columns, after, limit + 1))
+    rows = [dict(row) for row in result.mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["id"])
+    return rows, next_cursor
+
+
+async def stream_ndjson(session_factory, model, columns: list, cursor: str = None):
+    """
+    Yield every row after `cursor` as one JSON line, read from a server-side
+    cursor in batches. Opens its own session: the response outlives the
+    request's dependencies.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    stmt = page_query(model, columns, after).execution_options(yield_per=STREAM_BATCH_SIZE)
+    async with session_factory() as db:
+        result = await db.stream(stmt)
+        async for partition in result.mappings().partitions():
+            yield "".join(json.dumps(dict(row)) + "\n" for row in partition)
+
+
+# --- ETags ----------------------------------------------------------------
+
+def content_etag(body) -> str:
+    """Weak ETag for a JSON response body: changes whenever any of its data does."""
+    raw = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return 'W/"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
@@ -0,0 +1,168 @@
+"""
+Per-request stage tracing and Prometheus metrics.
+
+Each API request starts a RequestTrace held in a context variable. The
+stage pools copy the context into their worker threads, so the services
+can report which provider served them (or failed) without any change to
+their signatures. On exit each timed stage feeds the Prometheus
+histograms and its timing and provider end up on the Interaction row.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 30)
+
+STAGE_LATENCY = Histogram(
+    "voicebot_stage_latency_seconds",
+    "Latency of one pipeline stage",
+    ["endpoint", "stage", "provider"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_LATENCY = Histogram(
+    "voicebot_request_latency_seconds",
+    "End-to-end latency of a voice bot turn",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+PROVIDER_FALLBACKS = Counter(
+    "voicebot_provider_fallbacks_total",
+    "Provider attempts that failed and fell through to the next provider",
+    ["endpoint", "stage", "provider"],
+)
+FAQ_LOOKUPS = Counter(
+    "voicebot_faq_lookups_total",
+    "FAQ index lookups by outcome",
+    ["endpoint", "result"],
+)
+RESPONSE_CACHE = Counter(
+    "voicebot_response_cache_lookups_total",
+    "Reply cache lookups in front of the NLU chain, by outcome",
+    ["endpoint", "result"],
+)
+LLM_HEDGES = Counter(
+    "voicebot_llm_hedges_total",
+    "Hedge requests fired because the primary LLM was slower than the hedge delay",
+    ["endpoint", "primary"],
+)
+LLM_WINS = Counter(
+    "voicebot_llm_wins_total",
+    "LLM answers used, by the backend that answered first",
+    ["endpoint", "backend"],
+)
+INTENT_ROUTES = Counter(
+    "voicebot_intent_routes_total",
+    "Requests by routed intent and by what decided it (pattern or classifier)",
+    ["endpoint", "intent", "method"],
+)
+DEADLINE_DEGRADATIONS = Counter(
+    "voicebot_deadline_degradations_total",
+    "Stages that gave a reduced answer (canned reply, no audio) to stay within the request deadline",
+    ["endpoint", "stage"],
+)
+STAGE_ERRORS = Counter(
+    "voicebot_stage_errors_total",
+    "Stages that raised instead of producing a result",
+    ["endpoint", "stage"],
+)
+
+STAGES = ("stt", "nlu", "tts")
+
+_current_trace = contextvars.ContextVar("voicebot_trace", default=None)
+
+
+class RequestTrace:
+    """Timings and providers of the stages of one request."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.monotonic()
+        self.timings_ms = {}
+        self.providers = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Time a stage and export it; exceptions count as stage errors."""
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            STAGE_ERRORS.labels(self.endpoint, stage).inc()
+            raise
+        finally:
+            self.record_stage(stage, time.monotonic() - start)
+
+    def record_stage(self, stage: str, elapsed: float):
+        """Record a stage timed by the caller (e.g. across a stream)."""
+        self.timings_ms[stage] = round(elapsed * 1000, 2)
+        provider = self.providers.get(stage, "none")
+        STAGE_LATENCY.labels(self.endpoint, stage, provider).observe(elapsed)
+
+    def finish(self) -> float:
+        """Record the end-to-end latency; returns it in milliseconds."""
+        elapsed_ms = self.elapsed_ms()
+        REQUEST_LATENCY.labels(self.endpoint).observe(elapsed_ms / 1000)
+        return elapsed_ms
+
+    def interaction_fields(self) -> dict:
+        """Per-stage columns for the Interaction row."""
+        fields = {"endpoint": self.endpoint}
+        for stage in STAGES:
+            fields[f"{stage}_ms"] = self.timings_ms.get(stage)
+        fields["stt_provider"] = self.providers.get("stt")
+        fields["nlu_source"] = self.providers.get("nlu")
+        fields["tts_provider"] = self.providers.get("tts")
+        return fields
+
+
+def start_trace(endpoint: str) -> RequestTrace:
+    trace = RequestTrace(endpoint)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_endpoint() -> str:
+    trace = _current_trace.get()
+    return trace.endpoint if trace else "other"
+
+
+def record_provider(stage: str, provider: str):
+    """Called by a service when `provider` produced the stage's result."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.providers[stage] = provider
+
+
+def record_fallback(stage: str, provider: str):
+    """Called by a service when `provider` failed and the next one is tried."""
+    PROVIDER_FALLBACKS.labels(current_endpoint(), stage, provider).inc()
+
+
+def record_faq_lookup(hit: bool):
+    FAQ_LOOKUPS.labels(current_endpoint(), "hit" if hit else "miss").inc()
+
+
+def record_intent(intent: str, method: str):
+    INTENT_ROUTES.labels(current_endpoint(), intent, method).inc()
+
+
+def record_response_cache(hit: bool):
+    RESPONSE_CACHE.labels(current_endpoint(), "hit" if hit else "miss").inc()
+
+
+def record_llm_hedge(primary: str):
+    LLM_HEDGES.labels(current_endpoint(), primary).inc()
+
+
+def record_llm_win(backend: str):
+    LLM_WINS.labels(current_endpoint(), backend).inc()
+
+
+def record_degraded(stage: str):
+    DEADLINE_DEGRADATIONS.labels(current_endpoint(), stage).inc()
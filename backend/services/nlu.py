@@ -1,11 +1,36 @@
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-import requests
+from backend.services.deadline import degrade, degraded, has_time, out_of_time, time_left
+from backend.services.faq_index import faq_index, match_faq
+from backend.services.faq_vectors import match_faq_vector
+from backend.services.hedging import llm_hedger
+from backend.services.intents import fallback_rule, intent_router
+from backend.services.metrics import (
+    record_faq_lookup, record_fallback, record_intent, record_llm_hedge, record_llm_win,
+    record_provider, record_response_cache
+)
+from backend.services.ollama import ollama_client
+from backend.services.providers import openai_client
+from backend.services.response_cache import ResponseCache
+from backend.services.sessions import session_manager
 
-load_dotenv()
+# Replies by source; FAQ entries are dropped whenever the FAQ index changes.
+# "account" has no TTL: those answers belong to one caller and are never shared
+_LLM_TTL = float(os.getenv("NLU_CACHE_TTL_LLM", "300"))
+response_cache = ResponseCache(
+    ttls={
+        "faq": float(os.getenv("NLU_CACHE_TTL_FAQ", "86400")),
+        "rules": float(os.getenv("NLU_CACHE_TTL_RULES", "86400")),
+        "gpt": _LLM_TTL,
+        "ollama": _LLM_TTL,
+    },
+    max_entries=int(os.getenv("NLU_CACHE_MAX_ENTRIES", "1000")),
+    validators={"faq": lambda: faq_index.version},
+    enabled=os.getenv("NLU_CACHE_ENABLED", "true").lower() != "false",
+)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# LLM replies depend on the conversation so far, so they are only shared
+# between turns that have no history
+LLM_SOURCES = ("gpt", "ollama")
 
 SYSTEM_PROMPT = """
 You are an intelligent customer support voice bot for a banking institution. 
@@ -15,18 +40,53 @@ When providing account information, be clear and professional.
 If you don't have specific information, guide users on how to get help.
 """
 
-def query_database(user_text: str) -> dict:
+# GPT also gets context about available data
+GPT_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+            
+You have access to a database with:
+- Customer account information (balance, account number, contact details)
+- Frequently asked questions about banking services
+
+If the user asks about their account or common banking questions, provide helpful responses.
+"""
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+
+# bm25 (word overlap), vector (embedding similarity), or hybrid: BM25 first,
+# then vectors for paraphrases it misses
+FAQ_RETRIEVAL = os.getenv("FAQ_RETRIEVAL", "hybrid").lower()
+
+def match_faq_any(user_text: str):
+    """Best FAQ for `user_text` using the configured retrieval mode, or None."""
+    best_match = None
+    if FAQ_RETRIEVAL != "vector":
+        best_match = match_faq(user_text)
+    if best_match is None and FAQ_RETRIEVAL in ("vector", "hybrid"):
+        best_match = match_faq_vector(user_text)
+    return best_match
+
+def route_intent(user_text: str):
+    """Where this request goes: account, faq, rule or llm (see intents.py)."""
+    route = intent_router.route(user_text)
+    record_intent(route.intent, route.method)
+    return route
+
+def query_database(user_text: str, intent: str = None) -> dict:
     """
     Query the database for FAQs and Account information.
     Returns a dict with 'type' and 'data' if found, None otherwise.
     """
+    if intent is None:
+        intent = route_intent(user_text).intent
+    if intent == "llm":
+        # Routed straight to the LLM: no FAQ lookup
+        return None
     try:
-        from database import SessionLocal, FAQ, Account
+        from database import SessionLocal, Account
         db = SessionLocal()
-        text_lower = user_text.lower()
         
         # Check for Account-related queries
-        if any(keyword in text_lower for keyword in ["account", "balance", "my account", "account details", "account info"]):
+        if intent == "account":
             # For demo purposes, we'll return the first account
             # In production, you'd authenticate and get the specific user's account
             account = db.query(Account).first()
@@ -45,29 +105,18 @@ def query_database(user_text: str) -> dict:
                     }
                 }
         
-        # Check for FAQ queries - Use fuzzy matching
-        faqs = db.query(FAQ).all()
-        best_match = None
-        best_score = 0
-        
-        for faq in faqs:
-            # Simple word matching score
-            faq_words = set(faq.question.lower().split())
-            user_words = set(text_lower.split())
-            common_words = faq_words.intersection(user_words)
-            score = len(common_words)
-            
-            if score > best_score and score >= 2:  # At least 2 words match
-                best_score = score
-                best_match = faq
+        # Check for FAQ queries - BM25 index, then embedding similarity
+        best_match = match_faq_any(user_text)
+        record_faq_lookup(best_match is not None)
         
         if best_match:
             db.close()
             return {
                 "type": "faq",
                 "data": {
-                    "question": best_match.question,
-                    "answer": best_match.answer
+                    "question": best_match["question"],
+                    "answer": best_match["answer"],
+                    "confidence": best_match["confidence"]
                 }
             }
         
@@ -79,57 +128,180 @@ def query_database(user_text: str) -> dict:
         return None
 
 
-def query_ollama(system_prompt: str, user_text: str) -> str:
+def _chat_messages(system_prompt: str, user_text: str, history=()) -> list:
+    """System prompt, then the session history (see sessions.py), then the user turn."""
+    return [
+        {"role": "system", "content": system_prompt},
+        *history,
+        {"role": "user", "content": user_text}
+    ]
+
+
+def query_ollama(system_prompt: str, user_text: str, cancel=None, history=()) -> str:
     """
     Attempts to generate a response using a local Ollama instance.
+    With a `cancel` event the reply is streamed, and the request is dropped
+    (stopping generation) as soon as the event is set.
     """
     try:
-        # First check if Ollama is running with a quick timeout
+        messages = _chat_messages(system_prompt, user_text, history)
+        timeout = time_left("nlu", ollama_client.timeout)
+        if cancel is None:
+            return ollama_client.chat(messages, timeout=timeout)
+        tokens = ollama_client.chat_stream(messages, timeout=timeout)
         try:
-            requests.get("http://localhost:11434", timeout=1)
-        except requests.exceptions.ConnectionError:
-            print("DEBUG: Ollama not running (connection refused). Skipping.")
-            return None
-        except Exception:
-            pass
-
-        # Try standard models: llama3, mistral, llama2
-        models = ["llama3", "mistral", "llama2"]
-        
-        for model in models:
-            try:
-                url = "http://localhost:11434/api/chat"
-                payload = {
-                    "model": model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_text}
-                    ],
-                    "stream": False
-                }
-                print(f"DEBUG: Trying Ollama with model {model}...")
-                response = requests.post(url, json=payload, timeout=5) # Reduced timeout
-                if response.status_code == 200:
-                    return response.json().get("message", {}).get("content", "")
-            except Exception:
-                continue
-                
-        return None
+            parts = []
+            for token in tokens:
+                if cancel.is_set():
+                    return None
+                parts.append(token)
+            return "".join(parts)
+        finally:
+            tokens.close()
     except Exception as e:
         print(f"Ollama Connection Error: {e}")
         return None
 
 
-def generate_response(user_text: str) -> str:
+def stream_gpt(user_text: str, history=()):
+    """
+    Streams a GPT reply token by token. Raises on failure; closing the
+    generator closes the connection.
+    """
+    stream = openai_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=_chat_messages(GPT_SYSTEM_PROMPT, user_text, history),
+        stream=True,
+        timeout=time_left("nlu", OPENAI_TIMEOUT)
+    )
+    with stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def query_gpt(user_text: str, cancel=None, history=()) -> str:
+    """
+    Generates a response with OpenAI GPT. The reply is streamed so that a
+    `cancel` event can close the connection early. Returns None on failure.
+    """
+    tokens = stream_gpt(user_text, history)
+    try:
+        parts = []
+        for token in tokens:
+            if cancel is not None and cancel.is_set():
+                return None
+            parts.append(token)
+        return "".join(parts) or None
+    except Exception as e:
+        record_fallback("nlu", "gpt")
+        print(f"OpenAI NLU Error: {e}")
+        return None
+    finally:
+        tokens.close()
+
+
+def _llm_backends(user_text: str, history=()) -> list:
+    """LLM backends for the hedger, in order of preference."""
+    def ollama(cancel):
+        print("DEBUG: Attempting Local LLM (Ollama)...")
+        response = query_ollama(SYSTEM_PROMPT, user_text, cancel, history)
+        if not response and not cancel.is_set():
+            record_fallback("nlu", "ollama")
+        return response
+
+    backends = []
+    if os.getenv("OPENAI_API_KEY"):
+        backends.append(("gpt", lambda cancel: query_gpt(user_text, cancel, history)))
+    backends.append(("ollama", ollama))
+    return backends
+
+
+def stream_ollama(system_prompt: str, user_text: str, history=()):
+    """
+    Streams a response from the local Ollama instance token by token.
+    """
+    try:
+        yield from ollama_client.chat_stream(_chat_messages(system_prompt, user_text, history),
+                                             timeout=time_left("nlu", ollama_client.timeout))
+    except Exception as e:
+        print(f"Ollama Connection Error: {e}")
+
+
+def generate_response(user_text: str, session_id: str = None) -> str:
     """
     Generates a response using GPT with database integration, Ollama and rule-based fallbacks.
-    Priority: Database -> GPT -> Ollama -> Rule-based
+    Priority: Response cache -> Database -> GPT (hedged with Ollama) -> Rule-based
+    With a `session_id`, the LLM sees the conversation so far and the turn
+    is added to it.
     """
+    response, session = generate_reply(user_text, session_id)
+    if session is not None:
+        session_manager.record_turn(session, user_text, response)
+    return response
+
+
+def generate_reply(user_text: str, session_id: str = None):
+    """
+    Like generate_response, but leaves the turn out of the session:
+    returns (response, session) for record_reply once the reply is sent.
+    A caller that stops waiting and answers something else must not have
+    a reply it never heard in its history.
+    """
+    session = session_manager.load(session_id) if session_id else None
+    history = session_manager.history(session)
+    return _cached_or_generated(user_text, session, history), session
+
+
+def record_reply(user_text: str, response: str, session_id: str = None, session=None):
+    """Add the turn, with the reply the caller was actually given, to its session."""
+    if session is None and session_id:
+        session = session_manager.load(session_id)
+    if session is not None:
+        session_manager.record_turn(session, user_text, response)
+
+
+def _cached_or_generated(user_text: str, session, history: list) -> str:
+    route = route_intent(user_text)
+    # Account questions are answered per caller and bypass the cache entirely
+    if route.intent == "account":
+        return _generate_response(user_text, session, history, route)[0]
+    
+    cached = response_cache.get(user_text, exclude=LLM_SOURCES if history else ())
+    record_response_cache(cached is not None)
+    if cached:
+        record_provider("nlu", "cache")
+        return cached[0]
+    
+    response, source = _generate_response(user_text, session, history, route)
+    # A reply cut short by the deadline is not what the question deserves
+    if not (history and source in LLM_SOURCES) and not degraded("nlu"):
+        response_cache.put(user_text, response, source)
+    return response
+
+
+def _generate_response(user_text: str, session=None, history=(), route=None) -> tuple:
+    """
+    The uncached NLU chain. Returns (response, source), where source is
+    faq, account, gpt, ollama, rules or echo.
+    """
+    route = route or route_intent(user_text)
+    
+    # 0. Small talk gets its canned reply; account details this session
+    # already resolved (and GPT already phrased) are reused
+    if route.intent == "rule":
+        return _rule_response(user_text, route.rule)
+    if session is not None and route.intent == "account":
+        known = session.cached_account(session_manager.account_ttl_s)
+        if known is not None:
+            record_provider("nlu", "account")
+            return known[1], "account"
     
     # 1. Check Database First (FAQs and Account Info)
-    db_result = query_database(user_text)
+    db_result = query_database(user_text, route.intent)
     
     if db_result:
+        record_provider("nlu", db_result["type"])
         if db_result["type"] == "account":
             # Format account information nicely
             acc = db_result["data"]
@@ -140,68 +312,159 @@ def generate_response(user_text: str) -> str:
             response += f"Status {acc['status']}. "
             response += f"Your registered email is {acc['email']} and phone is {acc['phone']}."
             
-            # Use GPT to make it more conversational if available
-            if os.getenv("OPENAI_API_KEY"):
+            # Use GPT to make it more conversational if available (and there is time)
+            if os.getenv("OPENAI_API_KEY") and not has_time("nlu"):
+                degrade("nlu", "account details not rephrased")
+            elif os.getenv("OPENAI_API_KEY"):
                 try:
-                    gpt_response = client.chat.completions.create(
+                    gpt_response = openai_client().chat.completions.create(
                         model="gpt-3.5-turbo",
                         messages=[
                             {"role": "system", "content": "You are a helpful banking assistant. Rephrase the following account information in a friendly, conversational way suitable for voice output. Keep it concise."},
                             {"role": "user", "content": response}
-                        ]
+                        ],
+                        timeout=time_left("nlu", OPENAI_TIMEOUT)
                     )
-                    return gpt_response.choices[0].message.content
+                    response = gpt_response.choices[0].message.content
                 except Exception as e:
                     print(f"GPT formatting error: {e}")
-                    return response
-            return response
+            if session is not None:
+                session.remember_account(acc, response)
+            return response, "account"
             
         elif db_result["type"] == "faq":
             # Return FAQ answer directly
-            return db_result["data"]["answer"]
+            return db_result["data"]["answer"], "faq"
+    
+    # 2. GPT, hedged with / raced against Ollama (local fallback), for
+    # as long as the request's deadline allows
+    if has_time("nlu"):
+        name, llm_response = llm_hedger.call(_llm_backends(user_text, history), on_hedge=record_llm_hedge,
+                                             timeout=time_left("nlu"))
+        if llm_response:
+            record_provider("nlu", name)
+            record_llm_win(name)
+            return llm_response, name
+    if not has_time("nlu"):
+        degrade("nlu", "no time left for the LLM")
+
+    # 3. Rule-based Fallback
+    return _rule_response(user_text)
+
+
+RULE_REPLIES = {
+    "greeting": "Hello! I'm your banking voice assistant. How can I help you today?",
+    "help": "I can help you with account details, FAQs, balance inquiries, and general banking questions. What would you like to know?",
+    "name": "I am your intelligent banking voice assistant, powered by AI.",
+    "goodbye": "Goodbye! Thank you for using our service. Have a great day!",
+    "thanks": "You're welcome! Is there anything else I can help you with?",
+    "no_speech": "Sorry, I didn't catch that. Could you say it again?",
+    "timeout": "Sorry, that took me too long. Could you please try again?",
+}
+
+
+def fallback_response(user_text: str) -> str:
+    """Canned reply for `user_text`, for when the NLU chain did not answer in time."""
+    return _rule_response(user_text)[0]
+
+
+def _rule_response(user_text: str, rule: str = None) -> tuple:
+    """
+    Canned replies, for small talk routed here and whenever no LLM answers.
+    Returns (response, source).
+    """
+    print("DEBUG: Using rule-based reply.")
+    record_provider("nlu", "rules")
+    rule = rule or fallback_rule(user_text)
+    if rule in RULE_REPLIES:
+        return RULE_REPLIES[rule], "rules"
+    if degraded("nlu"):
+        # Out of time, not out of understanding: don't ask to rephrase
+        return RULE_REPLIES["timeout"], "rules"
+    # Echoes the exact wording, so it is not cached
+    return f"I heard you say: {user_text}. I'm here to help with account information and banking questions. Could you please rephrase your question?", "echo"
+
+
+def stream_response(user_text: str, cancel=None, session_id: str = None):
+    """
+    Streaming variant of generate_response: yields the reply in pieces as
+    they are produced. Cached, FAQ, account and rule answers come as one
+    piece; LLM answers token by token (GPT, or Ollama if GPT fails before
+    its first token). Stops early once `cancel` is set.
+    """
+    session = session_manager.load(session_id) if session_id else None
+    history = session_manager.history(session)
+    parts = []
+    for piece in _stream_response(user_text, cancel, session, history):
+        parts.append(piece)
+        yield piece
+    if session is not None and parts and not (cancel is not None and cancel.is_set()):
+        session_manager.record_turn(session, user_text, "".join(parts))
+
+
+def _stream_response(user_text: str, cancel, session, history: list):
+    route = route_intent(user_text)
+    if route.intent == "account":
+        yield _generate_response(user_text, session, history, route)[0]
+        return
+    
+    cached = response_cache.get(user_text, exclude=LLM_SOURCES if history else ())
+    record_response_cache(cached is not None)
+    if cached:
+        record_provider("nlu", "cache")
+        yield cached[0]
+        return
     
-    # 2. Try OpenAI GPT (with database context)
+    if route.intent == "rule":
+        response, source = _rule_response(user_text, route.rule)
+        response_cache.put(user_text, response, source)
+        yield response
+        return
+    
+    db_result = query_database(user_text, route.intent)
+    if db_result and db_result["type"] == "faq":
+        record_provider("nlu", "faq")
+        response_cache.put(user_text, db_result["data"]["answer"], "faq")
+        yield db_result["data"]["answer"]
+        return
+    
+    streams = []
     if os.getenv("OPENAI_API_KEY"):
+        streams.append(("gpt", stream_gpt))
+    streams.append(("ollama", lambda text, history: stream_ollama(SYSTEM_PROMPT, text, history)))
+    for name, open_stream in streams:
+        if not has_time("nlu"):
+            degrade("nlu", "no time left for the LLM")
+            break
+        tokens = open_stream(user_text, history)
+        parts = []
+        completed = False
         try:
-            # Provide context about available data
-            enhanced_prompt = SYSTEM_PROMPT + """
-            
-You have access to a database with:
-- Customer account information (balance, account number, contact details)
-- Frequently asked questions about banking services
-
-If the user asks about their account or common banking questions, provide helpful responses.
-"""
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo", 
-                messages=[
-                    {"role": "system", "content": enhanced_prompt},
-                    {"role": "user", "content": user_text}
-                ]
-            )
-            return response.choices[0].message.content
+            for token in tokens:
+                if cancel is not None and cancel.is_set():
+                    return
+                if out_of_time("nlu"):
+                    degrade("nlu", "LLM reply cut off at the deadline")
+                    break
+                parts.append(token)
+                yield token
+            else:
+                completed = True
         except Exception as e:
-            print(f"OpenAI NLU Error: {e}")
-    
-    # 3. Try Ollama (Local Fallback)
-    print("DEBUG: Attempting Local LLM (Ollama)...")
-    ollama_response = query_ollama(SYSTEM_PROMPT, user_text)
-    if ollama_response:
-        return ollama_response
-
-    # 4. Rule-based Fallback
-    print("DEBUG: Using rule-based fallback.")
-    text_lower = user_text.lower()
+            print(f"{name} streaming error: {e}")
+        finally:
+            tokens.close()
+        if parts:
+            # A stream cut off midway still ends the reply (the client has
+            # already heard its beginning), but is not cached
+            record_provider("nlu", name)
+            record_llm_win(name)
+            if completed and not history:
+                response_cache.put(user_text, "".join(parts), name)
+            return
+        record_fallback("nlu", name)
     
-    if any(word in text_lower for word in ["hello", "hi", "hey"]):
-        return "Hello! I'm your banking voice assistant. How can I help you today?"
-    elif "help" in text_lower:
-        return "I can help you with account details, FAQs, balance inquiries, and general banking questions. What would you like to know?"
-    elif "name" in text_lower:
-        return "I am your intelligent banking voice assistant, powered by AI."
-    elif any(word in text_lower for word in ["bye", "goodbye", "see you"]):
-        return "Goodbye! Thank you for using our service. Have a great day!"
-    elif "thank" in text_lower:
-        return "You're welcome! Is there anything else I can help you with?"
-    else:
-        return f"I heard you say: {user_text}. I'm here to help with account information and banking questions. Could you please rephrase your question?"
+    response, source = _rule_response(user_text)
+    if not degraded("nlu"):
+        response_cache.put(user_text, response, source)
+    yield response
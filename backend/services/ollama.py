@@ -0,0 +1,184 @@
+"""
+Long-lived client for a local Ollama server.
+
+One pooled HTTP session is reused for every request. The installed models
+are discovered from /api/tags and cached, and that same call doubles as
+the health check, so a normal chat request costs exactly one round trip.
+Requests pass keep_alive so Ollama keeps the model loaded between turns.
+"""
+
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OllamaClient:
+    """
+    Pooled, model-aware Ollama client.
+
+    Health is cached for `health_ttl` seconds (a down server is not retried
+    on every request) and the model list for `models_ttl` seconds. The
+    model used is the first of `preferred_models` that is installed, or any
+    installed model if none of them are.
+    """
+
+    def __init__(self, base_url: str = None, preferred_models: list = None,
+                 keep_alive: str = None, timeout: float = None,
+                 health_ttl: float = 10.0, models_ttl: float = 300.0, pool_size: int = 4):
+        self.base_url = (base_url or os.getenv("OLLAMA_URL", "http://localhost:11434")).rstrip("/")
+        if preferred_models is None:
+            preferred_models = os.getenv("OLLAMA_MODELS", "llama3,mistral,llama2").split(",")
+        self.preferred_models = [m.strip() for m in preferred_models if m.strip()]
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "10m")
+        self.timeout = timeout if timeout is not None else float(os.getenv("OLLAMA_TIMEOUT", "5"))
+        self.health_ttl = health_ttl
+        self.models_ttl = models_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._healthy = None
+        self._health_checked = 0.0
+        self._models = []
+        self._models_checked = 0.0
+
+    def refresh(self) -> bool:
+        """Fetch /api/tags: updates both the health flag and the model list."""
+        try:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=1)
+            response.raise_for_status()
+            models = [m.get("name", "") for m in response.json().get("models", [])]
+            healthy = True
+        except requests.exceptions.RequestException as e:
+            print(f"DEBUG: Ollama not reachable: {e}")
+            models, healthy = [], False
+        now = time.monotonic()
+        with self._lock:
+            self._healthy = healthy
+            self._health_checked = now
+            if healthy:
+                self._models = models
+                self._models_checked = now
+        return healthy
+
+    def is_available(self) -> bool:
+        """Cached health check."""
+        now = time.monotonic()
+        stale_health = self._healthy is None or now - self._health_checked >= self.health_ttl
+        stale_models = self._healthy and now - self._models_checked >= self.models_ttl
+        if stale_health or stale_models:
+            return self.refresh()
+        return self._healthy
+
+    def models(self) -> list:
+        self.is_available()
+        return list(self._models)
+
+    def pick_model(self):
+        """Installed model to use, or None if nothing is installed."""
+        installed = self.models()
+        for preferred in self.preferred_models:
+            for name in installed:
+                if name == preferred or name.split(":")[0] == preferred:
+                    return name
+        return installed[0] if installed else None
+
+    def _mark_down(self):
+        with self._lock:
+            self._healthy = False
+            self._health_checked = time.monotonic()
+
+    def _payload(self, messages: list, model: str, stream: bool) -> dict:
+        return {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+
+    def chat(self, messages: list, timeout: float = None):
+        """
+        Single-shot chat completion. Returns the reply text, or None if
+        Ollama is down, has no usable model or `timeout` leaves no time.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if timeout <= 0:
+            print("DEBUG: No time left for Ollama")
+            return None
+        if not self.is_available():
+            return None
+        model = self.pick_model()
+        if model is None:
+            print("DEBUG: Ollama has no models installed")
+            return None
+
+        print(f"DEBUG: Querying Ollama with model {model}...")
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/chat",
+                json=self._payload(messages, model, stream=False),
+                timeout=timeout
+            )
+        except requests.exceptions.ConnectionError:
+            self._mark_down()
+            return None
+        if response.status_code == 404:
+            # Model removed since the last discovery
+            self.refresh()
+            return None
+        response.raise_for_status()
+        return response.json().get("message", {}).get("content", "")
+
+    def chat_stream(self, messages: list, timeout: float = None):
+        """
+        Streamed chat completion: yields content tokens as Ollama produces
+        them. Yields nothing if Ollama is down, has no usable model or
+        `timeout` leaves no time.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if timeout <= 0:
+            print("DEBUG: No time left for Ollama")
+            return
+        if not self.is_available():
+            return
+        model = self.pick_model()
+        if model is None:
+            return
+
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/chat",
+                json=self._payload(messages, model, stream=True),
+                timeout=timeout,
+                stream=True
+            )
+        except requests.exceptions.ConnectionError:
+            self._mark_down()
+            return
+        with response:
+            if response.status_code == 404:
+                self.refresh()
+                return
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("message", {}).get("content", "")
+                if token:
+                    yield token
+                if chunk.get("done"):
+                    break
+
+    def close(self):
+        self.session.close()
+
+
+ollama_client = OllamaClient()
@@ -0,0 +1,174 @@
+"""
+Provider clients, created on first use and shared by every stage.
+
+Importing the app used to import every vendor SDK and build a client per
+service module (three OpenAI clients, one per stt/nlu/tts), while the
+Azure and Google Cloud TTS clients were rebuilt on every call. Now each
+backend registers a factory here, and the registry imports and builds it
+the first time it is asked for, then hands out the same instance: one
+OpenAI client, with one pooled HTTP connection pool, serves Whisper, GPT
+and OpenAI TTS.
+
+So that the first request does not pay for the imports either, the app
+warms the configured providers in a background thread once it is up
+(PROVIDERS_WARM=true); a request that gets there first builds the provider
+itself, and the warm-up then finds it cached.
+"""
+
+import os
+import threading
+import time
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+
+
+class ProviderRegistry:
+    """
+    Lazily built, shared provider clients by name.
+
+    `register(name, factory, configured)` records how to build one;
+    `get(name)` builds it on first use (once, even when several threads
+    ask at the same time) and returns the cached instance afterwards. A
+    factory that raises is not cached, so the next call tries again.
+    """
+
+    def __init__(self):
+        self._factories = {}   # name -> (factory, configured)
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.load_ms = {}
+        self.failures = {}
+
+    def register(self, name: str, factory, configured=None):
+        """
+        `factory()` returns the provider; `configured()` says whether it has
+        the credentials it needs, so warm() can skip it (default: always).
+        """
+        with self._lock:
+            self._factories[name] = (factory, configured)
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str):
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown provider: {name}")
+            factory, _ = self._factories[name]
+            lock = self._locks[name]
+        # One lock per provider: a slow import does not hold up the others
+        with lock:
+            if name in self._instances:
+                return self._instances[name]
+            start = time.monotonic()
+            try:
+                instance = factory()
+            except Exception:
+                with self._lock:
+                    self.failures[name] = self.failures.get(name, 0) + 1
+                raise
+            elapsed_ms = (time.monotonic() - start) * 1000
+            print(f"DEBUG: Provider {name} loaded in {elapsed_ms:.0f} ms")
+            with self._lock:
+                self.load_ms[name] = round(elapsed_ms, 1)
+                self._instances[name] = instance
+            return instance
+
+    def loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def configured(self, name: str) -> bool:
+        with self._lock:
+            _, configured = self._factories[name]
+        return configured is None or bool(configured())
+
+    def warm(self, names: list = None) -> dict:
+        """
+        Build the configured providers among `names` (default: all) ahead of
+        the first request. Returns name -> True/False (loaded or failed).
+        """
+        with self._lock:
+            names = list(self._factories) if names is None else list(names)
+        results = {}
+        for name in names:
+            if not self.configured(name):
+                continue
+            try:
+                self.get(name)
+                results[name] = True
+            except Exception as e:
+                print(f"DEBUG: Provider {name} could not be loaded: {e}")
+                results[name] = False
+        return results
+
+    def start_warming(self, names: list = None) -> threading.Thread:
+        thread = threading.Thread(target=self.warm, args=(names,), name="provider-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Close the cached clients that hold connections (on shutdown)."""
+        with self._lock:
+            instances = list(self._instances.items())
+            self._instances.clear()
+            self.load_ms.clear()
+        for name, instance in instances:
+            close = getattr(instance, "close", None)
+            if callable(close) and not isinstance(instance, type):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"DEBUG: Provider {name} did not close cleanly: {e}")
+
+    def reset(self, name: str = None):
+        """Drop cached instances (all, or `name`'s) so they are rebuilt on next use."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+                self.load_ms.clear()
+            else:
+                self._instances.pop(name, None)
+                self.load_ms.pop(name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            names = sorted(self._factories)
+            load_ms = dict(self.load_ms)
+            failures = dict(self.failures)
+        return {
+            "registered": names,
+            "configured": [name for name in names if self.configured(name)],
+            "loaded": load_ms,
+            "failures": failures,
+        }
+
+
+providers = ProviderRegistry()
+
+
+def _openai_client():
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    # The per-call timeout (time left in the request's deadline) overrides OPENAI_TIMEOUT
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=OPENAI_TIMEOUT,
+        http_client=DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                max_keepalive_connections=OPENAI_MAX_KEEPALIVE),
+        ),
+    )
+
+
+providers.register("openai", _openai_client, configured=lambda: os.getenv("OPENAI_API_KEY"))
+
+
+def openai_client():
+    """The shared OpenAI client (Whisper, GPT and TTS)."""
+    return providers.get("openai")
@@ -0,0 +1,118 @@
+"""
+Cache of generated replies, in front of the NLU chain.
+
+Callers ask the same few questions over and over, in slightly different
+words. Replies are cached under a normalized form of the question (case,
+punctuation, whitespace and filler words removed), so "Um, what are your
+operating hours?" and "what are your operating hours" share one entry.
+
+How long a reply stays valid depends on where it came from: FAQ and rule
+answers are stable, LLM answers are kept only briefly. Sources without a
+TTL are never cached; that includes account answers, which are specific to
+the caller. Entries from a versioned source (the FAQ index) are dropped as
+soon as the source changes.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+FILLER_WORDS = {
+    "um", "umm", "uh", "uhh", "er", "erm", "ah", "hmm", "mm",
+    "please", "kindly", "just", "actually", "basically", "so", "well",
+    "okay", "ok",
+}
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a user utterance."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    # Drop apostrophes first so "what's" stays one word
+    text = _PUNCTUATION_RE.sub(" ", text.replace("'", "").replace("’", ""))
+    return " ".join(word for word in text.split() if word not in FILLER_WORDS)
+
+
+class ResponseCache:
+    """
+    LRU cache of (reply, source) by normalized query, bounded to
+    `max_entries`, with a TTL in seconds per source.
+
+    `validators` maps a source to a callable returning its current version;
+    an entry stored under an older version is treated as a miss.
+    """
+
+    def __init__(self, ttls: dict, max_entries: int = 1000, validators: dict = None,
+                 enabled: bool = True):
+        self.ttls = {source: ttl for source, ttl in ttls.items() if ttl > 0}
+        self.max_entries = max(1, max_entries)
+        self.validators = validators or {}
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (reply, source, expires_at, version)
+        self.hits = {}
+        self.misses = 0
+        self.evictions = 0
+
+    def _version(self, source: str):
+        validator = self.validators.get(source)
+        return validator() if validator is not None else None
+
+    def get(self, text: str, exclude=()):
+        """(reply, source) cached for `text`, or None. Entries from `exclude` sources are misses."""
+        if not self.enabled:
+            return None
+        key = normalize_query(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                reply, source, expires_at, version = entry
+                if expires_at > now and version == self._version(source):
+                    if source not in exclude:
+                        self._entries.move_to_end(key)
+                        self.hits[source] = self.hits.get(source, 0) + 1
+                        return reply, source
+                else:
+                    del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text: str, reply: str, source: str) -> bool:
+        """Cache `reply` if `source` is cacheable. Returns whether it was stored."""
+        ttl = self.ttls.get(source)
+        if not self.enabled or not ttl or not reply:
+            return False
+        key = normalize_query(text)
+        if not key:
+            return False
+        with self._lock:
+            self._entries[key] = (reply, source, time.monotonic() + ttl, self._version(source))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": dict(self.ttls),
+                "hits": hits,
+                "hits_by_source": dict(self.hits),
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,261 @@
+"""
+Latency- and health-aware routing across interchangeable providers.
+
+Each ProviderRouter tracks, per backend, an EWMA of call latency and a
+rolling window of outcomes. Repeated failures open the backend's circuit
+so requests skip it instead of paying its timeout; after a cooldown the
+circuit goes half-open and is probed (in the background when a probe is
+registered, otherwise by letting one live request through). Healthy
+backends are tried fastest first.
+
+A call that fails because the request's own deadline ran out (see
+deadline.py) says nothing about the provider, so it is not counted: a
+client asking for a tiny X-Deadline-Ms must not be able to open a healthy
+provider's circuit for everyone.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from backend.services.deadline import has_time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderHealth:
+    """Rolling health statistics and circuit state for one provider."""
+
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.state = CLOSED
+        self.ewma_latency_ms = None
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.last_error = None
+        self.trial_started = 0.0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "ewma_latency_ms": round(self.ewma_latency_ms, 1) if self.ewma_latency_ms is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderRouter:
+    """
+    Chooses the order in which to try providers of one kind (STT, TTS, ...).
+
+    A provider's circuit opens after `failure_threshold` consecutive
+    failures, or when at least half of the last `window` calls failed.
+    While open it is skipped for `cooldown_s` seconds.
+    """
+
+    def __init__(self, kind: str, failure_threshold: int = 3, cooldown_s: float = 30.0,
+                 window: int = 20, ewma_alpha: float = 0.3):
+        self.kind = kind
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.window = window
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._health = {}
+        self._probes = {}
+
+    def _get(self, name: str) -> ProviderHealth:
+        health = self._health.get(name)
+        if health is None:
+            health = self._health[name] = ProviderHealth(name, self.window)
+        return health
+
+    def register_probe(self, name: str, probe):
+        """
+        Register a cheap health check for `name`. It should raise (or return
+        a falsy value) when the provider is unavailable.
+        """
+        self._probes[name] = probe
+
+    def order(self, candidates: list) -> list:
+        """
+        Candidates to try, in order. A half-open provider without a
+        background probe comes first so one live request can test it (at most
+        one per cooldown). Then closed circuits, fastest first, with untried
+        providers ahead of measured ones in preference order. Open circuits
+        are skipped unless every candidate is open, in which case the
+        preference order is kept.
+        """
+        now = time.monotonic()
+        healthy, trial = [], []
+        with self._lock:
+            for rank, name in enumerate(candidates):
+                health = self._get(name)
+                if health.state == OPEN and now - health.opened_at >= self.cooldown_s \
+                        and name not in self._probes:
+                    # No background probe: let one live request test it
+                    health.state = HALF_OPEN
+                if health.state == CLOSED:
+                    latency = health.ewma_latency_ms
+                    healthy.append((latency is not None, latency or 0.0, rank, name))
+                elif health.state == HALF_OPEN and name not in self._probes \
+                        and now - health.trial_started >= self.cooldown_s:
+                    health.trial_started = now
+                    trial.append(name)
+        ordered = trial + [name for *_, name in sorted(healthy)]
+        return ordered or list(candidates)
+
+    def record(self, name: str, ok: bool, latency_s: float = None, error: str = None):
+        with self._lock:
+            health = self._get(name)
+            health.outcomes.append(ok)
+            if ok:
+                health.successes += 1
+                health.consecutive_failures = 0
+                if latency_s is not None:
+                    latency_ms = latency_s * 1000
+                    if health.ewma_latency_ms is None:
+                        health.ewma_latency_ms = latency_ms
+                    else:
+                        health.ewma_latency_ms += self.ewma_alpha * (latency_ms - health.ewma_latency_ms)
+                if health.state != CLOSED:
+                    print(f"DEBUG: {self.kind} provider {name} recovered, closing circuit")
+                health.state = CLOSED
+                return
+
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.last_error = error
+            tripped = (
+                health.state == HALF_OPEN
+                or health.consecutive_failures >= self.failure_threshold
+                or (len(health.outcomes) >= self.window // 2 and health.error_rate >= 0.5)
+            )
+            if tripped:
+                if health.state != OPEN:
+                    print(f"DEBUG: {self.kind} provider {name} failing, opening circuit")
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+
+    def call(self, name: str, func, *args, require_result: bool = True, **kwargs):
+        """
+        Call `func` and record its latency and outcome for `name`. Exceptions
+        count as failures, and so does a falsy result unless `require_result`
+        is False (the TTS backends return None on error). A failure once the
+        request has no time left for this stage is not recorded at all.
+        """
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self._cut_short(name):
+                raise
+            self.record(name, False, error=str(e))
+            raise
+        ok = bool(result) or not require_result
+        if not ok and self._cut_short(name):
+            return result
+        self.record(name, ok, time.monotonic() - start, error=None if ok else "no result")
+        return result
+
+    def _cut_short(self, name: str) -> bool:
+        """Whether a failed call ran into the request's deadline rather than a provider fault."""
+        if has_time(self.kind):
+            return False
+        print(f"DEBUG: {self.kind} provider {name} ran out of the request's time; not counted")
+        return True
+
+    def instrument(self, name: str, func):
+        """Wrap `func` so every call is recorded via call()."""
+        def wrapper(*args, **kwargs):
+            return self.call(name, func, *args, **kwargs)
+        return wrapper
+
+    def probe_due(self):
+        """Run registered probes for open circuits whose cooldown has passed."""
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                name for name, health in self._health.items()
+                if health.state == OPEN and name in self._probes
+                and now - health.opened_at >= self.cooldown_s
+            ]
+            for name in due:
+                self._health[name].state = HALF_OPEN
+        for name in due:
+            # Probe latency is not representative of real calls, so only the
+            # outcome is recorded
+            try:
+                ok = bool(self._probes[name]())
+                self.record(name, ok, error=None if ok else "probe failed")
+            except Exception as e:
+                print(f"DEBUG: {self.kind} probe for {name} failed: {e}")
+                self.record(name, False, error=str(e))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: health.snapshot() for name, health in self._health.items()}
+
+
+def _make_router(kind: str) -> ProviderRouter:
+    return ProviderRouter(
+        kind,
+        failure_threshold=int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "3")),
+        cooldown_s=float(os.getenv("PROVIDER_COOLDOWN_S", "30")),
+        window=int(os.getenv("PROVIDER_WINDOW", "20")),
+    )
+
+
+stt_router = _make_router("stt")
+tts_router = _make_router("tts")
+
+ROUTERS = {"stt": stt_router, "tts": tts_router}
+
+
+def routing_state() -> dict:
+    return {kind: router.snapshot() for kind, router in ROUTERS.items()}
+
+
+class Prober:
+    """Background thread that probes half-open circuits every few seconds."""
+
+    def __init__(self, interval_s: float = None):
+        if interval_s is None:
+            interval_s = float(os.getenv("PROVIDER_PROBE_INTERVAL_S", "5"))
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="provider-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            for router in ROUTERS.values():
+                router.probe_due()
+
+
+prober = Prober()
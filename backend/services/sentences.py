@@ -0,0 +1,122 @@
+"""
+Cut a stream of LLM tokens into sentences for incremental TTS.
+
+A sentence ends at ".", "!" or "?" (optionally followed by closing quotes
+or brackets) when whitespace follows, or at a line break. Abbreviations
+("Dr.", "e.g.") and decimals ("$5.25") do not end a sentence. Neither
+does "No." before a number ("No. 5"), nor an initial or "St." before a
+name ("J. Smith", "St. Louis"); elsewhere these are words that end
+sentences ("the answer is no.", "option B."), so the splitter waits
+for the next word to tell them apart. Very
+short pieces are held back and joined with the next sentence so the TTS
+provider is not called for a lone "Sure.". A sentence that runs past
+`max_chars` is cut at the last comma or space instead.
+"""
+
+import re
+
+ABBREVIATIONS = frozenset("""
+mr mrs ms dr prof sr jr mt vs etc e.g i.e a.m p.m approx dept inc ltd
+jan feb mar apr jun jul aug sep sept oct nov dec
+""".split())
+
+# Abbreviations only when a number follows ("No. 5")
+NUMBER_ABBREVIATIONS = frozenset(["no"])
+
+# Abbreviations only when a name follows ("St. Louis"), like initials ("J. Smith")
+NAME_ABBREVIATIONS = frozenset(["st"])
+
+# Capitalized words that start a sentence rather than continue a name
+SENTENCE_STARTERS = frozenset("""
+a an and but for how i if in it its my no now of on or our please so that the then there these
+they this to we what when where which while who why yes you your
+call choose contact visit note press select thank thanks
+""".split())
+
+_BOUNDARY_RE = re.compile(r"""([.!?]+["')\]]*)(\s+)|(\n+)""")
+_NEXT_WORD_RE = re.compile(r"[A-Za-z']+(?=[^A-Za-z'])")
+
+
+class SentenceSplitter:
+    """Incremental splitter: feed() text pieces, get back complete sentences."""
+
+    def __init__(self, min_chars: int = 20, max_chars: int = 250):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def _is_abbreviation(self, text: str, end: int, following: str):
+        """
+        Whether the "." at `end` - 1 belongs to an abbreviation, given the
+        text `following` the whitespace after it. None when that depends
+        on a next word that has not arrived yet.
+        """
+        words = text[:end].split()
+        if not words:
+            return False
+        raw = words[-1].rstrip(".")
+        word = raw.lower()
+        if word in ABBREVIATIONS:
+            return True
+        if word in NUMBER_ABBREVIATIONS:
+            return following[:1].isdigit() if following else None
+        initial = len(raw) == 1 and raw.isupper()
+        if not (initial or (word in NAME_ABBREVIATIONS and raw[:1].isupper())):
+            return False
+        next_word = _NEXT_WORD_RE.match(following)
+        if next_word is None:
+            # Wait for the whole next word, unless it cannot be a name
+            return None if following.isalpha() or not following else False
+        name = next_word.group()
+        return name[:1].isupper() and name.lower() not in SENTENCE_STARTERS
+
+    def feed(self, piece: str) -> list:
+        """Add a piece of text; returns the sentences it completed."""
+        self._buffer += piece
+        sentences = []
+        start = 0
+        search_from = 0
+        while True:
+            match = _BOUNDARY_RE.search(self._buffer, search_from)
+            if match is None:
+                break
+            search_from = match.end()
+            if match.group(1) and match.group(1).startswith("."):
+                abbreviation = self._is_abbreviation(self._buffer, match.start(1) + 1,
+                                                     self._buffer[match.end():])
+                if abbreviation is None:
+                    # Decided by the next word: wait for more text
+                    break
+                if abbreviation:
+                    continue
+            sentence = self._buffer[start:match.end()].strip()
+            if len(sentence) < self.min_chars and not match.group(3):
+                # Too short on its own: keep it for the next sentence
+                continue
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        # Cut an overlong sentence at a pause rather than wait for its end
+        while len(self._buffer) > self.max_chars:
+            head = self._buffer[:self.max_chars]
+            cut = max(head.rfind(", "), head.rfind("; "))
+            cut = cut + 1 if cut > self.min_chars else head.rfind(" ")
+            if cut <= 0:
+                cut = self.max_chars
+            sentences.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut:].lstrip()
+        return sentences
+
+    def flush(self) -> list:
+        """Whatever is left once the stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def split_sentences(pieces, min_chars: int = 20, max_chars: int = 250):
+    """Generator of sentences from an iterable of text pieces."""
+    splitter = SentenceSplitter(min_chars, max_chars)
+    for piece in pieces:
+        yield from splitter.feed(piece)
+    yield from splitter.flush()
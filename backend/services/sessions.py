@@ -0,0 +1,333 @@
+"""
+Per-session conversation state.
+
+Each caller gets a session ID (the X-Session-ID header, or one issued with
+the first reply). The session keeps what the bot already knows about the
+caller between turns:
+
+- the resolved account record and the spoken account summary, so a
+  follow-up account question is answered without another database query
+  or GPT rephrasing round trip;
+- the recent turns, which are passed to the LLM as history so callers do
+  not have to repeat themselves.
+
+The history handed to the LLM is held to a fixed token budget: the newest
+turns are kept verbatim, and turns that no longer fit are folded into a
+short summary of what the caller asked earlier.
+
+Sessions live in an in-memory LRU with an idle TTL, or in a local SQLite
+file (SESSION_STORE=sqlite) so they survive restarts and are shared by
+workers on the same host.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Rough tokens per character for English text (no tokenizer dependency)
+CHARS_PER_TOKEN = 4
+
+SUMMARY_QUESTION_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count of `text`."""
+    if not text:
+        return 0
+    return max(len(text.split()), (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+class ConversationState:
+    """What one session remembers: account details, recent turns and a summary."""
+
+    def __init__(self, session_id: str, turns: list = None, summary: str = "",
+                 account: dict = None, account_reply: str = None, account_at: float = None,
+                 created_at: float = None, last_seen: float = None):
+        self.session_id = session_id
+        self.turns = turns or []          # [[user_text, bot_response], ...], oldest first
+        self.summary = summary
+        self.account = account
+        self.account_reply = account_reply
+        self.account_at = account_at
+        now = time.time()
+        self.created_at = created_at or now
+        self.last_seen = last_seen or now
+
+    def add_turn(self, user_text: str, bot_response: str, max_turns: int = 20,
+                 max_summary_chars: int = 600):
+        """Record a finished turn; the oldest turns beyond `max_turns` go into the summary."""
+        self.turns.append([user_text, bot_response])
+        while len(self.turns) > max_turns:
+            self.fold_into_summary(self.turns.pop(0), max_summary_chars)
+
+    def fold_into_summary(self, turn: list, max_summary_chars: int = 600):
+        question = " ".join(turn[0].split())
+        if len(question) > SUMMARY_QUESTION_CHARS:
+            question = question[:SUMMARY_QUESTION_CHARS - 1].rstrip() + "…"
+        asked = [q for q in self.summary.split(" | ") if q] + [question]
+        # Oldest questions drop off first once the summary is full
+        while len(asked) > 1 and len(" | ".join(asked)) > max_summary_chars:
+            asked.pop(0)
+        self.summary = " | ".join(asked)
+
+    def cached_account(self, ttl_s: float):
+        """(account, account_reply) if resolved less than `ttl_s` ago, else None."""
+        if self.account is None or self.account_at is None or time.time() - self.account_at > ttl_s:
+            return None
+        return self.account, self.account_reply
+
+    def remember_account(self, account: dict, reply: str):
+        self.account = account
+        self.account_reply = reply
+        self.account_at = time.time()
+
+    def history(self, budget_tokens: int) -> list:
+        """
+        Chat messages for the LLM within `budget_tokens`: the summary of
+        older turns (if any), then as many of the newest turns as fit.
+        """
+        messages = []
+        used = 0
+        for user_text, bot_response in reversed(self.turns):
+            cost = estimate_tokens(user_text) + estimate_tokens(bot_response)
+            if used + cost > budget_tokens:
+                break
+            messages[:0] = [
+                {"role": "user", "content": user_text},
+                {"role": "assistant", "content": bot_response},
+            ]
+            used += cost
+        dropped = self.turns[:len(self.turns) - len(messages) // 2]
+        asked = [q for q in self.summary.split(" | ") if q] + [" ".join(t[0].split()) for t in dropped]
+        if asked:
+            # Newest questions first, so the note keeps what is most relevant
+            note = "Earlier in this conversation the caller asked about: "
+            kept = []
+            for question in reversed(asked):
+                question = question[:SUMMARY_QUESTION_CHARS]
+                if used + estimate_tokens(note + " | ".join(kept + [question])) > budget_tokens:
+                    break
+                kept.append(question)
+            if kept:
+                messages.insert(0, {"role": "system", "content": note + " | ".join(reversed(kept))})
+        return messages
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "turns": self.turns,
+            "summary": self.summary,
+            "account": self.account,
+            "account_reply": self.account_reply,
+            "account_at": self.account_at,
+            "created_at": self.created_at,
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConversationState":
+        return cls(**data)
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by this session (its serialized size)."""
+        return len(json.dumps(self.to_dict(), ensure_ascii=False).encode("utf-8"))
+
+    def describe(self) -> dict:
+        """Sizes only: no session id or content, which would let others read the conversation."""
+        return {
+            "turns": len(self.turns),
+            "summary_chars": len(self.summary),
+            "has_account": self.account is not None,
+            "bytes": self.size_bytes(),
+            "history_tokens": sum(estimate_tokens(u) + estimate_tokens(b) for u, b in self.turns),
+            "age_s": round(time.time() - self.created_at, 1),
+            "idle_s": round(time.time() - self.last_seen, 1),
+        }
+
+
+class MemorySessionStore:
+    """LRU of sessions in process memory, bounded to `max_sessions`, with an idle TTL."""
+
+    def __init__(self, max_sessions: int = 10000, ttl_s: float = 1800):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # id -> ConversationState, least recently used first
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id: str):
+        """The live session for `session_id`, or None if unknown or expired."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            if time.time() - state.last_seen > self.ttl_s:
+                del self._sessions[session_id]
+                self.expirations += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def save(self, state: ConversationState):
+        state.last_seen = time.time()
+        with self._lock:
+            self._sessions[state.session_id] = state
+            self._sessions.move_to_end(state.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def sessions(self) -> list:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stats(self) -> dict:
+        return {
+            "store": "memory",
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl_s,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteSessionStore:
+    """
+    Sessions as JSON rows in a local SQLite file, expired by idle TTL.
+    Slower than memory, but survives restarts and is shared between workers.
+    """
+
+    def __init__(self, path: str, ttl_s: float = 1800):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._local = threading.local()
+        self.expirations = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_last_seen ON sessions (last_seen)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections can't be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str):
+        row = self._connect().execute(
+            "SELECT data, last_seen FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > self.ttl_s:
+            self.delete(session_id)
+            self.expirations += 1
+            return None
+        return ConversationState.from_dict(json.loads(row[0]))
+
+    def save(self, state: ConversationState):
+        state.last_seen = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, last_seen) VALUES (?, ?, ?)",
+                (state.session_id, json.dumps(state.to_dict(), ensure_ascii=False), state.last_seen)
+            )
+            # Drop idle sessions as we go, so the file does not grow forever
+            conn.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.ttl_s,))
+
+    def delete(self, session_id: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def sessions(self) -> list:
+        rows = self._connect().execute(
+            "SELECT data FROM sessions WHERE last_seen >= ?", (time.time() - self.ttl_s,)
+        ).fetchall()
+        return [ConversationState.from_dict(json.loads(row[0])) for row in rows]
+
+    def stats(self) -> dict:
+        return {
+            "store": "sqlite",
+            "path": self.path,
+            "ttl_s": self.ttl_s,
+            "expirations": self.expirations,
+        }
+
+
+class SessionManager:
+    """Loads and saves sessions and applies the history limits."""
+
+    def __init__(self, store, max_turns: int = 20, context_tokens: int = 800,
+                 summary_chars: int = 600, account_ttl_s: float = 300):
+        self.store = store
+        self.max_turns = max_turns
+        self.context_tokens = context_tokens
+        self.summary_chars = summary_chars
+        self.account_ttl_s = account_ttl_s
+
+    def load(self, session_id: str = None) -> ConversationState:
+        """The session for `session_id`, or a new one (with a new ID if none was given)."""
+        if session_id:
+            state = self.store.get(session_id)
+            if state is not None:
+                return state
+        return ConversationState(session_id or new_session_id())
+
+    def record_turn(self, state: ConversationState, user_text: str, bot_response: str):
+        state.add_turn(user_text, bot_response, self.max_turns, self.summary_chars)
+        self.store.save(state)
+
+    def history(self, state: ConversationState) -> list:
+        return state.history(self.context_tokens) if state is not None else []
+
+    def usage(self) -> dict:
+        """Store stats plus aggregate memory of the sessions held (no ids or content)."""
+        described = [s.describe() for s in self.store.sessions()]
+        total_bytes = sum(d["bytes"] for d in described)
+        return {
+            **self.store.stats(),
+            "sessions": len(described),
+            "with_account": sum(d["has_account"] for d in described),
+            "turns": sum(d["turns"] for d in described),
+            "total_bytes": total_bytes,
+            "avg_bytes": round(total_bytes / len(described)) if described else 0,
+            "max_bytes": max((d["bytes"] for d in described), default=0),
+            "max_history_tokens": max((d["history_tokens"] for d in described), default=0),
+            "context_tokens": self.context_tokens,
+            "max_turns": self.max_turns,
+        }
+
+
+def _store_from_env():
+    ttl_s = float(os.getenv("SESSION_TTL_S", "1800"))
+    if os.getenv("SESSION_STORE", "memory").lower() == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "./voicebot.sessions.db"), ttl_s)
+    return MemorySessionStore(int(os.getenv("SESSION_MAX", "10000")), ttl_s)
+
+
+session_manager = SessionManager(
+    _store_from_env(),
+    max_turns=int(os.getenv("SESSION_MAX_TURNS", "20")),
+    context_tokens=int(os.getenv("SESSION_CONTEXT_TOKENS", "800")),
+    summary_chars=int(os.getenv("SESSION_SUMMARY_CHARS", "600")),
+    account_ttl_s=float(os.getenv("SESSION_ACCOUNT_TTL_S", "300")),
+)
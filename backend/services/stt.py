@@ -1,61 +1,148 @@
+import io
 import os
-import speech_recognition as sr
-from openai import OpenAI
-from dotenv import load_dotenv
+from backend.services.audio_io import (
+    NATIVE_SR_FORMATS, as_named_upload, sniff_stream, to_wav_buffer
+)
+from backend.services.deadline import degrade, has_time, time_left
+from backend.services.metrics import record_fallback, record_provider
+from backend.services.providers import OPENAI_TIMEOUT, openai_client, providers
+from backend.services.router import stt_router
+from backend.services.transcode import transcoder
 
-load_dotenv()
+def _speech_recognition():
+    import speech_recognition
+    return speech_recognition
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Imported on the first Google transcription rather than with the app
+providers.register("speech_recognition", _speech_recognition)
 
-def transcribe_audio(file_path: str, use_whisper: bool = True) -> str:
+class STTRequestError(Exception):
+    """The STT service could not be reached (speech_recognition's RequestError)."""
+
+def transcribe_whisper(audio, audio_format: str) -> str:
     """
-    Transcribes audio file to text.
+    Transcribes a binary audio stream with OpenAI Whisper. Raises on failure.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    print(f"DEBUG: API Key present: {bool(api_key)}")
-    if api_key:
-        print(f"DEBUG: API Key starts with: {api_key[:8]}...")
+    print("DEBUG: Attempting Whisper transcription...")
+    transcription = openai_client().audio.transcriptions.create(
+        model="whisper-1",
+        file=as_named_upload(audio, audio_format),
+        timeout=time_left("stt", OPENAI_TIMEOUT)
+    )
+    print("DEBUG: Whisper success")
+    return transcription.text
 
-    if use_whisper and api_key:
-        print("DEBUG: Attempting Whisper transcription...")
-        try:
-            with open(file_path, "rb") as audio_file:
-                transcription = client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file
-                )
-            print("DEBUG: Whisper success")
-            return transcription.text
-        except Exception as e:
-            print(f"Whisper error: {e}. Falling back to Google Speech Recognition.")
-    
-    print("DEBUG: Falling back to Google Speech Recognition")
-    # Fallback to Google Speech Recognition
+def transcribe_google(audio, audio_format: str) -> str:
+    """
+    Transcribes a binary audio stream with Google Speech Recognition.
+    Raises STTRequestError when the service is unreachable; unintelligible
+    audio is a successful call that returns "Could not understand audio".
+    """
+    sr = providers.get("speech_recognition")
     recognizer = sr.Recognizer()
-    try:
-        # Attempt to convert to WAV using pydub if possible (requires ffmpeg usually, but worth a try)
-        # If this fails, we proceed with the original file
+    recognizer.operation_timeout = time_left("stt")
+    audio.seek(0)
+    source_audio = audio
+    # speech_recognition only reads WAV/AIFF/FLAC; decode anything else in
+    # memory with pydub (requires ffmpeg). If this fails, we proceed with
+    # the original stream
+    if audio_format not in NATIVE_SR_FORMATS:
         try:
-            from pydub import AudioSegment
             print("DEBUG: Attempting audio conversion with pydub...")
-            sound = AudioSegment.from_file(file_path)
-            file_path = file_path + ".wav"
-            sound.export(file_path, format="wav")
+            source_audio = to_wav_buffer(audio, audio_format)
             print("DEBUG: Audio conversion successful")
         except Exception as conversion_error:
             print(f"DEBUG: Audio conversion failed (likely missing ffmpeg): {conversion_error}")
+            audio.seek(0)
 
-        with sr.AudioFile(file_path) as source:
+    try:
+        with sr.AudioFile(source_audio) as source:
             audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-            print(f"DEBUG: Google STT result: {text}")
-            return text
+    except ValueError as e:
+        # Unreadable input is not the provider's fault
+        print(f"DEBUG: Google STT could not read audio: {e}")
+        return f"Error processing audio: {e}"
+    try:
+        text = recognizer.recognize_google(audio_data)
+        print(f"DEBUG: Google STT result: {text}")
+        return text
     except sr.UnknownValueError:
         print("DEBUG: Google STT: UnknownValueError")
         return "Could not understand audio"
     except sr.RequestError as e:
-        print(f"DEBUG: Google STT RequestError: {e}")
-        return f"Could not request results; {e}"
-    except Exception as e:
-        print(f"DEBUG: Google STT Generic Error: {e}")
-        return f"Error processing audio: {e}"
+        raise STTRequestError(e) from e
+
+STT_PROVIDERS = {
+    "whisper": transcribe_whisper,
+    "google": transcribe_google,
+}
+
+# Normalized encodings each provider takes, most compact first
+PROVIDER_FORMATS = {
+    "whisper": ("ogg", "wav"),
+    "google": ("wav",),
+}
+
+# Background health check used while Whisper's circuit is open
+stt_router.register_probe("whisper", lambda: openai_client().models.retrieve("whisper-1"))
+
+def transcribe_audio(audio, use_whisper: bool = True, audio_format: str = None) -> str:
+    """
+    Transcribes audio to text.
+    Providers are tried in the order chosen by the STT router: fastest
+    healthy first, skipping any whose circuit is open. Audio without speech
+    is not sent to any of them and transcribes to "". Each provider call
+    is bounded by what is left of the request's deadline; once it is used
+    up no further provider is tried, and the transcript is "" as well.
+
+    Args:
+        audio: Path to an audio file, or a seekable binary file object
+               (e.g. an upload's SpooledTemporaryFile or a BytesIO)
+        use_whisper: Allow OpenAI Whisper as well as Google Speech Recognition
+        audio_format: Container format ("wav", "webm", ...); sniffed from
+                      the first bytes when not given
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        with open(audio, "rb") as audio_file:
+            return transcribe_audio(audio_file, use_whisper, audio_format)
+
+    if audio_format is None:
+        audio_format = sniff_stream(audio)
+    print(f"DEBUG: Audio format: {audio_format or 'unknown'}")
+
+    # Decode once to 16 kHz mono for every provider, trimmed to the speech
+    # (None: keep the original)
+    normalized = transcoder.normalize_stream(audio, audio_format)
+    if normalized is not None and not normalized.audio:
+        print(f"DEBUG: No speech in {normalized.duration_ms:.0f} ms of audio; skipping STT")
+        return ""
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    print(f"DEBUG: API Key present: {bool(api_key)}")
+
+    candidates = ["whisper", "google"] if use_whisper and api_key else ["google"]
+    error_message = "Error processing audio"
+    for provider in stt_router.order(candidates):
+        if not has_time("stt"):
+            # Keep what is left of the request's budget for the reply
+            degrade("stt", f"no time left for {provider}")
+            return ""
+        provider_audio, provider_format = audio, audio_format
+        if normalized is not None:
+            provider_format = next(f for f in PROVIDER_FORMATS[provider] if f in normalized.audio)
+            provider_audio = io.BytesIO(normalized.audio[provider_format])
+        try:
+            # An empty transcript (silence) is a valid answer, not a failure
+            text = stt_router.call(provider, STT_PROVIDERS[provider], provider_audio, provider_format,
+                                   require_result=False)
+            record_provider("stt", provider)
+            return text
+        except STTRequestError as e:
+            record_fallback("stt", provider)
+            print(f"DEBUG: Google STT RequestError: {e}")
+            error_message = f"Could not request results; {e}"
+        except Exception as e:
+            record_fallback("stt", provider)
+            print(f"{provider} STT error: {e}. Trying next provider.")
+            error_message = f"Error processing audio: {e}"
+    return error_message
@@ -0,0 +1,301 @@
+"""
+Audio normalization ahead of speech-to-text.
+
+Uploads arrive as whatever the browser recorded: 48 kHz stereo WAV, or
+WebM/Ogg Opus. Every STT backend is happy with 16 kHz mono 16-bit PCM,
+so each upload is decoded once into that and the compact result is handed
+to all of them. Google no longer needs its own pydub/ffmpeg conversion,
+and Whisper receives a fraction of the bytes: a 48 kHz stereo WAV shrinks
+sixfold, or further with STT_UPLOAD_FORMAT=opus.
+
+Decoding runs in a small pool of worker processes, started once and
+reused, so it neither holds the GIL against the event loop and other
+stages nor pays interpreter start-up per request:
+
+- WAV (any sample rate, channel count, 8/16/24/32-bit PCM) is decoded with
+  numpy: channels averaged, low-pass filtered and resampled in-process.
+- Anything else is piped through one ffmpeg call that decodes, downmixes
+  and resamples in a single pass (no temp files).
+
+The 16 kHz PCM is then trimmed to the speech it contains (see vad.py), so
+leading and trailing silence is never uploaded, and a clip with no speech
+at all is reported as such instead of being sent anywhere.
+
+If normalization fails (say, ffmpeg is missing for a WebM upload), the
+caller falls back to the original stream.
+"""
+
+import io
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+import wave
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from backend.services.deadline import time_left
+from backend.services.endpointing import pcm_to_wav
+from backend.services.vad import vad
+
+TARGET_RATE = 16000
+FFMPEG = os.getenv("FFMPEG_BINARY", "ffmpeg")
+OPUS_BITRATE = os.getenv("STT_OPUS_BITRATE", "24k")
+FILTER_TAPS = 63
+
+
+# `audio` is {format: bytes}, empty when the clip holds no speech
+Normalized = namedtuple("Normalized", "audio duration_ms speech_ms detect_ms")
+
+
+class TranscodeError(Exception):
+    """Raised when an upload cannot be decoded."""
+
+
+def _lowpass(cutoff: float, taps: int = FILTER_TAPS) -> np.ndarray:
+    """Windowed-sinc FIR low-pass; `cutoff` as a fraction of the sample rate."""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int = TARGET_RATE) -> np.ndarray:
+    """
+    Resample mono float32 samples. Downsampling is low-pass filtered first
+    so that speech above the new Nyquist frequency does not alias.
+    """
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    if dst_rate < src_rate:
+        samples = np.convolve(samples, _lowpass(0.5 * dst_rate / src_rate * 0.9), mode="same")
+    n_out = int(round(len(samples) * dst_rate / src_rate))
+    positions = np.arange(n_out, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def _wav_samples(data: bytes):
+    """(mono float32 samples in [-1, 1], sample rate) of a PCM WAV file."""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise TranscodeError(f"unreadable WAV: {e}")
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = ints.astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise TranscodeError(f"unsupported sample width: {width}")
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def _to_pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def _ffmpeg(data: bytes, input_args: list, output_args: list) -> bytes:
+    try:
+        result = subprocess.run(
+            [FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error",
+             *input_args, "-i", "pipe:0", *output_args, "pipe:1"],
+            input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60
+        )
+    except FileNotFoundError:
+        raise TranscodeError("ffmpeg not found")
+    except subprocess.TimeoutExpired:
+        raise TranscodeError("ffmpeg timed out")
+    if result.returncode != 0 or not result.stdout:
+        raise TranscodeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()[-200:]}")
+    return result.stdout
+
+
+def decode_to_pcm(data: bytes, audio_format: str = None) -> bytes:
+    """16 kHz mono 16-bit little-endian PCM for an encoded upload."""
+    if audio_format == "wav":
+        samples, rate = _wav_samples(data)
+        return _to_pcm16(resample(samples, rate))
+    return _ffmpeg(data, [], ["-vn", "-ac", "1", "-ar", str(TARGET_RATE), "-f", "s16le"])
+
+
+def encode_opus(pcm: bytes) -> bytes:
+    """Low-bitrate Ogg Opus of 16 kHz mono PCM, tuned for speech."""
+    return _ffmpeg(
+        pcm,
+        ["-f", "s16le", "-ar", str(TARGET_RATE), "-ac", "1"],
+        ["-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip", "-f", "ogg"]
+    )
+
+
+def is_normalized_wav(data: bytes) -> bool:
+    """Whether `data` already is a 16 kHz mono 16-bit WAV (nothing to do)."""
+    return _normalized_wav_pcm(data) is not None
+
+
+def _normalized_wav_pcm(data: bytes):
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (TARGET_RATE, 1, 2):
+                return None
+            return wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+
+def _ms(pcm: bytes) -> float:
+    return len(pcm) / 2 / TARGET_RATE * 1000
+
+
+def trim_and_encode(pcm: bytes, upload_format: str = "wav") -> Normalized:
+    """Cut 16 kHz mono PCM to its speech and encode that for the STT backends."""
+    start = time.perf_counter()
+    span = vad.find_speech(pcm, TARGET_RATE)
+    detect_ms = (time.perf_counter() - start) * 1000
+    if span is None:
+        return Normalized({}, _ms(pcm), 0.0, detect_ms)
+    speech = pcm[span[0]:span[1]]
+    encoded = {"wav": pcm_to_wav(speech, TARGET_RATE)}
+    if upload_format == "opus":
+        try:
+            encoded["ogg"] = encode_opus(speech)
+        except TranscodeError as e:
+            print(f"DEBUG: Opus encoding failed, sending WAV: {e}")
+    return Normalized(encoded, _ms(pcm), _ms(speech), detect_ms)
+
+
+def normalize(data: bytes, audio_format: str = None, upload_format: str = "wav") -> Normalized:
+    """
+    Decode `data`, trim it to its speech and re-encode that for the STT
+    backends: always as "wav" (16 kHz mono), plus "ogg" (Opus) when
+    `upload_format` is "opus". Runs in the pool.
+    """
+    return trim_and_encode(decode_to_pcm(data, audio_format), upload_format)
+
+
+def _mp_context():
+    # Workers fork from a clean server process that has imported only this
+    # module: not from the app (forking a process that runs threads is
+    # unsafe), and without re-importing the app's main module as spawn does
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _warm():
+    # Runs once per worker so the first real job does not pay for start-up
+    return os.getpid()
+
+
+class Transcoder:
+    """
+    Normalizes uploads on a pool of `workers` processes, started on first
+    use (or by start()) and kept for the life of the app.
+    """
+
+    def __init__(self, workers: int = 2, upload_format: str = "wav", timeout_s: float = 30,
+                 enabled: bool = True):
+        self.workers = max(1, workers)
+        self.upload_format = upload_format
+        self.timeout_s = timeout_s
+        self.enabled = enabled
+        self._executor = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.passthrough = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+            return self._executor
+
+    def start(self):
+        """Start the worker processes now rather than on the first upload."""
+        if self.enabled:
+            pool = self._pool()
+            for future in [pool.submit(_warm) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def normalize_stream(self, fileobj, audio_format: str = None):
+        """
+        The normalized audio for a seekable upload (see normalize()), or
+        None if it could not be normalized or is already 16 kHz mono WAV
+        with no silence to trim; the caller then keeps the original.
+        """
+        if not self.enabled:
+            return None
+        fileobj.seek(0)
+        data = fileobj.read()
+        fileobj.seek(0)
+        pcm = _normalized_wav_pcm(data) if audio_format == "wav" and self.upload_format == "wav" else None
+        if pcm is not None:
+            # Already in shape: only trimming is left, cheap enough to do here
+            normalized = trim_and_encode(pcm)
+            vad.record(normalized.duration_ms, normalized.speech_ms, normalized.detect_ms)
+            if normalized.audio and normalized.speech_ms == normalized.duration_ms:
+                with self._lock:
+                    self.passthrough += 1
+                return None
+            return normalized
+        try:
+            normalized = self._pool().submit(
+                normalize, data, audio_format, self.upload_format
+            ).result(timeout=time_left("stt", self.timeout_s))
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            if isinstance(e, BrokenProcessPool):
+                self.shutdown()
+            print(f"DEBUG: Audio normalization failed, using the original upload: {e}")
+            return None
+        vad.record(normalized.duration_ms, normalized.speech_ms, normalized.detect_ms)
+        with self._lock:
+            self.jobs += 1
+            self.bytes_in += len(data)
+            self.bytes_out += min((len(out) for out in normalized.audio.values()), default=0)
+        return normalized
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "upload_format": self.upload_format,
+                "jobs": self.jobs,
+                "passthrough": self.passthrough,
+                "failures": self.failures,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "size_ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            }
+
+
+transcoder = Transcoder(
+    workers=int(os.getenv("TRANSCODE_WORKERS", str(min(2, os.cpu_count() or 1)))),
+    upload_format=os.getenv("STT_UPLOAD_FORMAT", "wav").lower(),
+    enabled=os.getenv("TRANSCODE_ENABLED", "true").lower() != "false",
+)
@@ -1,57 +1,95 @@
 import os
-from openai import OpenAI
-from gtts import gTTS
 import uuid
-from dotenv import load_dotenv
-
-load_dotenv()
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from backend.services.tts_cache import TTSCache
+from backend.services.audio_files import AudioJanitor, rename_to_content_hash
+from backend.services.deadline import degrade, has_time, time_left
+from backend.services.metrics import record_fallback, record_provider
+from backend.services.providers import OPENAI_TIMEOUT, openai_client, providers
+from backend.services.router import tts_router
 
 AUDIO_DIR = "static/audio"
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
-def text_to_speech_google_cloud(text: str) -> str:
+AUDIO_FORMAT = "mp3"
+STREAM_CHUNK_SIZE = 4096
+
+# Voice used by each provider; part of the audio cache key
+VOICES = {
+    "azure": os.getenv("AZURE_TTS_VOICE", "en-US-JennyNeural"),
+    "google": os.getenv("GOOGLE_TTS_VOICE", "en-US-Neural2-F"),
+    "openai": os.getenv("OPENAI_TTS_VOICE", "alloy"),
+    "gtts": os.getenv("GTTS_LANG", "en"),
+}
+
+audio_cache = TTSCache(
+    AUDIO_DIR,
+    max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024),
+    enabled=os.getenv("TTS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
+
+# Deletes old clips from AUDIO_DIR, cached or not; started with the app
+audio_janitor = AudioJanitor(
+    AUDIO_DIR,
+    ttl_s=float(os.getenv("AUDIO_TTL_HOURS", "168")) * 3600,
+    max_bytes=int(float(os.getenv("AUDIO_MAX_MB", "1024")) * 1024 * 1024),
+    interval_s=float(os.getenv("AUDIO_JANITOR_INTERVAL_S", "300")),
+    on_delete=audio_cache.discard,
+)
+
+
+def _new_audio_path() -> str:
+    return os.path.join(AUDIO_DIR, f"{uuid.uuid4()}.{AUDIO_FORMAT}")
+
+def _google_cloud_synthesize(text: str) -> bytes:
+    """
+    Run a Google Cloud Text-to-Speech request and return the MP3 bytes.
+    Requires GOOGLE_APPLICATION_CREDENTIALS environment variable.
+    """
+    from google.cloud import texttospeech
+    
+    # Shared client, built on the first request
+    client_gcp = providers.get("google_tts")
+    
+    # Set the text input
+    synthesis_input = texttospeech.SynthesisInput(text=text)
+    
+    # Build the voice request
+    voice = texttospeech.VoiceSelectionParams(
+        language_code="en-US",
+        name=VOICES["google"],  # Female neural voice
+        ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
+    )
+    
+    # Select the audio config
+    audio_config = texttospeech.AudioConfig(
+        audio_encoding=texttospeech.AudioEncoding.MP3,
+        speaking_rate=1.0,
+        pitch=0.0
+    )
+    
+    # Perform the text-to-speech request
+    response = client_gcp.synthesize_speech(
+        input=synthesis_input,
+        voice=voice,
+        audio_config=audio_config,
+        timeout=time_left("tts")
+    )
+    return response.audio_content
+
+
+def text_to_speech_google_cloud(text: str, file_path: str = None) -> str:
     """
     Convert text to speech using Google Cloud Text-to-Speech API.
     Requires GOOGLE_APPLICATION_CREDENTIALS environment variable.
     """
     try:
-        from google.cloud import texttospeech
-        
-        # Initialize client
-        client_gcp = texttospeech.TextToSpeechClient()
-        
-        # Set the text input
-        synthesis_input = texttospeech.SynthesisInput(text=text)
-        
-        # Build the voice request
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="en-US",
-            name="en-US-Neural2-F",  # Female neural voice
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
-        )
-        
-        # Select the audio config
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=1.0,
-            pitch=0.0
-        )
-        
-        # Perform the text-to-speech request
-        response = client_gcp.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
+        audio_content = _google_cloud_synthesize(text)
         
         # Save the audio file
-        filename = f"{uuid.uuid4()}.mp3"
-        file_path = os.path.join(AUDIO_DIR, filename)
+        file_path = file_path or _new_audio_path()
         
         with open(file_path, "wb") as out:
-            out.write(response.audio_content)
+            out.write(audio_content)
         
         print("Google Cloud TTS: Audio content written successfully")
         return file_path
@@ -64,7 +102,53 @@ def text_to_speech_google_cloud(text: str) -> str:
         return None
 
 
-def text_to_speech_azure(text: str) -> str:
+def _google_tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient()
+
+
+def _azure_speech_config():
+    """
+    Build the Azure SpeechConfig for MP3 output; raises without credentials.
+    Requires AZURE_SPEECH_KEY and AZURE_SPEECH_REGION environment variables.
+    """
+    import azure.cognitiveservices.speech as speechsdk
+    
+    # Get credentials from environment
+    speech_key = os.getenv("AZURE_SPEECH_KEY")
+    service_region = os.getenv("AZURE_SPEECH_REGION", "eastus")
+    
+    if not speech_key:
+        raise RuntimeError("Azure Speech Key not found in environment variables")
+    
+    # Configure speech service
+    speech_config = speechsdk.SpeechConfig(
+        subscription=speech_key,
+        region=service_region
+    )
+    
+    # Set voice (en-US-JennyNeural is a high-quality neural voice)
+    speech_config.speech_synthesis_voice_name = VOICES["azure"]
+    # Azure writes WAV unless told otherwise, whatever the file name
+    speech_config.set_speech_synthesis_output_format(
+        speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3
+    )
+    return speech_config
+
+
+def _gtts():
+    from gtts import gTTS
+    return gTTS
+
+
+# Provider SDKs are imported, and their clients built, on first use and then shared
+providers.register("google_tts", _google_tts_client,
+                   configured=lambda: os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+providers.register("azure_speech", _azure_speech_config, configured=lambda: os.getenv("AZURE_SPEECH_KEY"))
+providers.register("gtts", _gtts)
+
+
+def text_to_speech_azure(text: str, file_path: str = None) -> str:
     """
     Convert text to speech using Microsoft Azure Text-to-Speech API.
     Requires AZURE_SPEECH_KEY and AZURE_SPEECH_REGION environment variables.
@@ -72,26 +156,10 @@ def text_to_speech_azure(text: str) -> str:
     try:
         import azure.cognitiveservices.speech as speechsdk
         
-        # Get credentials from environment
-        speech_key = os.getenv("AZURE_SPEECH_KEY")
-        service_region = os.getenv("AZURE_SPEECH_REGION", "eastus")
-        
-        if not speech_key:
-            print("Azure Speech Key not found in environment variables")
-            return None
-        
-        # Configure speech service
-        speech_config = speechsdk.SpeechConfig(
-            subscription=speech_key,
-            region=service_region
-        )
-        
-        # Set voice (en-US-JennyNeural is a high-quality neural voice)
-        speech_config.speech_synthesis_voice_name = "en-US-JennyNeural"
+        speech_config = providers.get("azure_speech")
         
         # Create audio config for file output
-        filename = f"{uuid.uuid4()}.mp3"
-        file_path = os.path.join(AUDIO_DIR, filename)
+        file_path = file_path or _new_audio_path()
         audio_config = speechsdk.audio.AudioOutputConfig(filename=file_path)
         
         # Create synthesizer
@@ -121,18 +189,18 @@ def text_to_speech_azure(text: str) -> str:
         return None
 
 
-def text_to_speech_openai(text: str) -> str:
+def text_to_speech_openai(text: str, file_path: str = None) -> str:
     """
     Convert text to speech using OpenAI TTS API.
     """
     try:
-        filename = f"{uuid.uuid4()}.mp3"
-        file_path = os.path.join(AUDIO_DIR, filename)
+        file_path = file_path or _new_audio_path()
         
-        response = client.audio.speech.create(
+        response = openai_client().audio.speech.create(
             model="tts-1",
-            voice="alloy",  # Options: alloy, echo, fable, onyx, nova, shimmer
-            input=text
+            voice=VOICES["openai"],  # Options: alloy, echo, fable, onyx, nova, shimmer
+            input=text,
+            timeout=time_left("tts", OPENAI_TIMEOUT)
         )
         response.stream_to_file(file_path)
         print("OpenAI TTS: Audio generated successfully")
@@ -142,15 +210,15 @@ def text_to_speech_openai(text: str) -> str:
         return None
 
 
-def text_to_speech_gtts(text: str) -> str:
+def text_to_speech_gtts(text: str, file_path: str = None) -> str:
     """
     Convert text to speech using Google Text-to-Speech (gTTS) - Free offline option.
     """
     try:
-        filename = f"{uuid.uuid4()}.mp3"
-        file_path = os.path.join(AUDIO_DIR, filename)
+        file_path = file_path or _new_audio_path()
         
-        tts = gTTS(text=text, lang='en', slow=False)
+        gTTS = providers.get("gtts")
+        tts = gTTS(text=text, lang=VOICES["gtts"], slow=False, timeout=time_left("tts"))
         tts.save(file_path)
         print("gTTS: Audio generated successfully")
         return file_path
@@ -159,57 +227,224 @@ def text_to_speech_gtts(text: str) -> str:
         return None
 
 
+def stream_google_cloud(text: str):
+    """
+    Stream speech from Google Cloud TTS. The API returns the whole clip in
+    one response, so this yields a single chunk.
+    """
+    yield _google_cloud_synthesize(text)
+
+
+def stream_azure(text: str):
+    """
+    Stream speech from Azure as the service produces it, without an output file.
+    """
+    import azure.cognitiveservices.speech as speechsdk
+    
+    speech_config = providers.get("azure_speech")
+    
+    # audio_config=None keeps the audio in memory instead of a speaker or file
+    speech_synthesizer = speechsdk.SpeechSynthesizer(
+        speech_config=speech_config,
+        audio_config=None
+    )
+    result = speech_synthesizer.start_speaking_text_async(text).get()
+    if result.reason == speechsdk.ResultReason.Canceled:
+        raise RuntimeError(f"Azure TTS canceled: {result.cancellation_details.error_details}")
+    
+    audio_stream = speechsdk.AudioDataStream(result)
+    buffer = bytes(STREAM_CHUNK_SIZE)
+    while True:
+        filled = audio_stream.read_data(buffer)
+        if filled == 0:
+            break
+        yield buffer[:filled]
+    if audio_stream.status == speechsdk.StreamStatus.Canceled:
+        raise RuntimeError("Azure TTS stream canceled")
+
+
+def stream_openai(text: str):
+    """
+    Stream speech from OpenAI TTS chunk by chunk as the response arrives.
+    """
+    with openai_client().audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice=VOICES["openai"],
+        input=text,
+        response_format=AUDIO_FORMAT,
+        timeout=time_left("tts", OPENAI_TIMEOUT)
+    ) as response:
+        yield from response.iter_bytes(STREAM_CHUNK_SIZE)
+
+
+def stream_gtts(text: str):
+    """
+    Stream speech from gTTS. This is the generator gTTS.write_to_fp() drains;
+    it yields one MP3 chunk per sentence-sized piece of text.
+    """
+    gTTS = providers.get("gtts")
+    tts = gTTS(text=text, lang=VOICES["gtts"], slow=False, timeout=time_left("tts"))
+    yield from tts.stream()
+
+
+SERVICE_FUNCS = {
+    "openai": text_to_speech_openai,
+    "google": text_to_speech_google_cloud,
+    "azure": text_to_speech_azure,
+    "gtts": text_to_speech_gtts
+}
+
+STREAM_FUNCS = {
+    "openai": stream_openai,
+    "google": stream_google_cloud,
+    "azure": stream_azure,
+    "gtts": stream_gtts
+}
+
+
+def _available_services() -> list:
+    """
+    Services with credentials configured, in order of quality:
+    Azure -> Google Cloud -> OpenAI -> gTTS
+    """
+    services = []
+    
+    # Check which services are available
+    if os.getenv("AZURE_SPEECH_KEY"):
+        services.append("azure")
+    if os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+        services.append("google")
+    if os.getenv("OPENAI_API_KEY"):
+        services.append("openai")
+    
+    # Always add gTTS as fallback
+    services.append("gtts")
+    return services
+
+
+AVAILABLE_SERVICES = _available_services()
+
+# Background health checks used while a provider's circuit is open
+tts_router.register_probe("azure", lambda: b"".join(stream_azure("ok")))
+tts_router.register_probe("google", lambda: _google_cloud_synthesize("ok"))
+tts_router.register_probe("openai", lambda: openai_client().models.retrieve("tts-1"))
+tts_router.register_probe("gtts", lambda: b"".join(stream_gtts("ok")))
+
+
+def _select_services(preferred_service: str) -> list:
+    """
+    Names of the TTS services to try, in order.
+    "auto" asks the provider router for the fastest healthy services.
+    """
+    if preferred_service in SERVICE_FUNCS:
+        return [preferred_service]
+    if preferred_service != "auto":
+        print(f"Unknown service: {preferred_service}. Using auto mode.")
+    return tts_router.order(AVAILABLE_SERVICES)
+
+
 def text_to_speech(text: str, preferred_service: str = "auto") -> str:
     """
     Converts text to speech and returns the file path.
+    Repeated text is served from the audio cache without calling the provider.
     
     Args:
         text: The text to convert to speech
         preferred_service: Preferred TTS service - "openai", "google", "azure", "gtts", or "auto"
-                          "auto" will try services in order based on availability
+                          "auto" tries the available services fastest healthy first
     
     Returns:
         File path to the generated audio file, or None if all methods fail
+        or the request's deadline leaves no time to synthesize
     """
     
-    # Define service priority based on preference
-    if preferred_service == "auto":
-        # Try in order of quality: Azure -> Google Cloud -> OpenAI -> gTTS
-        services = []
-        
-        # Check which services are available
-        if os.getenv("AZURE_SPEECH_KEY"):
-            services.append(("azure", text_to_speech_azure))
-        if os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-            services.append(("google", text_to_speech_google_cloud))
-        if os.getenv("OPENAI_API_KEY"):
-            services.append(("openai", text_to_speech_openai))
-        
-        # Always add gTTS as fallback
-        services.append(("gtts", text_to_speech_gtts))
-        
-    else:
-        # Use specific service
-        service_map = {
-            "openai": text_to_speech_openai,
-            "google": text_to_speech_google_cloud,
-            "azure": text_to_speech_azure,
-            "gtts": text_to_speech_gtts
-        }
-        
-        if preferred_service in service_map:
-            services = [(preferred_service, service_map[preferred_service])]
-        else:
-            print(f"Unknown service: {preferred_service}. Using auto mode.")
-            return text_to_speech(text, "auto")
-    
     # Try each service in order
-    for service_name, service_func in services:
+    for service_name in _select_services(preferred_service):
+        if not has_time("tts"):
+            return _cached_or_text_only(text, service_name)
         print(f"Trying TTS service: {service_name}")
-        result = service_func(text)
+        service_func = tts_router.instrument(service_name, SERVICE_FUNCS[service_name])
+        result = audio_cache.fetch(text, service_name, VOICES[service_name], AUDIO_FORMAT, service_func)
         if result:
+            record_provider("tts", service_name)
+            if not audio_cache.enabled:
+                # Uncached clips get a content-hashed name too, so they can be served as immutable
+                result = rename_to_content_hash(result)
             return result
+        record_fallback("tts", service_name)
         print(f"{service_name} TTS failed, trying next service...")
     
     print("All TTS services failed!")
     return None
+
+
+def _cached_or_text_only(text: str, service_name: str):
+    """Out of time: a clip already cached for `text`, else no audio at all."""
+    cached_path = audio_cache.lookup(text, service_name, VOICES[service_name], AUDIO_FORMAT)
+    if cached_path:
+        record_provider("tts", service_name)
+        return cached_path
+    degrade("tts", "no time left to synthesize")
+    return None
+
+
+def _prefetch(chunks):
+    """
+    Pull the first chunk so provider errors surface before anything is sent.
+    Returns an iterator over all chunks, or raises if the provider failed.
+    """
+    iterator = iter(chunks)
+    first = next(iterator, b"")
+    if not first:
+        raise RuntimeError("provider returned no audio")
+
+    def replay():
+        yield first
+        yield from iterator
+    return replay()
+
+
+def text_to_speech_stream(text: str, preferred_service: str = "auto"):
+    """
+    Converts text to speech without writing a file first.
+    
+    Audio chunks are yielded as the provider produces them. Cached clips are
+    streamed from disk; on a cache miss the chunks are also teed into the
+    cache (when enabled) so the next request is a hit.
+    
+    Returns:
+        (service_name, iterator of MP3 byte chunks), or (None, None) if all
+        providers fail before producing audio
+    """
+    for service_name in _select_services(preferred_service):
+        voice = VOICES[service_name]
+        cached_path = audio_cache.lookup(text, service_name, voice, AUDIO_FORMAT)
+        if cached_path:
+            record_provider("tts", service_name)
+            return service_name, _read_chunks(cached_path)
+        if not has_time("tts"):
+            degrade("tts", "no time left to synthesize")
+            return None, None
+        
+        print(f"Trying streaming TTS service: {service_name}")
+        try:
+            # Time to first chunk is what the router compares
+            chunks = tts_router.call(service_name, _prefetch, STREAM_FUNCS[service_name](text))
+        except Exception as e:
+            record_fallback("tts", service_name)
+            print(f"{service_name} streaming TTS failed: {e}, trying next service...")
+            continue
+        record_provider("tts", service_name)
+        return service_name, audio_cache.tee(text, service_name, voice, AUDIO_FORMAT, chunks)
+    
+    print("All TTS services failed!")
+    return None, None
+
+
+def _read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,215 @@
+"""
+Cache for synthesized speech, keyed by what was synthesized.
+
+FAQ answers and rule-based replies repeat constantly, so each synthesized
+clip is stored under a hash of its input (normalized text, provider, voice,
+format), not of its audio, and served straight from disk the next time the
+same text is requested. Re-synthesizing a key can therefore change the
+bytes behind the same name (see audio_files.py for how such clips are
+served). The cache is bounded by total size and evicts least recently used
+clips.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of the text used for the cache key. Case and punctuation
+    are kept because they change how providers pronounce the text.
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text: str, provider: str, voice: str, audio_format: str) -> str:
+    raw = "\x1f".join((normalize_text(text), provider, voice, audio_format))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    LRU cache of audio files in `directory`, capped at `max_bytes` in total.
+
+    Concurrent misses for the same key are collapsed: the first caller
+    synthesizes while the others wait and then reuse its file. Providers
+    write into a temporary file that is renamed into place only once it is
+    complete, so a reader never sees a partial clip.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()  # file name -> size in bytes, LRU first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        # Pick up clips cached by a previous run, oldest access first
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                stem, _, _ = entry.name.partition(".")
+                if entry.is_file() and _KEY_RE.match(stem):
+                    stat = entry.stat()
+                    found.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _lookup(self, name: str):
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if not os.path.exists(path):
+                # Removed behind our back
+                self._total_bytes -= self._entries.pop(name)
+                return None
+            self._entries.move_to_end(name)
+        try:
+            # Keep the clip young for the audio janitor's TTL
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def discard(self, name: str):
+        """Forget a clip that was deleted from disk by someone else."""
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is not None:
+                self._total_bytes -= size
+
+    def _store(self, name: str, tmp_path: str) -> str:
+        path = os.path.join(self.directory, name)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._total_bytes += size
+            self._evict()
+        return path
+
+    def lookup(self, text: str, provider: str, voice: str, audio_format: str):
+        """Path of the cached clip, or None on a miss or when disabled."""
+        if not self.enabled:
+            return None
+        key = cache_key(text, provider, voice, audio_format)
+        path = self._lookup(f"{key}.{audio_format}")
+        self._count(path is not None)
+        return path
+
+    def _count(self, hit: bool):
+        # Lookups run concurrently on the TTS worker threads
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def tee(self, text: str, provider: str, voice: str, audio_format: str, chunks):
+        """
+        Yield `chunks` unchanged while writing them to the cache. The clip is
+        stored only if the stream is consumed to the end; an aborted stream
+        leaves nothing behind.
+        """
+        if not self.enabled:
+            yield from chunks
+            return
+
+        key = cache_key(text, provider, voice, audio_format)
+        tmp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        complete = False
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete and os.path.getsize(tmp_path) > 0:
+                self._store(f"{key}.{audio_format}", tmp_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fetch(self, text: str, provider: str, voice: str, audio_format: str, synthesize):
+        """
+        Return the path of a clip for `text`, synthesizing it on a miss.
+
+        `synthesize(text, file_path)` must write the audio to `file_path` and
+        return the path, or return None on failure.
+        """
+        if not self.enabled:
+            return synthesize(text, None)
+
+        key = cache_key(text, provider, voice, audio_format)
+        name = f"{key}.{audio_format}"
+
+        path = self._lookup(name)
+        if path:
+            self._count(True)
+            return path
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another request may have filled it while we waited
+            path = self._lookup(name)
+            if path:
+                self._count(True)
+                return path
+
+            self._count(False)
+            tmp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+            try:
+                result = synthesize(text, tmp_path)
+                if result and os.path.exists(tmp_path) and os.path.getsize(tmp_path) > 0:
+                    return self._store(name, tmp_path)
+                return None
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                with self._lock:
+                    self._key_locks.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,125 @@
+"""
+Voice activity detection on whole uploads, ahead of speech-to-text.
+
+Recordings from the frontend start before the caller speaks and stop some
+time after, and some contain no speech at all. Every second of that is
+uploaded to, and billed by, the STT provider. The detector looks at the
+normalized 16 kHz PCM once, in a few vectorized NumPy passes:
+
+- energy of every 20 ms frame (the same measure as endpointing.py);
+- a threshold `margin_db` above the clip's own noise floor (its quietest
+  frames), but at least `peak_margin_db` below its loudest frame, so a
+  clip that is speech from end to end is not mistaken for noise. A clip
+  whose loudest frame is not `margin_db` above its floor has nothing
+  standing out of the noise, and has no speech, however loud that
+  noise is;
+- speech is any run of voiced frames at least `min_speech_ms` long, which
+  ignores clicks and pops.
+
+The clip is cut to the first and last speech frame plus `pad_ms` either
+side. A clip without speech is rejected before any provider is called.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from backend.services.endpointing import FRAME_MS, frame_energy_db
+
+
+class VoiceActivityDetector:
+    """
+    Finds the span of speech in 16-bit mono PCM. Counters are kept for
+    the clips passed to record(), from whichever process trimmed them.
+    """
+
+    def __init__(self, margin_db: float = 10.0, min_threshold_db: float = -50.0,
+                 peak_margin_db: float = 6.0, min_speech_ms: int = 100, pad_ms: int = 200,
+                 enabled: bool = True):
+        self.margin_db = margin_db
+        self.min_threshold_db = min_threshold_db
+        self.peak_margin_db = peak_margin_db
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self.pad_frames = pad_ms // FRAME_MS
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.clips = 0
+        self.rejected = 0
+        self.audio_ms = 0.0
+        self.speech_ms = 0.0
+        self.detect_ms = 0.0
+
+    def threshold_db(self, energies: np.ndarray):
+        """Speech threshold in dBFS, or None when no frame stands out of the noise floor."""
+        floor = float(np.percentile(energies, 10))
+        peak = float(energies.max())
+        if peak - floor < self.margin_db:
+            # Stationary noise (a quiet room, mic hiss): its peak is just its loudest noise frame
+            return None
+        return max(self.min_threshold_db, min(floor + self.margin_db, peak - self.peak_margin_db))
+
+    def find_speech(self, pcm: bytes, sample_rate: int = 16000):
+        """
+        (start, end) byte offsets of the speech in `pcm`, or None if there
+        is none. With detection disabled the whole clip counts as speech.
+        """
+        if not self.enabled:
+            return (0, len(pcm)) if pcm else None
+        frame_samples = sample_rate * FRAME_MS // 1000
+        n_frames = len(pcm) // 2 // frame_samples
+        if n_frames == 0:
+            return None
+        samples = np.frombuffer(pcm, dtype="<i2", count=n_frames * frame_samples)
+        energies = frame_energy_db(samples.reshape(n_frames, frame_samples))
+        threshold = self.threshold_db(energies)
+        if threshold is None:
+            return None
+        voiced = energies > threshold
+
+        run = self.min_speech_frames
+        if run > 1:
+            # Starting frames of every window of `run` voiced frames in a row
+            starts = np.flatnonzero(np.convolve(voiced.astype(np.int16), np.ones(run, dtype=np.int16),
+                                                mode="valid") == run)
+            if len(starts) == 0:
+                return None
+            first, last = int(starts[0]), int(starts[-1]) + run - 1
+        else:
+            frames = np.flatnonzero(voiced)
+            if len(frames) == 0:
+                return None
+            first, last = int(frames[0]), int(frames[-1])
+
+        start = max(0, first - self.pad_frames) * frame_samples * 2
+        end = min(len(pcm), (last + 1 + self.pad_frames) * frame_samples * 2)
+        return start, end
+
+    def record(self, audio_ms: float, speech_ms: float, detect_ms: float = 0.0):
+        with self._lock:
+            self.clips += 1
+            self.rejected += speech_ms == 0
+            self.audio_ms += audio_ms
+            self.speech_ms += speech_ms
+            self.detect_ms += detect_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "clips": self.clips,
+                "rejected": self.rejected,
+                "audio_s": round(self.audio_ms / 1000, 1),
+                "trimmed_s": round((self.audio_ms - self.speech_ms) / 1000, 1),
+                "trimmed_ratio": round(1 - self.speech_ms / self.audio_ms, 3) if self.audio_ms else None,
+                "avg_detect_ms": round(self.detect_ms / self.clips, 3) if self.clips else None,
+            }
+
+
+vad = VoiceActivityDetector(
+    margin_db=float(os.getenv("VAD_MARGIN_DB", "10")),
+    min_threshold_db=float(os.getenv("VAD_MIN_DB", "-50")),
+    min_speech_ms=int(os.getenv("VAD_MIN_SPEECH_MS", "100")),
+    pad_ms=int(os.getenv("VAD_PAD_MS", "200")),
+    enabled=os.getenv("VAD_ENABLED", "true").lower() != "false",
+)
@@ -0,0 +1,168 @@
+"""
+Bounded worker pools for the blocking stages of the voice pipeline.
+
+STT, NLU and TTS all call synchronous SDKs. Each stage gets its own thread
+pool with a fixed number of workers and a bounded wait queue, so a slow
+provider can only ever tie up its own stage and never the event loop.
+When a stage is saturated, new work is rejected immediately with
+StageOverloaded instead of queueing without limit.
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class StageOverloaded(Exception):
+    """Raised when a stage has no free worker and its wait queue is full."""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"{stage} stage is overloaded, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StagePool:
+    """
+    A thread pool with admission control for one pipeline stage.
+
+    At most `max_workers` calls run at once and at most `max_queue` more may
+    wait for a worker. Anything beyond that is rejected up front.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"{name}-worker"
+        )
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    def _admit(self):
+        with self._lock:
+            if self._waiting + self._active >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise StageOverloaded(self.name, self._retry_after())
+            self._waiting += 1
+
+    def _retry_after(self) -> int:
+        # Estimate how long the current backlog takes to drain
+        if self._completed:
+            avg_run = self._total_run / self._completed
+        else:
+            avg_run = 1.0
+        backlog = (self._waiting + self._active) / self.max_workers
+        return max(1, math.ceil(avg_run * backlog))
+
+    def _execute(self, enqueued_at: float, func, *args, **kwargs):
+        started_at = time.monotonic()
+        wait = started_at - enqueued_at
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._total_run += time.monotonic() - started_at
+
+    def submit(self, func, *args, **kwargs) -> asyncio.Future:
+        """
+        Start a blocking callable on this stage's workers and return a future
+        for its result. Admission is checked immediately: raises
+        StageOverloaded before anything is queued. Needs a running loop.
+        """
+        self._admit()
+        try:
+            enqueued_at = time.monotonic()
+            # Carry request-scoped context variables into the worker thread
+            ctx = contextvars.copy_context()
+            call = partial(ctx.run, self._execute, enqueued_at, func, *args, **kwargs)
+            loop = asyncio.get_running_loop()
+            future = self._executor.submit(call)
+        except BaseException:
+            # Not queued (no loop, or the pool is shut down): give the slot back
+            self._release_waiting()
+            raise
+        future.add_done_callback(self._on_done)
+        return asyncio.wrap_future(future, loop=loop)
+
+    def _on_done(self, future):
+        if future.cancelled():
+            # Cancelled while queued (the caller stopped waiting, or shutdown):
+            # _execute never ran to take it off the queue
+            self._release_waiting()
+
+    def _release_waiting(self):
+        with self._lock:
+            self._waiting -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable on this stage's workers and await its result.
+        Raises StageOverloaded if the stage cannot accept more work.
+        """
+        return await self.submit(func, *args, **kwargs)
+
+    def stats(self) -> dict:
+        """Current queue depth and wait times for this stage."""
+        with self._lock:
+            started = self._completed + self._active
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.max_queue,
+                "active": self._active,
+                "waiting": self._waiting,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_run_ms": round(self._total_run / self._completed * 1000, 2) if self._completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _make_pool(name: str, default_workers: int, default_queue: int) -> StagePool:
+    prefix = name.upper()
+    return StagePool(
+        name,
+        max_workers=int(os.getenv(f"{prefix}_WORKERS", default_workers)),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE_SIZE", default_queue)),
+    )
+
+
+stt_pool = _make_pool("stt", 4, 16)
+nlu_pool = _make_pool("nlu", 8, 32)
+tts_pool = _make_pool("tts", 4, 16)
+
+POOLS = {pool.name: pool for pool in (stt_pool, nlu_pool, tts_pool)}
+
+
+def pool_stats() -> dict:
+    """Queue depth and wait time for every stage."""
+    return {name: pool.stats() for name, pool in POOLS.items()}
+
+
+def shutdown_pools(wait: bool = True):
+    for pool in POOLS.values():
+        pool.shutdown(wait=wait)
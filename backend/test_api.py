@@ -0,0 +1,204 @@
+"""
+Tests for the API endpoints, with the providers stubbed out
+"""
+
+import asyncio
+import contextvars
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from backend.services.deadline import STAGE_RESERVE_S, start_deadline
+from backend.services.nlu import RULE_REPLIES
+from backend.services.sessions import new_session_id, session_manager
+
+
+@pytest.fixture
+def client():
+    # No lifespan: the tests need neither the database nor the worker processes
+    return TestClient(main.app)
+
+
+def sse_events(response) -> list:
+    """(event, data) pairs of a server-sent events body."""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def stub_tts(monkeypatch):
+    """Replace TTS with a stub; returns the texts it was asked to synthesize."""
+    synthesized = []
+
+    def text_to_speech(text, preferred_service="auto"):
+        synthesized.append(text)
+        return f"static/audio/{len(synthesized)}.mp3"
+
+    monkeypatch.setattr(main, "text_to_speech", text_to_speech)
+    return synthesized
+
+
+@pytest.mark.parametrize("message", [
+    '{"type": "start", "sample_rate": 0}',
+    '{"type": "start", "sample_rate": "abc"}',
+    '{"type": "start", "sample_rate": null}',
+    '[1]',
+    '"start"',
+    'not json',
+])
+def test_ws_bad_control_messages_get_an_error_reply(client, message):
+    with client.websocket_connect("/ws/process-audio") as ws:
+        ws.send_text(message)
+        assert ws.receive_json()["type"] == "error"
+        # The connection is still usable
+        ws.send_text('{"type": "start", "sample_rate": 16000}')
+        ws.send_text('{"type": "bogus"}')
+        ws.send_text('[]')
+        assert ws.receive_json()["type"] == "error"
+
+
+def blocking_stt(monkeypatch, text="hello"):
+    """Make WebSocket STT wait for the returned event (at most 2 s)."""
+    release = threading.Event()
+
+    def transcribe_pcm(pcm, sample_rate):
+        release.wait(2)
+        return text
+
+    monkeypatch.setattr(main, "transcribe_pcm", transcribe_pcm)
+    monkeypatch.setattr(main, "generate_reply", lambda text, session_id=None: ("hi there", None))
+    stub_tts(monkeypatch)
+    return release
+
+
+def test_ws_keeps_reading_while_a_turn_runs(client, monkeypatch):
+    release = blocking_stt(monkeypatch)
+    with client.websocket_connect("/ws/process-audio") as ws:
+        ws.send_text('{"type": "start", "sample_rate": 16000}')
+        ws.send_bytes(b"\0\0" * 1600)
+        ws.send_text('{"type": "end"}')
+        # The turn is still transcribing, but the next message is read and answered
+        ws.send_text('[1]')
+        assert ws.receive_json()["type"] == "error"
+        release.set()
+        assert ws.receive_json() == {"type": "final", "text": "hello"}
+        response = ws.receive_json()
+        assert response["type"] == "response" and response["bot_response"] == "hi there"
+
+
+def test_ws_client_leaving_mid_turn(client, monkeypatch, capsys):
+    release = blocking_stt(monkeypatch)
+    replied = []
+    monkeypatch.setattr(main, "generate_reply",
+                        lambda text, session_id=None: replied.append(text) or ("hi there", None))
+    with client.websocket_connect("/ws/process-audio") as ws:
+        ws.send_bytes(b"\0\0" * 1600)
+        ws.send_text('{"type": "end"}')
+    release.set()
+    time.sleep(0.2)
+    # The turn was dropped with the connection: no reply generated for
+    # nobody, and nothing sent to a closed socket
+    assert replied == []
+    assert "CRITICAL ERROR" not in capsys.readouterr().out
+
+
+def test_late_nlu_reply_is_not_recorded(monkeypatch):
+    # The caller is given the canned timeout reply, so that is what the
+    # session's history must hold, not the reply that arrived too late
+    finished = threading.Event()
+
+    def slow_reply(user_text, session_id=None):
+        time.sleep(0.5)
+        finished.set()
+        return "the late LLM answer", session_manager.load(session_id)
+
+    monkeypatch.setattr(main, "generate_reply", slow_reply)
+    session_id = new_session_id()
+
+    async def run():
+        deadline = start_deadline("process-text")
+        deadline.expires_at = time.monotonic() + STAGE_RESERVE_S["nlu"] + 0.1
+        return await main.reply_to("what is my balance", session_id)
+
+    reply = contextvars.Context().run(asyncio.run, run())
+    assert reply == RULE_REPLIES["timeout"]
+    assert finished.wait(2)
+    time.sleep(0.05)
+    turns = session_manager.load(session_id).turns
+    assert turns == [["what is my balance", RULE_REPLIES["timeout"]]]
+
+
+def test_sse_does_not_synthesize_sentences_after_the_deadline(client, monkeypatch):
+    synthesized = stub_tts(monkeypatch)
+
+    def stream_response(user_text, cancel=None, session_id=None):
+        yield "First sentence here. "
+        # Generation runs on past the deadline
+        time.sleep(1.2)
+        yield "Second sentence here. Third sentence here."
+
+    monkeypatch.setattr(main, "stream_response", stream_response)
+    response = client.post("/api/process-text/sse", json={"text": "hello"},
+                           headers={"X-Deadline-Ms": "1000"})
+    events = sse_events(response)
+    audio = [data for event, data in events if event == "audio"]
+    assert synthesized == ["First sentence here."]
+    assert [a["audio_url"] for a in audio] == ["/static/audio/1.mp3", None, None]
+    assert events[-1][0] == "done" and "tts" in events[-1][1]["degraded"]
+
+
+def test_process_audio_reads_the_upload(client, monkeypatch):
+    stub_tts(monkeypatch)
+    heard = []
+
+    def transcribe_audio(audio, use_whisper=True, audio_format=None):
+        heard.append((audio.read(), audio_format))
+        return "hello"
+
+    monkeypatch.setattr(main, "transcribe_audio", transcribe_audio)
+    monkeypatch.setattr(main, "generate_reply", lambda text, session_id=None: ("hi there", None))
+    audio = b"OggS" + b"\0" * 2000
+    response = client.post("/api/process-audio", files={"file": ("a.ogg", audio, "audio/ogg")})
+    assert response.status_code == 200
+    assert response.json()["bot_response"] == "hi there"
+    assert heard == [(audio, "ogg")]
+    assert client.post("/api/process-audio", data={"text": "no file"}).status_code == 400
+
+
+def test_sse_events_come_in_order(client, monkeypatch):
+    synthesized = []
+
+    def text_to_speech(text, preferred_service="auto"):
+        # The first sentence is the slowest to synthesize
+        time.sleep(0.3 if not synthesized else 0.01)
+        synthesized.append(text)
+        return f"static/audio/{text.split()[0].lower()}.mp3"
+
+    def stream_response(user_text, cancel=None, session_id=None):
+        yield from ["First sentence ", "here. Second ", "sentence here. ", "Third sentence here."]
+
+    monkeypatch.setattr(main, "text_to_speech", text_to_speech)
+    monkeypatch.setattr(main, "stream_response", stream_response)
+    events = sse_events(client.post("/api/process-text/sse", json={"text": "hello"}))
+
+    texts = [(i, data) for i, (event, data) in enumerate(events) if event == "text"]
+    audio = [(i, data) for i, (event, data) in enumerate(events) if event == "audio"]
+    assert [d["text"] for _, d in texts] == ["First sentence here.", "Second sentence here.",
+                                              "Third sentence here."]
+    # Audio in sentence order, each after its own text
+    assert [d["index"] for _, d in audio] == [0, 1, 2]
+    assert [d["audio_url"] for _, d in audio] == ["/static/audio/first.mp3", "/static/audio/second.mp3",
+                                                   "/static/audio/third.mp3"]
+    for (text_at, _), (audio_at, _) in zip(texts, audio):
+        assert text_at < audio_at
+    assert [event for event, _ in events].count("done") == 1
+    event, done = events[-1]
+    assert event == "done"
+    assert done["bot_response"] == "First sentence here. Second sentence here. Third sentence here."
+    assert done["degraded"] == []
@@ -0,0 +1,94 @@
+"""
+Tests for the audio janitor and the immutable static audio responses
+"""
+
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.services.audio_files import (
+    IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, AudioJanitor, AudioStaticFiles,
+    rename_to_content_hash
+)
+
+HASHED = "ab" * 32
+
+
+def write(directory, name, size, age_s=0.0):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    then = time.time() - age_s
+    os.utime(path, (then, then))
+    return path
+
+
+def test_sweep_expires_old_clips_and_stale_temp_files(tmp_path):
+    d = str(tmp_path)
+    write(d, "old.mp3", 10, age_s=7200)
+    write(d, "new.mp3", 10)
+    write(d, ".abc.tmp", 10, age_s=7200)
+    write(d, ".fresh.tmp", 10)
+    forgotten = []
+    janitor = AudioJanitor(d, ttl_s=3600, max_bytes=10_000, min_age_s=0, on_delete=forgotten.append)
+    result = janitor.sweep()
+    assert sorted(os.listdir(d)) == [".fresh.tmp", "new.mp3"]
+    assert (result["expired"], result["tmp_removed"]) == (1, 1)
+    assert forgotten == ["old.mp3"]
+
+
+def test_sweep_enforces_quota_oldest_first_but_spares_young_clips(tmp_path):
+    d = str(tmp_path)
+    for i, age in enumerate((500, 400, 300, 10)):
+        write(d, f"{i}.mp3", 100, age_s=age)
+    janitor = AudioJanitor(d, ttl_s=3600, max_bytes=150, min_age_s=60)
+    result = janitor.sweep()
+    # 0, 1 and 2 go oldest first; 3 is over quota too but was just written
+    assert os.listdir(d) == ["3.mp3"]
+    assert result["evicted"] == 3 and janitor.stats()["bytes_freed"] == 300
+
+
+def test_content_hash_rename_deduplicates(tmp_path):
+    a = rename_to_content_hash(write(str(tmp_path), "a.mp3", 50))
+    b = rename_to_content_hash(write(str(tmp_path), "b.mp3", 50))
+    assert a == b and os.listdir(tmp_path) == [os.path.basename(a)]
+
+
+def test_hashed_clips_are_immutable_with_etag_and_ranges(tmp_path):
+    clip = os.path.basename(rename_to_content_hash(write(str(tmp_path), "new.mp3", 1000)))
+    write(str(tmp_path), "legacy.mp3", 1000)
+    app = FastAPI()
+    app.mount("/static", AudioStaticFiles(directory=str(tmp_path)))
+    client = TestClient(app)
+
+    response = client.get(f"/static/{clip}")
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    etag = response.headers["etag"]
+    assert client.get(f"/static/{clip}", headers={"If-None-Match": etag}).status_code == 304
+
+    partial = client.get(f"/static/{clip}", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206 and len(partial.content) == 100
+
+    assert "immutable" not in client.get("/static/legacy.mp3").headers.get("cache-control", "")
+
+
+def test_input_keyed_clips_are_revalidated(tmp_path):
+    # A TTS cache clip: named by a hash of the text and voice, not of its bytes
+    path = write(str(tmp_path), f"{HASHED}.mp3", 1000)
+    app = FastAPI()
+    app.mount("/static", AudioStaticFiles(directory=str(tmp_path)))
+    client = TestClient(app)
+
+    response = client.get(f"/static/{HASHED}.mp3")
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    etag = response.headers["etag"]
+    assert client.get(f"/static/{HASHED}.mp3", headers={"If-None-Match": etag}).status_code == 304
+
+    # Re-synthesized (after eviction, or with a new voice model) under the same name
+    with open(path, "wb") as f:
+        f.write(b"y" * 1000)
+    changed = client.get(f"/static/{HASHED}.mp3", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.content == b"y" * 1000
+    assert changed.headers["etag"] != etag
@@ -0,0 +1,96 @@
+"""
+Tests for audio format sniffing and in-memory upload handling
+"""
+
+import io
+import shutil
+import wave
+
+import pytest
+from starlette.applications import Starlette
+from starlette.formparsers import MultiPartParser
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from backend.services.audio_io import (
+    AUDIO_SPOOL_MAX_BYTES, UploadTooLarge, read_audio_upload, sniff_format, sniff_stream, to_wav_buffer
+)
+
+
+def wav_bytes(frames: int = 1600, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\0\0" * frames)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("head, expected", [
+    (wav_bytes()[:16], "wav"),
+    (b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81", "webm"),
+    (b"OggS\x00\x02\x00\x00\x00\x00\x00\x00", "ogg"),
+    (b"ID3\x04\x00\x00\x00\x00\x00\x00", "mp3"),
+    (b"\xff\xfb\x90\x64\x00\x00\x00\x00", "mp3"),  # bare MPEG frame sync
+    (b"fLaC\x00\x00\x00\x22", "flac"),
+    (b"\x00\x00\x00\x20ftypM4A ", "mp4"),
+    (b"FORM\x00\x00\x10\x00AIFF", "aiff"),
+])
+def test_sniff_known_formats(head, expected):
+    assert sniff_format(head) == expected
+
+
+@pytest.mark.parametrize("head", [b"", b"\xff", b"hello world, not audio", b"RIFF\x00\x00\x00\x00AVI "])
+def test_sniff_unknown_input(head):
+    assert sniff_format(head) is None
+
+
+def test_sniff_stream_rewinds():
+    stream = io.BytesIO(b"OggS" + b"\0" * 100)
+    stream.seek(50)
+    assert sniff_stream(stream) == "ogg"
+    assert stream.tell() == 0
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="pydub needs ffmpeg")
+def test_to_wav_buffer_decodes_in_memory():
+    pytest.importorskip("pydub")
+    out = to_wav_buffer(io.BytesIO(wav_bytes(rate=8000)), "wav")
+    assert sniff_stream(out) == "wav" and out.tell() == 0
+
+
+async def upload_info(request):
+    try:
+        upload = await read_audio_upload(request, max_bytes=1024 * 1024)
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    data = await upload.read()
+    # Still in memory, not rolled over to a temporary file on disk
+    in_memory = not upload.file._rolled
+    await upload.close()
+    return JSONResponse({"bytes": len(data), "format": sniff_format(data[:16]), "in_memory": in_memory})
+
+
+@pytest.fixture
+def client():
+    return TestClient(Starlette(routes=[Route("/upload", upload_info, methods=["POST"])]))
+
+
+def test_upload_larger_than_starlette_default_stays_in_memory(client):
+    audio = wav_bytes(frames=400000)  # 800 KB, under the limit
+    assert len(audio) < AUDIO_SPOOL_MAX_BYTES
+    response = client.post("/upload", files={"file": ("a.wav", audio, "audio/wav")})
+    assert response.json() == {"bytes": len(audio), "format": "wav", "in_memory": True}
+    # Only the audio upload is parsed this way; other forms keep Starlette's default
+    assert MultiPartParser.spool_max_size == 1024 * 1024
+
+
+def test_upload_limits(client):
+    too_big = client.post("/upload", files={"file": ("a.wav", b"\0" * (1024 * 1024 + 1), "audio/wav")})
+    assert too_big.status_code == 413
+    assert client.post("/upload", data={"text": "no file"}).status_code == 400
+    assert client.post("/upload", content=b"raw", headers={"Content-Type": "audio/wav"}).status_code == 400
@@ -2,11 +2,12 @@
 Test script to verify database functionality and query capabilities
 """
 
-from database import SessionLocal, FAQ, Account
+from database import SessionLocal, FAQ, Account, init_db
 
 def test_database():
     """Test database queries and display sample data"""
     
+    init_db()
     db = SessionLocal()
     
     print("=" * 60)
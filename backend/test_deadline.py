@@ -0,0 +1,99 @@
+"""
+Tests for the per-request deadline budget
+"""
+
+import asyncio
+import contextvars
+import time
+
+import pytest
+
+from backend.services import deadline as deadlines
+from backend.services.deadline import (
+    MAX_BUDGET_MS, MIN_BUDGET_MS, STAGE_RESERVE_S, Deadline, DeadlineExceeded, budget_ms,
+    current_deadline, degrade, degraded, has_time, out_of_time, start_deadline, time_left,
+    within_deadline
+)
+from backend.services.workers import StagePool
+
+
+def in_request(func, endpoint="process-text", requested_ms=None):
+    """Run `func` in a fresh context with a deadline, like a request handler."""
+    def run():
+        start_deadline(endpoint, requested_ms)
+        return func()
+    return contextvars.Context().run(run)
+
+
+def test_budget_per_endpoint_and_header_override(monkeypatch):
+    monkeypatch.setenv("DEADLINE_PROCESS_AUDIO_MS", "9000")
+    assert budget_ms("process-audio") == 9000
+    assert budget_ms("process-text") == deadlines.DEFAULT_BUDGET_MS
+    assert budget_ms("process-audio", "4000") == 4000
+    # Out-of-range requests are clamped; garbage is ignored
+    assert budget_ms("process-audio", "1") == MIN_BUDGET_MS
+    assert budget_ms("process-audio", str(MAX_BUDGET_MS * 10)) == MAX_BUDGET_MS
+    assert budget_ms("process-audio", "soon") == 9000
+
+
+def test_stages_keep_a_reserve_for_later_stages():
+    deadline = Deadline("process-audio", 10000)
+    assert deadline.time_left("tts") == pytest.approx(10, abs=0.05)
+    assert deadline.time_left("nlu") == pytest.approx(10 - STAGE_RESERVE_S["nlu"], abs=0.05)
+    assert deadline.time_left("stt") == pytest.approx(10 - STAGE_RESERVE_S["stt"], abs=0.05)
+    assert deadline.time_left("tts", cap=2) == 2
+    # A short budget is not all reserve
+    short = Deadline("process-audio", 2000)
+    assert short.time_left("stt") == pytest.approx(1, abs=0.05)
+
+
+def test_outside_a_request_calls_keep_their_own_timeouts():
+    def check():
+        assert current_deadline() is None
+        assert time_left("nlu", 30) == 30
+        assert time_left("stt") is None
+        assert has_time("tts") and not out_of_time("tts")
+        degrade("nlu", "ignored")
+        assert not degraded("nlu")
+    contextvars.Context().run(check)
+
+
+def test_spent_budget_degrades():
+    def check():
+        current_deadline().expires_at = time.monotonic() + STAGE_RESERVE_S["nlu"] + 0.1
+        assert has_time("tts") and not has_time("nlu")
+        assert out_of_time("stt")
+        degrade("nlu", "no time left for the LLM")
+        degrade("nlu", "counted once")
+        return current_deadline().degraded
+    assert in_request(check) == {"nlu": "no time left for the LLM"}
+
+
+def test_within_deadline_stops_waiting():
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def run():
+        deadline = start_deadline("process-text")
+        deadline.expires_at = time.monotonic() + 0.1
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await within_deadline("tts", slow())
+        return time.monotonic() - start
+    assert asyncio.run(run()) < 1
+
+
+def test_deadline_reaches_the_stage_workers():
+    pool = StagePool("test", max_workers=1, max_queue=1)
+
+    async def run():
+        deadline = start_deadline("process-text", "5000")
+        left = await pool.run(time_left, "tts")
+        await pool.run(degrade, "tts", "no time left to synthesize")
+        return deadline, left
+    try:
+        deadline, left = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert 4.5 < left <= 5
+    assert "tts" in deadline.degraded
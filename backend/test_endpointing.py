@@ -0,0 +1,87 @@
+"""
+Tests for server-side endpointing of streamed speech input
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.endpointing import FRAME_MS, Endpointer
+
+RATE = 16000
+FRAME_BYTES = RATE * FRAME_MS // 1000 * 2
+
+
+def silence(ms):
+    return np.zeros(RATE * ms // 1000, dtype="<i2").tobytes()
+
+
+def speech(ms, level=8000):
+    t = np.arange(RATE * ms // 1000) / RATE
+    return (level * np.sin(2 * np.pi * 200 * t)).astype("<i2").tobytes()
+
+
+def feed_all(endpointer, pcm, chunk=FRAME_BYTES):
+    """Feed `pcm` in chunks; the events returned, in order."""
+    events = []
+    for offset in range(0, len(pcm), chunk):
+        event = endpointer.feed(pcm[offset:offset + chunk])
+        if event:
+            events.append(event)
+    return events
+
+
+def test_speech_start_then_end_after_trailing_silence():
+    endpointer = Endpointer(silence_ms=300, pre_roll_ms=100)
+    assert feed_all(endpointer, silence(500)) == []
+    assert not endpointer.in_speech
+    assert feed_all(endpointer, speech(400)) == ["speech_start"]
+    assert endpointer.in_speech
+    # Not over until the trailing silence is long enough
+    assert feed_all(endpointer, silence(200)) == []
+    assert feed_all(endpointer, silence(200)) == ["end"]
+
+
+def test_take_utterance_keeps_pre_roll_and_resets():
+    endpointer = Endpointer(silence_ms=300, pre_roll_ms=100)
+    feed_all(endpointer, silence(500) + speech(400) + silence(400))
+    pcm = endpointer.take_utterance()
+    # Pre-roll + speech + the trailing silence that ended it
+    assert len(pcm) == (100 + 400 + 300) * RATE // 1000 * 2
+    assert not endpointer.in_speech and endpointer.buffered_ms == 0
+    # The next utterance is detected again
+    assert feed_all(endpointer, speech(200) + silence(400)) == ["speech_start", "end"]
+
+
+def test_partial_frames_are_carried_over():
+    endpointer = Endpointer(silence_ms=300)
+    # Odd-sized chunks that never line up with a frame
+    assert feed_all(endpointer, speech(400) + silence(400), chunk=333) == ["speech_start", "end"]
+
+
+def test_max_utterance_length_forces_end():
+    endpointer = Endpointer(silence_ms=1000, max_utterance_ms=500)
+    assert feed_all(endpointer, speech(800)) == ["speech_start", "end"]
+    assert len(endpointer.take_utterance()) <= 500 * RATE // 1000 * 2
+
+
+def test_forced_end_without_speech():
+    endpointer = Endpointer()
+    feed_all(endpointer, silence(200))
+    assert endpointer.take_utterance() == b""
+    feed_all(endpointer, silence(200))
+    # The client ended the utterance (push-to-talk): whatever is buffered is used
+    assert len(endpointer.take_utterance(force=True)) > 0
+
+
+def test_snapshot_only_during_speech():
+    endpointer = Endpointer(silence_ms=300)
+    feed_all(endpointer, silence(200))
+    assert endpointer.snapshot() == b""
+    feed_all(endpointer, speech(200))
+    assert len(endpointer.snapshot()) > 0 and endpointer.in_speech
+
+
+@pytest.mark.parametrize("rate", [0, -16000, 4000, 192000])
+def test_rejects_unusable_sample_rates(rate):
+    with pytest.raises(ValueError):
+        Endpointer(sample_rate=rate)
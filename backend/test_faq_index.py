@@ -0,0 +1,56 @@
+"""
+Tests for the BM25 FAQ index used by query_database
+"""
+
+from backend.services.faq_index import FAQIndex, tokenize
+
+FAQS = [
+    (1, "What are your operating hours", "We are available 24/7."),
+    (2, "How do I reset my password", "Click 'Forgot Password' on the login page."),
+    (3, "How long do transfers take", "Internal transfers are instant."),
+    (4, "How do I open a new account", "Open one online or at a branch."),
+]
+
+
+def build_index():
+    index = FAQIndex()
+    index.build(FAQS)
+    return index
+
+
+def test_tokenize_drops_stopwords_and_stems():
+    assert tokenize("How long do transfers take?") == ["long", "transfer", "tak"]
+    assert tokenize("transferring") == tokenize("transferred") == tokenize("transfer")
+
+
+def test_exact_question_is_confident_match():
+    hit = build_index().search("what are your operating hours", limit=1)[0]
+    assert hit["id"] == 1
+    assert hit["confidence"] == 1.0
+
+
+def test_paraphrase_ranks_right_faq():
+    hit = build_index().search("how long does a transfer take", limit=1)[0]
+    assert hit["id"] == 3
+    assert hit["confidence"] > 0.65
+
+
+def test_unrelated_text_has_no_confident_match():
+    index = build_index()
+    assert index.search("what is the weather today") == []
+    hits = index.search("when are you open")
+    assert hits and hits[0]["confidence"] < 0.65
+
+
+def test_incremental_add_and_remove():
+    index = build_index()
+    index.add(5, "What are the transfer limits", "Daily limit is $5,000.")
+    assert index.search("transfer limits", limit=1)[0]["id"] == 5
+
+    index.remove(5)
+    assert index.search("transfer limits", limit=1)[0]["id"] == 3
+    assert len(index) == 4
+
+    index.add(2, "How do I change my PIN", "Use the mobile app.")
+    assert index.search("reset password") == []
+    assert index.search("change pin", limit=1)[0]["id"] == 2
@@ -0,0 +1,57 @@
+"""
+Tests for FTS5-backed FAQ keyword search
+"""
+
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from database import FAQ, init_db, make_async_engine, make_engine
+from backend.services.faq_search import fts_terms, search_faqs
+
+
+def test_terms_are_quoted_and_last_is_prefix():
+    assert fts_terms("How do I reset my passw") == ['"reset"', '"passw"*']
+    assert fts_terms('bad" OR (x') == ['"bad"', '"x"*']
+    assert fts_terms("how") == ['"how"*']
+    assert fts_terms("?!") == []
+
+
+def test_ranked_prefix_search_follows_table_changes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'search.db'}"
+    engine = make_engine(url)
+    init_db(engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        FAQ(question="How do I reset my password", answer="Use Forgot Password on the login page."),
+        FAQ(question="How long do transfers take", answer="Transfers are instant."),
+        FAQ(question="What are the transfer limits", answer="The daily limit is $5,000."),
+    ])
+    db.commit()
+
+    async def search(q, limit=10):
+        async_engine = make_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+        async with async_sessionmaker(async_engine)() as session:
+            results = await search_faqs(session, q, limit)
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(search("passw"))
+    assert [r["id"] for r in results] == [1]
+    assert "<mark>password</mark>" in results[0]["question_highlight"]
+
+    # Stemmed, ranked and limited
+    results = asyncio.run(search("transferring limit", limit=1))
+    assert [r["id"] for r in results] == [3]
+
+    # Triggers keep the index in sync with updates and deletes
+    faq = db.get(FAQ, 1)
+    faq.question = "How do I change my PIN"
+    db.commit()
+    assert [r["id"] for r in asyncio.run(search("pin"))] == [1]
+    db.delete(db.get(FAQ, 2))
+    db.commit()
+    assert [r["id"] for r in asyncio.run(search("instant"))] == []
+    db.close()
+    engine.dispose()
@@ -0,0 +1,84 @@
+"""
+Tests for embedding-based FAQ retrieval
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.faq_vectors import FAQ_VECTOR_THRESHOLD, FAQVectorIndex, HashingEncoder
+
+FAQS = [
+    (1, "What are your operating hours", "We are available 24/7."),
+    (2, "How do I reset my password", "Click 'Forgot Password' on the login page."),
+    (3, "How do I open a new account", "Open one online or at a branch."),
+    (4, "What should I do if my card is lost or stolen", "Call us to block it."),
+    (5, "How can I contact customer support", "Call 1-800-BANK-HELP."),
+    (6, "What are the account fees", "No monthly fees."),
+]
+
+
+def build_index(path=None):
+    index = FAQVectorIndex(HashingEncoder(), path=path)
+    index.build(FAQS)
+    return index
+
+
+def test_paraphrases_match_without_shared_words():
+    index = build_index()
+    hit = index.search("when are you open", limit=1)[0]
+    assert hit["id"] == 1 and hit["confidence"] >= 0.45
+    assert index.search("I forgot my login", limit=1)[0]["id"] == 2
+
+
+def test_exact_question_has_full_confidence():
+    hit = build_index().search("how do I open a new account", limit=2)[0]
+    assert hit["id"] == 3
+    assert abs(hit["confidence"] - 1.0) < 1e-5
+
+
+def test_unrelated_text_has_no_match():
+    assert build_index().search("what is the weather today") == []
+
+
+def test_matrix_is_saved_and_memory_mapped(tmp_path):
+    path = str(tmp_path / "faq_vectors.npy")
+    build_index(path)
+    reloaded = build_index(path)
+    assert isinstance(reloaded.matrix, np.memmap)
+    assert reloaded.matrix.dtype == np.float32 and reloaded.matrix.shape[0] == len(FAQS)
+    assert reloaded.search("card stolen", limit=1)[0]["id"] == 4
+
+
+def test_changed_questions_are_reembedded(tmp_path):
+    path = str(tmp_path / "faq_vectors.npy")
+    build_index(path)
+    index = FAQVectorIndex(HashingEncoder(), path=path)
+    index.build(FAQS + [(7, "What are the transfer limits", "Daily limit is $5,000.")])
+    assert index.matrix.shape[0] == 7
+    assert index.search("transfer limit", limit=1)[0]["id"] == 7
+
+
+@pytest.mark.parametrize("text, faq_id", [
+    ("I forgot my login", 2),
+    ("how can I reach support", 5),
+    ("what does it cost to keep an account", 6),
+    ("my card was stolen", 4),
+])
+def test_paraphrases_are_confident_matches(text, faq_id):
+    hit = build_index().match(text, FAQ_VECTOR_THRESHOLD)
+    assert hit is not None and hit["id"] == faq_id
+
+
+@pytest.mark.parametrize("text", [
+    "what time is it",
+    "when is my birthday",
+    "how much is a pizza",
+    "can you call me a taxi",
+    "I want to talk to a human",
+])
+def test_one_shared_concept_is_not_a_match(text):
+    # Each of these shares a single concept word with an FAQ ("time",
+    # "much", "call"), which scores like a paraphrase but is off-topic
+    index = build_index()
+    assert index.search(text, limit=1)[0]["confidence"] >= FAQ_VECTOR_THRESHOLD
+    assert index.match(text, FAQ_VECTOR_THRESHOLD) is None
@@ -0,0 +1,116 @@
+"""
+Tests for hedged and raced LLM calls
+"""
+
+import threading
+import time
+from collections import deque
+
+from backend.services.hedging import Hedger
+
+
+def backend(result, delay=0.0, log=None, name=None):
+    def call(cancel):
+        if log is not None:
+            log.append(("start", name))
+        if cancel.wait(delay):
+            if log is not None:
+                log.append(("cancelled", name))
+            return None
+        return result
+    return call
+
+
+def test_fast_primary_never_hedges():
+    hedger = Hedger(mode="hedge", delay_ms=200)
+    log = []
+    name, result = hedger.call([("gpt", backend("a", 0.01, log, "gpt")),
+                                ("ollama", backend("b", 0.01, log, "ollama"))])
+    assert (name, result) == ("gpt", "a")
+    assert ("start", "ollama") not in log
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    hedger = Hedger(mode="hedge", delay_ms=50)
+    log, hedges = [], []
+    start = time.monotonic()
+    name, result = hedger.call([("gpt", backend("a", 2.0, log, "gpt")),
+                                ("ollama", backend("b", 0.01, log, "ollama"))],
+                               on_hedge=hedges.append)
+    assert (name, result) == ("ollama", "b")
+    assert time.monotonic() - start < 1.0
+    assert hedges == ["gpt"]
+    time.sleep(0.05)
+    assert ("cancelled", "gpt") in log
+    stats = hedger.stats()
+    assert stats["hedge_rate"] == 1.0 and stats["wins"] == {"ollama": 1}
+
+
+def test_failed_primary_falls_back_immediately():
+    hedger = Hedger(mode="hedge", delay_ms=5000)
+    start = time.monotonic()
+    name, result = hedger.call([("gpt", backend(None)), ("ollama", backend("b"))])
+    assert (name, result) == ("ollama", "b")
+    assert time.monotonic() - start < 1.0
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_race_starts_everything_at_once():
+    hedger = Hedger(mode="race")
+    started = threading.Barrier(2, timeout=1)
+
+    def racer(result, delay):
+        def call(cancel):
+            started.wait()  # only passes if both run concurrently
+            return None if cancel.wait(delay) else result
+        return call
+
+    assert hedger.call([("gpt", racer("a", 0.3)), ("ollama", racer("b", 0.01))]) == ("ollama", "b")
+
+
+def test_all_failing_returns_none():
+    assert Hedger().call([("gpt", backend(None)), ("ollama", backend(None))]) == (None, None)
+
+
+def test_delay_tracks_primary_p90():
+    hedger = Hedger(delay_ms=None, default_delay_ms=1500, min_samples=10)
+    assert hedger.hedge_delay_s("gpt") == 1.5
+    for i in range(1, 11):
+        hedger._latencies.setdefault("gpt", deque()).append(i * 100.0)
+    assert abs(hedger.hedge_delay_s("gpt") - 1.0) < 1e-9
+
+
+def test_timeout_gives_up_and_cancels_everything():
+    hedger = Hedger(mode="hedge", delay_ms=50)
+    log = []
+    start = time.monotonic()
+    name, result = hedger.call([("gpt", backend("a", 2.0, log, "gpt")),
+                                ("ollama", backend("b", 2.0, log, "ollama"))], timeout=0.2)
+    assert (name, result) == (None, None)
+    assert time.monotonic() - start < 0.5
+    time.sleep(0.05)
+    assert ("cancelled", "gpt") in log and ("cancelled", "ollama") in log
+    assert hedger.stats()["timeouts"] == 1
+
+
+def test_hung_primary_does_not_hold_up_the_hedge():
+    # Calls that ignore cancellation (a blocking HTTP request) keep their
+    # thread after the caller gave up on them
+    hedger = Hedger(mode="hedge", delay_ms=50, max_workers=2)
+    release = threading.Event()
+
+    def hung(cancel):
+        release.wait(5)
+        return "late"
+
+    try:
+        for _ in range(2):
+            assert hedger.call([("gpt", hung)], timeout=0.05) == (None, None)
+        # Every GPT thread is stuck, yet the hedge to Ollama starts on time
+        start = time.monotonic()
+        name, result = hedger.call([("gpt", hung), ("ollama", backend("b", 0.01))], timeout=2)
+        assert (name, result) == ("ollama", "b")
+        assert time.monotonic() - start < 0.5
+    finally:
+        release.set()
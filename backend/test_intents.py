@@ -0,0 +1,68 @@
+"""
+Tests for the intent router in front of the FAQ, account and LLM paths
+"""
+
+import time
+
+from backend.services.faq_index import FAQIndex
+from backend.services.intents import IntentRouter, fallback_rule, match_rule
+
+FAQS = [
+    (1, "What are your operating hours", "We are available 24/7."),
+    (2, "How do I open a new account", "Open an account online or at any branch."),
+    (3, "How do I reset my password", "Click 'Forgot Password' on the login page."),
+    (4, "How long do transfers take", "Internal transfers are instant."),
+    (5, "What are the account fees", "Checking is fee-free with a $500 minimum balance."),
+]
+
+
+def make_router():
+    index = FAQIndex()
+    index.build(FAQS)
+    return IntentRouter(index_getter=lambda: index), index
+
+
+def test_small_talk_matches_whole_utterance_only():
+    assert match_rule("Hello there!") == "greeting"
+    assert match_rule("Thanks so much") == "thanks"
+    assert match_rule("What's your name?") == "name"
+    assert match_rule("hi, what's my balance") is None
+    # The fallback looks for whole words: "this" is not "hi"
+    assert fallback_rule("is this thing on") is None
+    assert fallback_rule("can you help with this") == "help"
+
+
+def test_routes():
+    router, _ = make_router()
+    assert router.route("hi").intent == "rule"
+    assert router.route("What's my balance?")[:2] == ("account", None)
+    assert router.route("how much money do I have").intent == "account"
+    # Mentioning "account" is no longer enough for an account lookup
+    assert router.route("How do I open an account").intent == "faq"
+    assert router.route("what fees do accounts charge").intent == "faq"
+    route = router.route("tell me a joke")
+    assert (route.intent, route.method) == ("llm", "classifier")
+
+
+def test_account_problems_are_not_account_lookups():
+    router, _ = make_router()
+    for text in ("I lost my account number", "my account status is wrong, who do I contact",
+                 "I forgot my account number", "my account balance is wrong",
+                 "someone changed my account details", "I need to update my account details"):
+        assert router.route(text).intent != "account", text
+    for text in ("What is my account number?", "tell me my account status", "can you check my balance",
+                 "I'd like to know my account balance", "my account number please"):
+        assert router.route(text)[:3] == ("account", None, 1.0), text
+
+
+def test_retrains_in_background_when_faqs_change():
+    router, index = make_router()
+    router.warm()
+    trained = router.stats()["trained_on_version"]
+    index.add(6, "How do I order a new checkbook", "Order checkbooks in the app.")
+    router.route("order a checkbook")
+    for _ in range(100):
+        if router.stats()["trained_on_version"] != trained:
+            break
+        time.sleep(0.02)
+    assert router.stats()["trained_on_version"] == index.version
@@ -0,0 +1,55 @@
+"""
+Tests for the background batched Interaction writer
+"""
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Interaction
+from backend.services.interaction_log import InteractionWriter
+
+
+def make_session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'log.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def row(i):
+    return {"user_text": f"q{i}", "bot_response": "a", "response_time_ms": float(i)}
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    factory = make_session_factory(tmp_path)
+    writer = InteractionWriter(factory, batch_size=10, flush_ms=50)
+    for i in range(25):
+        assert writer.submit(row(i))
+    assert writer.flush(timeout=5)
+    writer.stop()
+
+    db = factory()
+    assert db.query(Interaction).count() == 25
+    assert db.query(Interaction).filter(Interaction.timestamp.is_(None)).count() == 0
+    db.close()
+    stats = writer.stats()
+    assert stats["written"] == 25 and stats["batches"] >= 3
+
+
+def test_stop_writes_remaining_rows(tmp_path):
+    factory = make_session_factory(tmp_path)
+    writer = InteractionWriter(factory, batch_size=1000, flush_ms=60000)
+    for i in range(5):
+        writer.submit(row(i))
+    writer.stop()
+
+    db = factory()
+    assert db.query(Interaction).count() == 5
+    db.close()
+
+
+def test_full_queue_drops_new_rows(tmp_path):
+    writer = InteractionWriter(make_session_factory(tmp_path), max_queue=2, policy="drop")
+    writer._thread = object()  # keep the writer from draining the queue
+    results = [writer.submit(row(i)) for i in range(4)]
+    assert results == [True, True, False, False]
+    assert writer.stats()["dropped"] == 2
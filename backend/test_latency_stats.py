@@ -0,0 +1,130 @@
+"""
+Tests for the streaming latency aggregates behind /api/stats
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Interaction, LatencyRollup
+from backend.services import latency_stats as latency_module
+from backend.services.latency_stats import LatencyStats, QuantileSketch
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def record(factory, stats, *values):
+    """(ms, epoch) pairs folded into the rollups, one transaction."""
+    db = factory()
+    stats.rollup(db.connection(), values)
+    db.commit()
+    db.close()
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_sketch_quantiles_within_relative_error():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(6, 1) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.95, 0.99):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) / exact <= 0.011
+
+
+def test_merged_sketches_match_single_sketch():
+    values = [float(v) for v in range(1, 1001)]
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for v in values:
+        whole.add(v)
+        (left if v % 2 else right).add(v)
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.bins == whole.bins
+    assert left.quantile(0.95) == whole.quantile(0.95)
+
+
+def test_windows_only_include_recent_values(session_factory):
+    stats = LatencyStats(session_factory)
+    now = time.time()
+    record(session_factory, stats, (1000.0, now - 2 * 3600), (100.0, now - 30 * 60))
+    record(session_factory, stats, (10.0, now))
+    snapshot = stats.snapshot()
+    assert snapshot["count"] == 3
+    assert snapshot["windows"]["5m"]["count"] == 1
+    assert snapshot["windows"]["1h"]["count"] == 2
+    assert snapshot["windows"]["24h"]["count"] == 3
+
+
+def test_rollups_match_an_in_memory_sketch(session_factory):
+    rng = random.Random(3)
+    values = [rng.lognormvariate(6, 1) for _ in range(2000)] + [0.0]
+    stats = LatencyStats(session_factory)
+    now = time.time()
+    for start in range(0, len(values), 300):
+        record(session_factory, stats, *((v, now) for v in values[start:start + 300]))
+    sketch = QuantileSketch()
+    for v in values:
+        sketch.add(v)
+    expected = sketch.summary()
+    assert stats.snapshot()["count"] == expected["count"]
+    assert stats.snapshot()["p95_ms"] == expected["p95_ms"]
+    assert stats.snapshot()["windows"]["5m"] == expected
+
+
+def test_every_process_sees_the_same_numbers(session_factory):
+    # Two workers: one writes the interactions, the other serves /api/stats
+    writer, reader = LatencyStats(session_factory), LatencyStats(session_factory)
+    record(session_factory, writer, (120.0, time.time()))
+    assert reader.snapshot()["count"] == 1
+
+
+def test_written_interactions_are_rolled_up_in_their_transaction(session_factory, monkeypatch):
+    stats = LatencyStats(session_factory)
+    monkeypatch.setattr(latency_module, "latency_stats", stats)
+    db = session_factory()
+    db.add_all([Interaction(user_text="q", bot_response="a", response_time_ms=float(ms))
+                for ms in (100, 200, 300)])
+    db.commit()
+    db.add(Interaction(user_text="q", bot_response="a", response_time_ms=5000.0))
+    db.flush()
+    db.rollback()
+    db.close()
+    snapshot = stats.snapshot()
+    assert snapshot["count"] == 3 and snapshot["avg_ms"] == 200.0
+
+
+def test_backfill_scans_the_interactions_only_once(session_factory, monkeypatch):
+    db = session_factory()
+    old = datetime.utcnow() - timedelta(days=3)
+    # Logged before the rollups existed: not folded in by the listener
+    db.execute(Interaction.__table__.insert(), [
+        {"user_text": "q", "bot_response": "a", "response_time_ms": 50.0, "timestamp": old},
+        {"user_text": "q", "bot_response": "a", "response_time_ms": 70.0, "timestamp": datetime.utcnow()},
+    ])
+    db.commit()
+    db.close()
+    stats = LatencyStats(session_factory)
+    assert stats.backfill() is True
+    snapshot = stats.snapshot()
+    assert snapshot["count"] == 2 and snapshot["windows"]["5m"]["count"] == 1
+    assert stats.backfill() is False
+    assert stats.snapshot()["count"] == 2
+    db = session_factory()
+    assert db.query(LatencyRollup).filter_by(period="all").count() == 1
+    db.close()
@@ -0,0 +1,69 @@
+"""
+Tests for keyset pagination, projections and ETags of the listing endpoints
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, FAQ, make_async_engine
+from backend.services.listing import (
+    content_etag, decode_cursor, encode_cursor, etag_matches, fetch_page, parse_fields
+)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor(42)) == 42
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_fields_always_include_id_and_reject_unknown():
+    columns = parse_fields("answer", FAQ, ["id", "question", "answer"])
+    assert [c.key for c in columns] == ["id", "answer"]
+    with pytest.raises(HTTPException):
+        parse_fields("answer,secret", FAQ, ["id", "question", "answer"])
+
+
+def test_etag_follows_the_data_whoever_writes_it(tmp_path):
+    path = tmp_path / "etag.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([FAQ(question="q1", answer="a1"), FAQ(question="q2", answer="a2")])
+    db.commit()
+    db.close()
+    async_engine = make_async_engine(f"sqlite+aiosqlite:///{path}")
+    columns = parse_fields(None, FAQ, ["id", "question", "answer"])
+
+    def page_etag(limit=50):
+        async def run():
+            async with async_sessionmaker(async_engine)() as session:
+                rows, next_cursor = await fetch_page(session, FAQ, columns, None, limit)
+            return content_etag({"count": len(rows), "faqs": rows, "next_cursor": next_cursor})
+        return asyncio.run(run())
+
+    before = page_etag()
+    assert page_etag() == before
+    assert page_etag(limit=1) != before
+    # Another process (seed_db.py, a second worker) edits an answer
+    other = sqlite3.connect(path)
+    other.execute("UPDATE faqs SET answer = 'changed' WHERE question = 'q2'")
+    other.commit()
+    other.close()
+    assert page_etag() != before
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def test_if_none_match_uses_weak_comparison():
+    assert etag_matches('"abc", W/"def"', 'W/"def"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert not etag_matches('"abc"', 'W/"xyz"')
+    assert not etag_matches(None, 'W/"abc"')
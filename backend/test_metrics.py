@@ -0,0 +1,53 @@
+"""
+Tests for per-request stage tracing
+"""
+
+import contextvars
+import threading
+
+import pytest
+
+from backend.services.metrics import (
+    STAGE_ERRORS, record_provider, start_trace
+)
+
+
+def test_trace_records_stage_timings_and_providers():
+    def run():
+        trace = start_trace("test")
+        with trace.timed("nlu"):
+            record_provider("nlu", "faq")
+        trace.finish()
+        return trace.interaction_fields()
+
+    fields = contextvars.copy_context().run(run)
+    assert fields["endpoint"] == "test"
+    assert fields["nlu_source"] == "faq"
+    assert fields["nlu_ms"] is not None
+    assert fields["stt_ms"] is None and fields["tts_provider"] is None
+
+
+def test_provider_reported_from_worker_thread():
+    # The stage pools copy the request context into their threads
+    def run():
+        trace = start_trace("test")
+        ctx = contextvars.copy_context()
+        worker = threading.Thread(target=ctx.run, args=(record_provider, "tts", "gtts"))
+        worker.start()
+        worker.join()
+        return trace.providers
+
+    assert contextvars.copy_context().run(run) == {"tts": "gtts"}
+
+
+def test_failed_stage_counts_error():
+    def run():
+        trace = start_trace("test-errors")
+        with pytest.raises(RuntimeError):
+            with trace.timed("tts"):
+                raise RuntimeError("boom")
+        return trace
+
+    trace = contextvars.copy_context().run(run)
+    assert "tts" in trace.timings_ms
+    assert STAGE_ERRORS.labels("test-errors", "tts")._value.get() == 1
@@ -0,0 +1,84 @@
+"""
+Tests for the streamed NLU reply, with the LLM streams stubbed out
+"""
+
+import threading
+
+import pytest
+
+from backend.services import nlu
+from backend.services.intents import Route
+from backend.services.response_cache import ResponseCache
+from backend.services.sessions import MemorySessionStore, SessionManager
+
+
+def tokens(*pieces, fail_after=None):
+    """A stub LLM stream: yields `pieces`, raising after `fail_after` of them."""
+    def stream(user_text, history=()):
+        for i, piece in enumerate(pieces):
+            if fail_after is not None and i == fail_after:
+                raise ConnectionError("stream dropped")
+            yield piece
+        if fail_after is not None and fail_after >= len(pieces):
+            raise ConnectionError("stream dropped")
+    return stream
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Route everything to the LLM; returns a dict to set the `gpt` and `ollama` streams."""
+    streams = {"gpt": tokens(), "ollama": tokens()}
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(nlu, "route_intent", lambda text: Route("llm", None, 1.0, "test"))
+    monkeypatch.setattr(nlu, "query_database", lambda text, intent=None: None)
+    monkeypatch.setattr(nlu, "response_cache", ResponseCache(ttls={"gpt": 60, "ollama": 60, "rules": 60}))
+    monkeypatch.setattr(nlu, "session_manager", SessionManager(MemorySessionStore()))
+    monkeypatch.setattr(nlu, "stream_gpt", lambda text, history: streams["gpt"](text, history))
+    monkeypatch.setattr(nlu, "stream_ollama", lambda prompt, text, history: streams["ollama"](text, history))
+    return streams
+
+
+def test_gpt_reply_streams_and_is_cached(llm):
+    llm["gpt"] = tokens("Our branches ", "open at ", "nine.")
+    assert list(nlu.stream_response("when do you open")) == ["Our branches ", "open at ", "nine."]
+    # The next ask is one piece from the cache, without calling an LLM
+    llm["gpt"] = tokens(fail_after=0)
+    assert list(nlu.stream_response("when do you open")) == ["Our branches open at nine."]
+
+
+def test_gpt_failing_before_first_token_falls_back_to_ollama(llm):
+    llm["gpt"] = tokens(fail_after=0)
+    llm["ollama"] = tokens("Local ", "answer.")
+    assert list(nlu.stream_response("when do you open")) == ["Local ", "answer."]
+    assert nlu.response_cache.get("when do you open") == ("Local answer.", "ollama")
+
+
+def test_stream_cut_off_midway_ends_the_reply_uncached(llm):
+    llm["gpt"] = tokens("Our branches ", "open at ", fail_after=2)
+    llm["ollama"] = tokens("Never ", "used.")
+    # The caller already heard the beginning: no second answer from Ollama
+    assert list(nlu.stream_response("when do you open")) == ["Our branches ", "open at "]
+    assert nlu.response_cache.get("when do you open") is None
+
+
+def test_no_llm_answer_falls_back_to_rules(llm):
+    llm["gpt"] = tokens(fail_after=0)
+    llm["ollama"] = tokens()
+    reply = list(nlu.stream_response("when do you open"))
+    assert len(reply) == 1 and reply[0]
+
+
+def test_turn_recorded_unless_cancelled(llm):
+    manager = nlu.session_manager
+    session_id = manager.load(None).session_id
+    llm["gpt"] = tokens("Hello ", "there.")
+    assert "".join(nlu.stream_response("hi", session_id=session_id)) == "Hello there."
+    assert manager.load(session_id).turns == [["hi", "Hello there."]]
+
+    cancel = threading.Event()
+    llm["gpt"] = tokens("A long ", "answer ", "nobody hears.")
+    stream = nlu.stream_response("tell me more", cancel, session_id)
+    assert next(stream) == "A long "
+    cancel.set()
+    assert list(stream) == []
+    assert len(manager.load(session_id).turns) == 1
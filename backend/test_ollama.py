@@ -0,0 +1,113 @@
+"""
+Tests for the pooled Ollama client against a local stand-in Ollama server
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.services.ollama import OllamaClient
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+    models = ["mistral:latest", "phi3:latest"]
+    log = []
+    connections = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        FakeOllama.connections.add(self.client_address)
+        FakeOllama.log.append(("GET", self.path, None))
+        if self.path == "/api/tags":
+            self._send(200, json.dumps({"models": [{"name": m} for m in FakeOllama.models]}))
+        else:
+            self._send(404, "{}")
+
+    def do_POST(self):
+        FakeOllama.connections.add(self.client_address)
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeOllama.log.append(("POST", self.path, payload))
+        if payload["model"] not in FakeOllama.models:
+            self._send(404, json.dumps({"error": "model not found"}))
+        elif payload["stream"]:
+            lines = [{"message": {"content": t}, "done": False} for t in ("Hel", "lo", "!")]
+            lines.append({"message": {"content": ""}, "done": True})
+            self._send(200, "".join(json.dumps(line) + "\n" for line in lines), "application/x-ndjson")
+        else:
+            self._send(200, json.dumps({"message": {"content": f"reply from {payload['model']}"}}))
+
+
+@pytest.fixture
+def server():
+    FakeOllama.log = []
+    FakeOllama.connections = set()
+    FakeOllama.models = ["mistral:latest", "phi3:latest"]
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_discovers_models_once_and_reuses_connection(server):
+    client = OllamaClient(base_url=server, preferred_models=["llama3", "mistral"], keep_alive="5m")
+    assert client.chat(MESSAGES) == "reply from mistral:latest"
+    assert client.chat(MESSAGES) == "reply from mistral:latest"
+
+    methods = [(method, path) for method, path, _ in FakeOllama.log]
+    assert methods == [("GET", "/api/tags"), ("POST", "/api/chat"), ("POST", "/api/chat")]
+    assert len(FakeOllama.connections) == 1
+    assert FakeOllama.log[1][2]["keep_alive"] == "5m"
+
+
+def test_falls_back_to_any_installed_model(server):
+    client = OllamaClient(base_url=server, preferred_models=["llama3"])
+    assert client.pick_model() == "mistral:latest"
+
+
+def test_streams_tokens(server):
+    client = OllamaClient(base_url=server, preferred_models=["phi3"])
+    assert list(client.chat_stream(MESSAGES)) == ["Hel", "lo", "!"]
+    assert FakeOllama.log[-1][2]["stream"] is True
+
+
+def test_spent_budget_skips_the_call(server):
+    client = OllamaClient(base_url=server, preferred_models=["mistral"])
+    # time_left() is 0.0 once the request's deadline is spent
+    assert client.chat(MESSAGES, timeout=0.0) is None
+    assert list(client.chat_stream(MESSAGES, timeout=0.0)) == []
+    assert FakeOllama.log == []
+
+
+def test_removed_model_triggers_rediscovery(server):
+    client = OllamaClient(base_url=server, preferred_models=["mistral"])
+    assert client.chat(MESSAGES) == "reply from mistral:latest"
+    FakeOllama.models = ["phi3:latest"]
+    assert client.chat(MESSAGES) is None
+    assert client.chat(MESSAGES) == "reply from phi3:latest"
+
+
+def test_down_server_is_cached():
+    client = OllamaClient(base_url="http://127.0.0.1:9", health_ttl=60)
+    assert client.chat(MESSAGES) is None
+    assert client._healthy is False
+    checked = client._health_checked
+    assert list(client.chat_stream(MESSAGES)) == []
+    assert client._health_checked == checked
@@ -0,0 +1,107 @@
+"""
+Tests for the lazy provider registry and the shared clients
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from backend.services.providers import ProviderRegistry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_provider_is_built_once_on_first_use():
+    registry = ProviderRegistry()
+    built = []
+
+    def factory():
+        time.sleep(0.05)
+        built.append(object())
+        return built[-1]
+
+    registry.register("slow", factory)
+    assert not registry.loaded("slow")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("slow"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert all(result is built[0] for result in results)
+    assert registry.loaded("slow")
+    assert registry.stats()["loaded"]["slow"] >= 50
+
+
+def test_failed_factory_is_retried():
+    registry = ProviderRegistry()
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ImportError("SDK not installed")
+        return "client"
+
+    registry.register("flaky", factory)
+    with pytest.raises(ImportError):
+        registry.get("flaky")
+    assert registry.get("flaky") == "client"
+    assert registry.stats()["failures"] == {"flaky": 1}
+    with pytest.raises(KeyError):
+        registry.get("missing")
+
+
+def test_warm_skips_unconfigured_providers():
+    registry = ProviderRegistry()
+    registry.register("local", lambda: "local")
+    registry.register("cloud", lambda: "cloud", configured=lambda: None)
+    registry.register("broken", lambda: 1 / 0)
+    assert registry.warm() == {"local": True, "broken": False}
+    assert not registry.loaded("cloud")
+    assert registry.stats()["configured"] == ["broken", "local"]
+
+
+def test_close_closes_clients_and_reset_rebuilds():
+    registry = ProviderRegistry()
+
+    class Client:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    registry.register("http", Client)
+    first = registry.get("http")
+    registry.reset("http")
+    second = registry.get("http")
+    assert second is not first
+    registry.close()
+    assert second.closed and not registry.loaded("http")
+
+
+def test_services_import_without_sdks_or_api_key(tmp_path):
+    # The services import without building any client or importing the
+    # vendor SDKs, and one OpenAI client then serves STT, NLU and TTS
+    script = (
+        "import json, sys\n"
+        "import backend.services.stt as stt, backend.services.nlu as nlu, backend.services.tts as tts\n"
+        "heavy = [m for m in ('openai', 'gtts', 'speech_recognition') if m in sys.modules]\n"
+        "import os; os.environ['OPENAI_API_KEY'] = 'sk-test'\n"
+        "shared = stt.openai_client() is nlu.openai_client() is tts.openai_client()\n"
+        "print(json.dumps({'heavy': heavy, 'shared': shared}))\n"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    env.update(PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "backend")]),
+               DATABASE_URL="sqlite:///" + str(tmp_path / "test.db"))
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report == {"heavy": [], "shared": True}
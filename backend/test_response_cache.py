@@ -0,0 +1,54 @@
+"""
+Tests for the normalized-query reply cache in front of generate_response
+"""
+
+import time
+
+from backend.services.response_cache import ResponseCache, normalize_query
+
+
+def test_key_ignores_case_punctuation_and_fillers():
+    assert normalize_query("Um, what are your   Operating hours?") == "what are your operating hours"
+    assert normalize_query("What's my balance") == "whats my balance"
+
+
+def test_hit_for_equivalent_wording():
+    cache = ResponseCache({"faq": 60})
+    assert cache.put("What are your hours?", "24/7", "faq")
+    assert cache.get("uh what are your hours") == ("24/7", "faq")
+    assert cache.stats()["hits_by_source"] == {"faq": 1}
+
+
+def test_sources_without_ttl_are_never_cached():
+    cache = ResponseCache({"faq": 60, "account": 0})
+    assert not cache.put("my balance", "You have $5", "account")
+    assert not cache.put("hi", "echo hi", "echo")
+    assert cache.get("my balance") is None
+
+
+def test_entries_expire_per_source():
+    cache = ResponseCache({"gpt": 0.05, "rules": 60})
+    cache.put("tell me a joke", "no", "gpt")
+    cache.put("hello", "Hello!", "rules")
+    time.sleep(0.1)
+    assert cache.get("tell me a joke") is None
+    assert cache.get("hello") == ("Hello!", "rules")
+
+
+def test_version_change_invalidates_entries():
+    version = [1]
+    cache = ResponseCache({"faq": 60}, validators={"faq": lambda: version[0]})
+    cache.put("hours", "24/7", "faq")
+    version[0] = 2
+    assert cache.get("hours") is None
+
+
+def test_lru_bound():
+    cache = ResponseCache({"rules": 60}, max_entries=2)
+    cache.put("a", "1", "rules")
+    cache.put("b", "2", "rules")
+    cache.get("a")
+    cache.put("c", "3", "rules")
+    assert cache.get("b") is None
+    assert cache.get("a") == ("1", "rules")
+    assert cache.stats()["evictions"] == 1
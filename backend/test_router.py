@@ -0,0 +1,97 @@
+"""
+Tests for latency- and health-aware provider routing
+"""
+
+import contextvars
+import time
+
+import pytest
+
+from backend.services.deadline import start_deadline, time_left
+from backend.services.router import ProviderRouter, CLOSED, OPEN
+
+
+def test_fastest_healthy_provider_first():
+    router = ProviderRouter("tts")
+    router.record("azure", True, 0.9)
+    router.record("gtts", True, 0.2)
+    # untried providers keep preference order ahead of measured ones
+    assert router.order(["azure", "google", "gtts"]) == ["google", "gtts", "azure"]
+
+
+def test_repeated_failures_open_circuit_and_skip_provider():
+    router = ProviderRouter("stt", failure_threshold=3, cooldown_s=60)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            router.call("whisper", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    assert router.snapshot()["whisper"]["state"] == OPEN
+    assert router.order(["whisper", "google"]) == ["google"]
+    # everything open: keep trying in preference order rather than nothing
+    for _ in range(3):
+        router.record("google", False)
+    assert router.order(["whisper", "google"]) == ["whisper", "google"]
+
+
+def test_half_open_allows_one_live_trial_then_closes():
+    router = ProviderRouter("tts", failure_threshold=1, cooldown_s=0)
+    router.record("openai", False)
+    assert router.order(["openai", "gtts"])[0] == "openai"
+    router.record("openai", True, 0.1)
+    assert router.snapshot()["openai"]["state"] == CLOSED
+
+
+def test_falsy_result_counts_as_failure_unless_allowed():
+    router = ProviderRouter("tts", failure_threshold=1)
+    router.call("gtts", lambda: None)
+    assert router.snapshot()["gtts"]["state"] == OPEN
+    router.call("whisper", lambda: "", require_result=False)
+    assert router.snapshot()["whisper"]["state"] == CLOSED
+
+
+def test_background_probe_recovers_open_circuit():
+    router = ProviderRouter("tts", failure_threshold=1, cooldown_s=0)
+    healthy = {"ok": False}
+    router.register_probe("azure", lambda: healthy["ok"])
+    router.record("azure", False)
+    router.probe_due()
+    assert router.snapshot()["azure"]["state"] == OPEN
+    # probed providers are never handed live trial traffic
+    assert router.order(["azure", "gtts"]) == ["gtts"]
+    healthy["ok"] = True
+    router.probe_due()
+    assert router.snapshot()["azure"]["state"] == CLOSED
+
+
+def test_short_deadline_timeouts_never_open_a_circuit():
+    router = ProviderRouter("stt", failure_threshold=3)
+
+    def whisper(audio):
+        # Told to give up when the request's budget is spent, as the real
+        # provider calls are, and it was
+        timeout = time_left("stt", 30)
+        raise TimeoutError(f"timed out after {timeout:.1f}s")
+
+    def request():
+        deadline = start_deadline("process-audio", requested_ms=1)
+        deadline.expires_at = time.monotonic()
+        with pytest.raises(TimeoutError):
+            router.call("whisper", whisper, b"audio")
+        # TTS backends report their failures as None
+        router.call("gtts", lambda text: None, "hello")
+
+    for _ in range(5):
+        contextvars.Context().run(request)
+    snapshot = router.snapshot()
+    assert "whisper" not in snapshot or snapshot["whisper"]["failures"] == 0
+    assert "gtts" not in snapshot or snapshot["gtts"]["failures"] == 0
+    assert router.order(["whisper", "gtts"]) == ["whisper", "gtts"]
+
+    # With time left the same failure is the provider's fault
+    def with_time_left():
+        start_deadline("process-audio", requested_ms=60000)
+        with pytest.raises(TimeoutError):
+            router.call("whisper", whisper, b"audio")
+
+    for _ in range(3):
+        contextvars.Context().run(with_time_left)
+    assert router.snapshot()["whisper"]["state"] == OPEN
@@ -0,0 +1,64 @@
+"""
+Tests for cutting streamed LLM tokens into sentences
+"""
+
+from backend.services.sentences import SentenceSplitter, split_sentences
+
+
+def tokens(text):
+    # Mimic an LLM stream: short pieces that split words and punctuation
+    return [text[i:i + 3] for i in range(0, len(text), 3)]
+
+
+def test_sentences_are_emitted_as_soon_as_they_end():
+    splitter = SentenceSplitter(min_chars=5)
+    assert splitter.feed("Your balance is ready. Here it") == ["Your balance is ready."]
+    assert splitter.feed(" is!") == []          # no whitespace after "!" yet
+    assert splitter.feed(" More") == ["Here it is!"]
+    assert splitter.flush() == ["More"]
+
+
+def test_abbreviations_and_decimals_do_not_split():
+    text = "Dr. Smith charges $5.25 per visit, e.g. on Mondays at 9 a.m. daily. Call us."
+    assert list(split_sentences(tokens(text), min_chars=5)) == [
+        "Dr. Smith charges $5.25 per visit, e.g. on Mondays at 9 a.m. daily.",
+        "Call us.",
+    ]
+
+
+def test_short_sentences_are_joined():
+    assert list(split_sentences(tokens("Sure. I can help with that today. Ok"))) == [
+        "Sure. I can help with that today.",
+        "Ok",
+    ]
+
+
+def test_long_sentence_is_cut_at_a_pause():
+    text = "one two three, " * 30 + "end."
+    pieces = list(split_sentences(tokens(text), max_chars=100))
+    assert all(len(p) <= 100 for p in pieces)
+    assert " ".join(pieces).split() == text.split()
+
+
+def test_words_that_only_sometimes_abbreviate():
+    text = ("The answer is no. Your card stays active. Pick option B. It costs nothing. Press C. Thanks. "
+            "Ask for No. 5 on St. Louis Ave from J. R. Smith today. Done.")
+    assert list(split_sentences(tokens(text), min_chars=5)) == [
+        "The answer is no.",
+        "Your card stays active.",
+        "Pick option B.",
+        "It costs nothing.",
+        "Press C.",
+        "Thanks.",
+        "Ask for No. 5 on St. Louis Ave from J. R. Smith today.",
+        "Done.",
+    ]
+
+
+def test_waits_for_the_next_word_to_decide():
+    splitter = SentenceSplitter(min_chars=5)
+    assert splitter.feed("The answer is no. ") == []    # "No. 5" or the end of a sentence?
+    assert splitter.feed("Yo") == ["The answer is no."]
+    assert splitter.feed("ur card is ready. Ask J. ") == ["Your card is ready."]
+    assert splitter.feed("Smi") == []                    # a name, or "It"?
+    assert splitter.feed("th now. ") == ["Ask J. Smith now."]
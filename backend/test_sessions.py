@@ -0,0 +1,65 @@
+"""
+Tests for per-session conversation state and its bounded LLM history
+"""
+
+import time
+
+from backend.services.sessions import (
+    ConversationState, MemorySessionStore, SessionManager, SQLiteSessionStore, estimate_tokens
+)
+
+
+def test_history_keeps_newest_turns_within_budget():
+    state = ConversationState("s1")
+    for i in range(10):
+        state.add_turn(f"question number {i} " + "word " * 20, f"answer {i} " + "word " * 20)
+    messages = state.history(budget_tokens=100)
+    turns = [m for m in messages if m["role"] != "system"]
+    assert turns[-1]["content"].startswith("answer 9")
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 100
+    # Turns that did not fit are summarized in a leading note
+    assert messages[0]["role"] == "system"
+    assert "question number 8" in messages[0]["content"]
+
+
+def test_old_turns_fold_into_a_bounded_summary():
+    state = ConversationState("s1")
+    for i in range(30):
+        state.add_turn(f"question {i}", f"answer {i}", max_turns=5, max_summary_chars=60)
+    assert len(state.turns) == 5
+    assert len(state.summary) <= 60
+    assert state.summary.endswith("question 24")
+
+
+def test_cached_account_expires():
+    state = ConversationState("s1")
+    assert state.cached_account(60) is None
+    state.remember_account({"username": "ann"}, "Hi Ann, your balance is $5.")
+    assert state.cached_account(60) == ({"username": "ann"}, "Hi Ann, your balance is $5.")
+    state.account_at -= 120
+    assert state.cached_account(60) is None
+
+
+def test_memory_store_lru_and_ttl():
+    store = MemorySessionStore(max_sessions=2, ttl_s=60)
+    for sid in ("a", "b", "c"):
+        store.save(ConversationState(sid))
+    assert store.get("a") is None and store.stats()["evictions"] == 1
+    store.get("b").last_seen = time.time() - 120
+    assert store.get("b") is None
+    assert store.get("c") is not None
+
+
+def test_manager_records_turns_and_reports_usage(tmp_path):
+    for store in (MemorySessionStore(), SQLiteSessionStore(str(tmp_path / "sessions.db"))):
+        manager = SessionManager(store, context_tokens=200)
+        state = manager.load(None)
+        manager.record_turn(state, "what are your hours", "9 to 5")
+        again = manager.load(state.session_id)
+        assert again.turns == [["what are your hours", "9 to 5"]]
+        assert [m["role"] for m in manager.history(again)] == ["user", "assistant"]
+        usage = manager.usage()
+        assert usage["sessions"] == 1
+        assert usage["max_bytes"] == usage["total_bytes"] > 0
+        # Session ids would let anyone read another caller's conversation
+        assert state.session_id not in repr(usage)
@@ -0,0 +1,139 @@
+"""
+Tests for the audio normalization ahead of STT
+"""
+
+import io
+import wave
+
+import numpy as np
+
+from backend.services.transcode import (
+    TARGET_RATE, Transcoder, decode_to_pcm, is_normalized_wav, resample
+)
+
+
+def wav_bytes(samples, rate, channels=1, width=2):
+    """WAV of float samples in [-1, 1], shape (n,) or (n, channels)."""
+    scale = {1: 127, 2: 32767, 4: 2147483647}[width]
+    ints = np.round(np.asarray(samples) * scale)
+    if width == 1:
+        raw = (ints + 128).astype(np.uint8).tobytes()
+    else:
+        raw = ints.astype({2: "<i2", 4: "<i4"}[width]).tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        wav.writeframes(raw)
+    return buffer.getvalue()
+
+
+def tone(frequency, rate, seconds=1.0, amplitude=0.5):
+    t = np.arange(int(rate * seconds)) / rate
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+def voiced(frequency, rate, seconds=1.0):
+    """A tone with a syllable-rate envelope: steady tones look like noise to the VAD."""
+    t = np.arange(int(rate * seconds)) / rate
+    return tone(frequency, rate, seconds) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+
+
+def peak_frequency(pcm: bytes, rate: int = TARGET_RATE) -> float:
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    spectrum = np.abs(np.fft.rfft(samples))
+    return float(np.fft.rfftfreq(len(samples), 1 / rate)[np.argmax(spectrum)])
+
+
+def test_resample_keeps_duration_and_pitch():
+    samples = tone(440, 48000).astype(np.float32)
+    out = resample(samples, 48000)
+    assert len(out) == TARGET_RATE
+    pcm = (out * 32767).astype("<i2").tobytes()
+    assert abs(peak_frequency(pcm) - 440) <= 1
+
+
+def test_resample_filters_what_would_alias():
+    # 11 kHz is above the 8 kHz Nyquist frequency of the output
+    samples = (tone(440, 48000) + tone(11000, 48000)).astype(np.float32)
+    out = resample(samples, 48000)
+    spectrum = np.abs(np.fft.rfft(out))
+    freqs = np.fft.rfftfreq(len(out), 1 / TARGET_RATE)
+    at = lambda f: spectrum[np.argmin(np.abs(freqs - f))]
+    assert at(16000 - 11000) < at(440) / 20
+
+
+def test_decode_stereo_48k_wav_to_16k_mono():
+    left, right = tone(440, 48000), tone(440, 48000)
+    data = wav_bytes(np.stack([left, right], axis=1), 48000, channels=2)
+    pcm = decode_to_pcm(data, "wav")
+    assert len(pcm) == 2 * TARGET_RATE
+    assert abs(peak_frequency(pcm) - 440) <= 1
+
+
+def test_decode_other_sample_widths():
+    for width in (1, 4):
+        pcm = decode_to_pcm(wav_bytes(tone(440, 22050), 22050, width=width), "wav")
+        assert abs(len(pcm) - 2 * TARGET_RATE) <= 2
+        assert abs(peak_frequency(pcm) - 440) <= 1
+
+
+def test_is_normalized_wav():
+    assert is_normalized_wav(wav_bytes(tone(440, TARGET_RATE), TARGET_RATE))
+    assert not is_normalized_wav(wav_bytes(tone(440, 48000), 48000))
+    assert not is_normalized_wav(b"\x1aE\xdf\xa3 not a wav")
+
+
+def test_already_normalized_upload_is_passed_through():
+    transcoder = Transcoder(workers=1)
+    upload = io.BytesIO(wav_bytes(voiced(440, TARGET_RATE), TARGET_RATE))
+    assert transcoder.normalize_stream(upload, "wav") is None
+    assert transcoder.stats()["passthrough"] == 1
+    assert transcoder._executor is None
+
+
+def test_normalized_upload_is_still_trimmed():
+    transcoder = Transcoder(workers=1)
+    silence = np.zeros(TARGET_RATE)
+    clip = np.concatenate([silence, tone(440, TARGET_RATE), silence])
+    normalized = transcoder.normalize_stream(io.BytesIO(wav_bytes(clip, TARGET_RATE)), "wav")
+    assert normalized.duration_ms == 3000
+    assert 1000 <= normalized.speech_ms < 1500
+    assert transcoder._executor is None
+
+
+def test_silent_upload_has_no_audio_to_send():
+    transcoder = Transcoder(workers=1)
+    normalized = transcoder.normalize_stream(io.BytesIO(wav_bytes(np.zeros(TARGET_RATE), TARGET_RATE)), "wav")
+    assert normalized.audio == {} and normalized.speech_ms == 0
+
+
+def test_disabled_transcoder_keeps_the_original():
+    transcoder = Transcoder(enabled=False)
+    assert transcoder.normalize_stream(io.BytesIO(wav_bytes(tone(440, 48000), 48000)), "wav") is None
+
+
+def test_pool_normalizes_wav():
+    transcoder = Transcoder(workers=1)
+    try:
+        upload = io.BytesIO(wav_bytes(np.stack([voiced(440, 48000)] * 2, axis=1), 48000, channels=2))
+        normalized = transcoder.normalize_stream(upload, "wav")
+        assert set(normalized.audio) == {"wav"}
+        assert normalized.speech_ms == normalized.duration_ms == 1000
+        with wave.open(io.BytesIO(normalized.audio["wav"]), "rb") as wav:
+            assert (wav.getframerate(), wav.getnchannels(), wav.getnframes()) == (TARGET_RATE, 1, TARGET_RATE)
+        assert upload.tell() == 0
+        stats = transcoder.stats()
+        assert stats["jobs"] == 1 and stats["size_ratio"] < 0.2
+    finally:
+        transcoder.shutdown()
+
+
+def test_undecodable_upload_falls_back_to_the_original():
+    transcoder = Transcoder(workers=1)
+    try:
+        assert transcoder.normalize_stream(io.BytesIO(b"RIFF garbage"), "wav") is None
+        assert transcoder.stats()["failures"] == 1
+    finally:
+        transcoder.shutdown()
@@ -0,0 +1,91 @@
+"""
+Tests for the TTS audio cache
+"""
+
+import os
+import threading
+import time
+
+from backend.services.tts_cache import TTSCache, cache_key
+
+
+def fake_synth(calls, payload=b"x" * 100, delay=0.0):
+    def synthesize(text, file_path):
+        calls.append(text)
+        time.sleep(delay)
+        with open(file_path, "wb") as f:
+            f.write(payload)
+        return file_path
+    return synthesize
+
+
+def test_key_ignores_whitespace_but_not_voice():
+    assert cache_key("Hello  there ", "gtts", "en", "mp3") == cache_key("Hello there", "gtts", "en", "mp3")
+    assert cache_key("Hello", "openai", "alloy", "mp3") != cache_key("Hello", "openai", "nova", "mp3")
+
+
+def test_second_request_is_a_hit(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10_000)
+    calls = []
+    first = cache.fetch("Hello", "gtts", "en", "mp3", fake_synth(calls))
+    second = cache.fetch("Hello", "gtts", "en", "mp3", fake_synth(calls))
+    assert first == second and os.path.exists(first)
+    assert calls == ["Hello"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_respects_size_cap(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=250)
+    calls = []
+    a = cache.fetch("a", "gtts", "en", "mp3", fake_synth(calls))
+    cache.fetch("b", "gtts", "en", "mp3", fake_synth(calls))
+    cache.fetch("a", "gtts", "en", "mp3", fake_synth(calls))  # a is now most recent
+    cache.fetch("c", "gtts", "en", "mp3", fake_synth(calls))
+    assert os.path.exists(a)
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+    cache.fetch("b", "gtts", "en", "mp3", fake_synth(calls))
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_failed_synthesis_leaves_no_files(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10_000)
+    assert cache.fetch("Hello", "azure", "jenny", "mp3", lambda text, path: None) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_misses_synthesize_once(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10_000)
+    calls, results = [], []
+    synth = fake_synth(calls, delay=0.05)
+    threads = [threading.Thread(target=lambda: results.append(cache.fetch("Hi", "gtts", "en", "mp3", synth)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["Hi"]
+    assert len(set(results)) == 1
+
+
+def test_existing_clips_are_reloaded(tmp_path):
+    calls = []
+    TTSCache(str(tmp_path), max_bytes=10_000).fetch("Hello", "gtts", "en", "mp3", fake_synth(calls))
+    cache = TTSCache(str(tmp_path), max_bytes=10_000)
+    cache.fetch("Hello", "gtts", "en", "mp3", fake_synth(calls))
+    assert calls == ["Hello"]
+
+
+def test_tee_stores_only_complete_streams(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10_000)
+    assert cache.lookup("Hi", "openai", "alloy", "mp3") is None
+
+    stream = cache.tee("Hi", "openai", "alloy", "mp3", iter([b"ab", b"cd"]))
+    next(stream)
+    stream.close()
+    assert cache.lookup("Hi", "openai", "alloy", "mp3") is None
+    assert os.listdir(tmp_path) == []
+
+    assert b"".join(cache.tee("Hi", "openai", "alloy", "mp3", iter([b"ab", b"cd"]))) == b"abcd"
+    path = cache.lookup("Hi", "openai", "alloy", "mp3")
+    with open(path, "rb") as f:
+        assert f.read() == b"abcd"
@@ -0,0 +1,93 @@
+"""
+Tests for the silence trimming ahead of STT
+"""
+
+import time
+
+import numpy as np
+
+from backend.services.vad import VoiceActivityDetector
+
+RATE = 16000
+
+
+def noise(seconds, level=30, seed=0):
+    return np.random.default_rng(seed).normal(0, level, int(RATE * seconds))
+
+
+def speech(seconds, level=8000):
+    t = np.arange(int(RATE * seconds)) / RATE
+    # A voiced tone with a syllable-rate envelope
+    return level * np.sin(2 * np.pi * 200 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+
+
+def pcm(*parts):
+    return np.concatenate(parts).astype("<i2").tobytes()
+
+
+def test_trims_leading_and_trailing_silence():
+    detector = VoiceActivityDetector(pad_ms=100)
+    start, end = detector.find_speech(pcm(noise(3), speech(2), noise(3, seed=1)), RATE)
+    # Speech runs from byte 96000 to 160000; the pad adds 3200 either side
+    assert 96000 - 3200 <= start <= 96000
+    assert 160000 <= end <= 160000 + 3200
+
+
+def test_rejects_clips_without_speech():
+    detector = VoiceActivityDetector()
+    assert detector.find_speech(pcm(noise(5)), RATE) is None
+    assert detector.find_speech(pcm(np.zeros(RATE)), RATE) is None
+    assert detector.find_speech(b"", RATE) is None
+
+
+def test_room_noise_is_not_speech():
+    # Stationary noise from -45 to -35 dBFS (a room, a laptop mic) has no
+    # frame far above its own floor
+    detector = VoiceActivityDetector()
+    for level in (185, 330, 580):
+        assert detector.find_speech(pcm(noise(5, level=level)), RATE) is None
+
+
+def test_short_clicks_are_not_speech():
+    detector = VoiceActivityDetector(min_speech_ms=100)
+    click = np.full(RATE // 100, 20000.0)  # 10 ms
+    assert detector.find_speech(pcm(noise(1), click, noise(1, seed=1)), RATE) is None
+
+
+def test_clip_that_is_all_speech_is_kept_whole():
+    detector = VoiceActivityDetector()
+    data = pcm(speech(2))
+    assert detector.find_speech(data, RATE) == (0, len(data))
+
+
+def test_quiet_speech_over_background_noise():
+    detector = VoiceActivityDetector(pad_ms=0)
+    start, end = detector.find_speech(pcm(noise(2, level=300), speech(1, level=3000) + noise(1, level=300),
+                                          noise(2, level=300, seed=1)), RATE)
+    assert abs(start - 2 * RATE * 2) <= 640 * 5
+    assert abs(end - 3 * RATE * 2) <= 640 * 5
+
+
+def test_disabled_detector_keeps_everything():
+    detector = VoiceActivityDetector(enabled=False)
+    data = pcm(noise(1))
+    assert detector.find_speech(data, RATE) == (0, len(data))
+
+
+def test_stats():
+    detector = VoiceActivityDetector()
+    detector.record(10000, 4000, 0.5)
+    detector.record(2000, 0, 0.1)
+    stats = detector.stats()
+    assert (stats["clips"], stats["rejected"]) == (2, 1)
+    assert stats["trimmed_s"] == 8.0 and stats["trimmed_ratio"] == round(1 - 4000 / 12000, 3)
+
+
+def test_ten_seconds_take_well_under_five_ms():
+    detector = VoiceActivityDetector()
+    data = pcm(noise(4), speech(2), noise(4, seed=1))
+    detector.find_speech(data, RATE)
+    start = time.perf_counter()
+    for _ in range(20):
+        detector.find_speech(data, RATE)
+    assert (time.perf_counter() - start) / 20 < 0.005
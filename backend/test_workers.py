@@ -0,0 +1,98 @@
+"""
+Tests for the bounded stage pools and their admission control
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.workers import StageOverloaded, StagePool
+
+
+@pytest.fixture
+def pool():
+    pool = StagePool("test", max_workers=2, max_queue=3)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+def test_full_stage_rejects_with_retry_after(pool):
+    release = threading.Event()
+
+    async def run():
+        futures = [pool.submit(release.wait, 5) for _ in range(pool.max_workers + pool.max_queue)]
+        with pytest.raises(StageOverloaded) as excinfo:
+            pool.submit(release.wait, 5)
+        stats = pool.stats()
+        release.set()
+        await asyncio.gather(*futures)
+        return excinfo.value, stats
+
+    error, stats = asyncio.run(run())
+    assert error.stage == "test"
+    # Nothing has completed yet: 1 s per call, 5 calls over 2 workers
+    assert error.retry_after == 3
+    assert (stats["active"], stats["waiting"], stats["rejected"]) == (2, 3, 1)
+    # Once drained the stage accepts work again
+    assert asyncio.run(pool.run(sum, [1, 2])) == 3
+    assert pool.stats()["waiting"] == 0 and pool.stats()["active"] == 0
+
+
+def test_retry_after_follows_observed_run_time():
+    pool = StagePool("timed", max_workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def run():
+        await pool.run(time.sleep, 0.6)
+        futures = [pool.submit(release.wait, 5) for _ in range(3)]
+        with pytest.raises(StageOverloaded) as excinfo:
+            pool.submit(release.wait, 5)
+        release.set()
+        await asyncio.gather(*futures)
+        return excinfo.value
+
+    try:
+        error = asyncio.run(run())
+    finally:
+        pool.shutdown(wait=False)
+    # 0.6 s per call (not the 1 s guess before any call finished), 3 calls
+    # ahead on 1 worker: ceil(1.8)
+    assert error.retry_after == 2
+
+
+def test_cancelled_queued_calls_give_their_slot_back(pool):
+    release = threading.Event()
+
+    async def run():
+        running = [pool.submit(release.wait, 5) for _ in range(pool.max_workers)]
+        queued = [pool.submit(release.wait, 5) for _ in range(pool.max_queue)]
+        # The callers stop waiting (e.g. the deadline passed) before a worker is free
+        for future in queued:
+            future.cancel()
+        await asyncio.sleep(0.05)
+        waiting = pool.stats()["waiting"]
+        release.set()
+        await asyncio.gather(*running)
+        return waiting
+
+    assert asyncio.run(run()) == 0
+    assert pool.stats()["waiting"] == 0
+
+
+def test_submit_after_shutdown_does_not_leak_a_slot():
+    pool = StagePool("closed", max_workers=1, max_queue=0)
+    pool.shutdown()
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                pool.submit(sum, [1])
+    asyncio.run(run())
+    assert pool.stats()["waiting"] == 0
+    # Outside an event loop the slot is given back too
+    no_loop = StagePool("no-loop", max_workers=1, max_queue=0)
+    with pytest.raises(RuntimeError):
+        no_loop.submit(sum, [1])
+    assert no_loop.stats()["waiting"] == 0
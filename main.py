@@ -1,17 +1,91 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from backend.services.stt import transcribe_audio
-from backend.services.tts import text_to_speech
-from backend.services.nlu import generate_response  
-from database import SessionLocal, Interaction
-import shutil
+from backend.services.transcode import transcoder
+from backend.services.vad import vad
+from backend.services.tts import text_to_speech, text_to_speech_stream, audio_cache, audio_janitor
+from backend.services.audio_files import AudioStaticFiles
+from backend.services.nlu import (
+    FAQ_RETRIEVAL, RULE_REPLIES, fallback_response, generate_reply, record_reply, response_cache,
+    stream_response
+)
+from backend.services.sentences import split_sentences
+from backend.services.faq_vectors import get_faq_vectors
+from backend.services.faq_search import search_faqs
+from backend.services.hedging import llm_hedger
+from backend.services.intents import intent_router
+from backend.services.audio_io import UploadTooLarge, read_audio_upload, sniff_stream
+from backend.services.endpointing import Endpointer, pcm_to_wav
+from backend.services.deadline import (
+    DEADLINE_HEADER, DeadlineExceeded, current_deadline, deadline_stats, degrade, degraded,
+    start_deadline, within_deadline
+)
+from backend.services.latency_stats import latency_stats
+from backend.services.metrics import RequestTrace, start_trace
+from backend.services.interaction_log import interaction_writer
+from backend.services.listing import (
+    DEFAULT_PAGE_SIZE, content_etag, etag_matches, fetch_page, parse_fields, stream_ndjson
+)
+from backend.services.providers import providers
+from backend.services.router import prober, routing_state
+from backend.services.sessions import new_session_id, session_manager
+from backend.services.workers import (
+    StageOverloaded, stt_pool, nlu_pool, tts_pool, pool_stats, shutdown_pools
+)
+from database import SessionLocal, AsyncSessionLocal, async_engine, init_db, FAQ, Account
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
+import io
+import json
 import os
-import uuid
+import threading
 import time
 
-app = FastAPI(title="Voice Bot API")
+PROVIDERS_WARM = os.getenv("PROVIDERS_WARM", "true").lower() != "false"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(init_db)
+    # Only scans the interactions table once, for a database without rollups yet
+    await asyncio.to_thread(latency_stats.backfill)
+    if FAQ_RETRIEVAL != "bm25":
+        # Map (or build) the FAQ embedding matrix before the first question
+        await asyncio.to_thread(get_faq_vectors)
+    # Train the intent classifier (builds the FAQ index on the way)
+    await asyncio.to_thread(intent_router.warm)
+    # Start the audio transcoding processes before the first upload
+    await asyncio.to_thread(transcoder.start)
+    prober.start()
+    interaction_writer.start()
+    audio_janitor.start()
+    if PROVIDERS_WARM:
+        # Import the provider SDKs and open their clients without delaying startup
+        providers.start_warming()
+    yield
+    audio_janitor.stop()
+    prober.stop()
+    await asyncio.to_thread(interaction_writer.stop)
+    shutdown_pools(wait=False)
+    transcoder.shutdown()
+    providers.close()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+app = FastAPI(title="Voice Bot API", lifespan=lifespan)
+
+@app.exception_handler(StageOverloaded)
+async def stage_overloaded_handler(request: Request, exc: StageOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "stage": exc.stage},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 # Dependency
 def get_db():
@@ -21,6 +95,13 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Async session for endpoints that query the database directly"""
+    if AsyncSessionLocal is None:
+        raise HTTPException(status_code=500, detail="Async database driver not installed")
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # CORS Configuration
 origins = [
     "https://voice-bot-frontend.onrender.com",
@@ -34,178 +115,644 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-User-Text", "X-Bot-Response", "X-TTS-Provider", "X-Session-ID"],
 )
 
-# Mount static files for audio playback
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files for audio playback (content-hashed clips are served as immutable)
+app.mount("/static", AudioStaticFiles(directory="static"), name="static")
 
 @app.get("/")
 async def root():
     return {"message": "Voice Bot API is running"}
 
-@app.post("/api/process-audio")
-async def process_audio(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    start_time = time.time()
+def session_id_for(request, session_id: str = None) -> str:
+    """
+    The caller's session: `session_id` if given, else the X-Session-ID
+    header, else a new one (returned with the reply for the next turn).
+    """
+    return session_id or request.headers.get("X-Session-ID") or new_session_id()
+
+async def reply_to(user_text: str, session_id: str = None) -> str:
+    """
+    The NLU stage: the reply to `user_text`, or a canned one if it is not
+    ready within the deadline. The turn is recorded with whichever reply
+    the caller gets; a late reply still being generated is not.
+    """
+    session = None
+    try:
+        bot_response_text, session = await within_deadline(
+            "nlu", nlu_pool.run(generate_reply, user_text, session_id)
+        )
+    except DeadlineExceeded:
+        degrade("nlu", "reply not ready in time")
+        bot_response_text = fallback_response(user_text)
+    await asyncio.to_thread(record_reply, user_text, bot_response_text, session_id, session)
+    return bot_response_text
+
+async def respond_to(user_text: str, trace: RequestTrace, session_id: str = None) -> dict:
+    """
+    Runs NLU and TTS for one user turn, logs it and builds the API reply.
+    Neither stage is waited for past the request's deadline: a late reply
+    is replaced by a canned one, and late audio by none (text only).
+    """
+    # NLU & Response Generation (nothing to answer when no speech was heard)
+    if user_text.strip():
+        with trace.timed("nlu"):
+            bot_response_text = await reply_to(user_text, session_id)
+    else:
+        bot_response_text = RULE_REPLIES["timeout" if degraded("stt") else "no_speech"]
     
-    # Save uploaded file
-    temp_filename = f"temp_{uuid.uuid4()}.wav"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Text to Speech
+    with trace.timed("tts"):
+        try:
+            audio_path = await within_deadline("tts", tts_pool.run(text_to_speech, bot_response_text))
+        except DeadlineExceeded:
+            degrade("tts", "audio not ready in time")
+            audio_path = None
     
-    # DEBUG: Check file header
-    with open(temp_filename, "rb") as f:
-        header = f.read(16)
-        print(f"DEBUG: File header bytes: {header}")
-        if header.startswith(b'RIFF'):
-            print("DEBUG: Format is WAV (RIFF)")
-        elif header.startswith(b'\x1a\x45\xdf\xa3'):
-            print("DEBUG: Format is WebM/MKV")
-        else:
-            print(f"DEBUG: Unknown format: {header.hex()}")
+    # Return relative path for frontend to access
+    if audio_path:
+        audio_url = f"/static/audio/{os.path.basename(audio_path)}"
+    else:
+        audio_url = None
+    
+    # Log to DB (written in the background, off the request path)
+    duration_ms = trace.finish()
+    await interaction_writer.submit_async(dict(
+        user_text=user_text,
+        bot_response=bot_response_text,
+        response_time_ms=duration_ms,
+        **trace.interaction_fields()
+    ))
+    
+    deadline = current_deadline()
+    return {
+        "user_text": user_text,
+        "bot_response": bot_response_text,
+        "audio_url": audio_url,
+        "session_id": session_id,
+        "degraded": sorted(deadline.degraded) if deadline else []
+    }
+
+# The form is parsed by the handler (read_audio_upload), so it is only described here
+AUDIO_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+@app.post("/api/process-audio", openapi_extra=AUDIO_UPLOAD_BODY)
+async def process_audio(request: Request):
+    trace = start_trace("process-audio")
+    start_deadline("process-audio", request.headers.get(DEADLINE_HEADER))
+    session_id = session_id_for(request)
+    
+    # The upload is a SpooledTemporaryFile: it stays in memory up to
+    # AUDIO_SPOOL_MAX_BYTES and is handed to the STT providers directly
+    try:
+        file = await read_audio_upload(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    audio_format = sniff_stream(file.file)
+    print(f"DEBUG: Upload format: {audio_format or 'unknown'} ({file.content_type})")
 
     try:
         # 1. Speech to Text
-        user_text = transcribe_audio(temp_filename)
-        
-        # 2. NLU & Response Generation
-        bot_response_text = generate_response(user_text)
-        
-        # 3. Text to Speech
-        audio_path = text_to_speech(bot_response_text)
-        
-        # Return relative path for frontend to access
-        if audio_path:
-            audio_url = f"/static/audio/{os.path.basename(audio_path)}"
-        else:
-            audio_url = None
+        with trace.timed("stt"):
+            try:
+                user_text = await within_deadline(
+                    "stt", stt_pool.run(transcribe_audio, file.file, True, audio_format)
+                )
+            except DeadlineExceeded:
+                degrade("stt", "transcript not ready in time")
+                user_text = ""
         
-        # Log to DB
-        duration_ms = (time.time() - start_time) * 1000
-        interaction = Interaction(
-            user_text=user_text,
-            bot_response=bot_response_text,
-            response_time_ms=duration_ms
-        )
-        db.add(interaction)
-        db.commit()
-        
-        return {
-            "user_text": user_text,
-            "bot_response": bot_response_text,
-            "audio_url": audio_url
-        }
+        # 2. NLU, 3. Text to Speech
+        return await respond_to(user_text, trace, session_id)
+    except StageOverloaded:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"CRITICAL ERROR: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Cleanup temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        await file.close()
+
+STT_PARTIAL_INTERVAL_MS = int(os.getenv("STT_PARTIAL_INTERVAL_MS", "0"))
+
+def transcribe_pcm(pcm: bytes, sample_rate: int) -> str:
+    """Transcribe raw 16-bit mono PCM with the regular STT provider chain."""
+    return transcribe_audio(io.BytesIO(pcm_to_wav(pcm, sample_rate)), True, "wav")
+
+async def send_partial(websocket: WebSocket, pcm: bytes, sample_rate: int):
+    # Runs in its own task: a budget of its own, not the last utterance's
+    start_deadline("ws-partial")
+    try:
+        text = await stt_pool.run(transcribe_pcm, pcm, sample_rate)
+        await websocket.send_json({"type": "partial", "text": text})
+    except (StageOverloaded, WebSocketDisconnect):
+        pass  # partials are best effort
+    except Exception as e:
+        print(f"DEBUG: Partial transcription failed: {e}")
+
+async def run_ws_turn(websocket: WebSocket, pcm: bytes, sample_rate: int, session_id: str,
+                      requested_deadline_ms=None, previous: asyncio.Task = None):
+    """
+    STT -> NLU -> TTS for one utterance of a WebSocket conversation. Runs in
+    its own task so the connection keeps reading audio meanwhile. `previous`
+    is the turn before it: its reply goes out (and into the session) first.
+    """
+    trace = start_trace("ws-process-audio")
+    start_deadline("ws-process-audio", requested_deadline_ms)
+    try:
+        try:
+            with trace.timed("stt"):
+                try:
+                    user_text = await within_deadline(
+                        "stt", stt_pool.run(transcribe_pcm, pcm, sample_rate)
+                    )
+                except DeadlineExceeded:
+                    degrade("stt", "transcript not ready in time")
+                    user_text = ""
+            if previous is not None:
+                await asyncio.wait({previous})
+            await websocket.send_json({"type": "final", "text": user_text})
+            reply = await respond_to(user_text, trace, session_id)
+            await websocket.send_json({"type": "response", **reply})
+        except StageOverloaded as e:
+            await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+    except WebSocketDisconnect:
+        print("DEBUG: WebSocket client left before its reply was sent")
+    except Exception as e:
+        print(f"CRITICAL ERROR: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # the connection is gone too
+
+@app.websocket("/ws/process-audio")
+async def process_audio_stream(websocket: WebSocket):
+    """
+    Streaming speech input.
+    
+    The client sends raw 16-bit little-endian mono PCM as binary frames while
+    recording, optionally preceded by {"type": "start", "sample_rate": 16000,
+    "session_id": ..., "deadline_ms": ...}. Every utterance on the connection
+    belongs to one conversation session, and each gets the deadline budget
+    (from "deadline_ms", the X-Deadline-Ms handshake header, or the default).
+    The server detects end-of-utterance itself; the client may also force it
+    with {"type": "end"}. Server messages:
+      {"type": "speech_start"}
+      {"type": "partial", "text": ...}   (when STT_PARTIAL_INTERVAL_MS > 0)
+      {"type": "final", "text": ...}
+      {"type": "response", "user_text": ..., "bot_response": ..., "audio_url": ...,
+       "session_id": ..., "degraded": [...]}
+      {"type": "error", "detail": ...}
+    The connection stays open for further utterances.
+    """
+    await websocket.accept()
+    endpointer = Endpointer()
+    session_id = session_id_for(websocket, websocket.query_params.get("session_id"))
+    requested_deadline_ms = websocket.headers.get(DEADLINE_HEADER)
+    partial_task = None
+    last_partial = time.monotonic()
+    turns = set()
+    last_turn = None
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            force_end = False
+            if message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = None
+                if not isinstance(control, dict):
+                    await websocket.send_json({"type": "error", "detail": "Invalid control message"})
+                    continue
+                if control.get("type") == "start":
+                    try:
+                        endpointer = Endpointer(sample_rate=int(control.get("sample_rate", 16000)))
+                    except (TypeError, ValueError) as e:
+                        await websocket.send_json({"type": "error", "detail": f"Invalid sample_rate: {e}"})
+                        continue
+                    if isinstance(control.get("session_id"), str):
+                        session_id = control["session_id"] or session_id
+                    requested_deadline_ms = control.get("deadline_ms", requested_deadline_ms)
+                    continue
+                if control.get("type") != "end":
+                    continue
+                force_end = True
+                event = "end"
+            else:
+                event = endpointer.feed(message.get("bytes") or b"")
+            
+            if event == "speech_start":
+                last_partial = time.monotonic()
+                await websocket.send_json({"type": "speech_start"})
+            
+            if event != "end":
+                # Emit a partial transcript of the audio so far, one at a time
+                if (STT_PARTIAL_INTERVAL_MS and endpointer.in_speech
+                        and (partial_task is None or partial_task.done())
+                        and (time.monotonic() - last_partial) * 1000 >= STT_PARTIAL_INTERVAL_MS):
+                    last_partial = time.monotonic()
+                    partial_task = asyncio.create_task(
+                        send_partial(websocket, endpointer.snapshot(), endpointer.sample_rate)
+                    )
+                continue
+            
+            # End of utterance: start STT immediately, and keep reading audio
+            # while the turn runs
+            pcm = endpointer.take_utterance(force=force_end)
+            if partial_task is not None:
+                partial_task.cancel()
+                partial_task = None
+            if not pcm:
+                continue
+            last_turn = asyncio.create_task(run_ws_turn(
+                websocket, pcm, endpointer.sample_rate, session_id, requested_deadline_ms, last_turn
+            ))
+            turns.add(last_turn)
+            last_turn.add_done_callback(turns.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Nobody is left to send partials or replies to
+        if partial_task is not None:
+            partial_task.cancel()
+        for turn in turns:
+            turn.cancel()
 
 from pydantic import BaseModel
 
 class TextRequest(BaseModel):
     text: str
+    session_id: str = None
 
 @app.post("/api/process-text")
-async def process_text(request: TextRequest, db: Session = Depends(get_db)):
-    start_time = time.time()
+async def process_text(request: TextRequest, http_request: Request):
+    trace = start_trace("process-text")
+    start_deadline("process-text", http_request.headers.get(DEADLINE_HEADER))
+    
+    try:
+        return await respond_to(request.text, trace, session_id_for(http_request, request.session_id))
+    except StageOverloaded:
+        raise
+    except Exception as e:
+        print(f"CRITICAL ERROR: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/process-text/stream")
+async def process_text_stream(request: TextRequest, http_request: Request):
+    """
+    Same as /api/process-text, but the response body is the synthesized
+    audio itself, streamed as the TTS provider produces it. The transcript
+    and reply travel in URL-encoded X-User-Text / X-Bot-Response headers.
+    Falls back to the JSON reply without audio if every TTS provider fails,
+    or none starts producing audio within the request's deadline.
+    """
+    trace = start_trace("process-text-stream")
+    start_deadline("process-text-stream", http_request.headers.get(DEADLINE_HEADER))
     user_text = request.text
+    session_id = session_id_for(http_request, request.session_id)
     
     try:
-        # 1. NLU & Response Generation
-        bot_response_text = generate_response(user_text)
+        with trace.timed("nlu"):
+            bot_response_text = await reply_to(user_text, session_id)
+        with trace.timed("tts"):
+            try:
+                service_name, audio_chunks = await within_deadline(
+                    "tts", tts_pool.run(text_to_speech_stream, bot_response_text)
+                )
+            except DeadlineExceeded:
+                degrade("tts", "audio not ready in time")
+                service_name, audio_chunks = None, None
         
-        # 2. Text to Speech
-        audio_path = text_to_speech(bot_response_text)
-        
-        # Return relative path for frontend to access
-        if audio_path:
-            audio_url = f"/static/audio/{os.path.basename(audio_path)}"
-        else:
-            audio_url = None
-        
-        # Log to DB
-        duration_ms = (time.time() - start_time) * 1000
-        interaction = Interaction(
+        # Log to DB (time to first audio chunk)
+        duration_ms = trace.finish()
+        await interaction_writer.submit_async(dict(
             user_text=user_text,
             bot_response=bot_response_text,
-            response_time_ms=duration_ms
-        )
-        db.add(interaction)
-        db.commit()
-        
+            response_time_ms=duration_ms,
+            **trace.interaction_fields()
+        ))
+    except StageOverloaded:
+        raise
+    except Exception as e:
+        print(f"CRITICAL ERROR: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if audio_chunks is None:
         return {
             "user_text": user_text,
             "bot_response": bot_response_text,
-            "audio_url": audio_url
+            "audio_url": None,
+            "session_id": session_id,
+            "degraded": sorted(current_deadline().degraded)
         }
-    except Exception as e:
-        print(f"CRITICAL ERROR: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    return StreamingResponse(
+        audio_chunks,
+        media_type="audio/mpeg",
+        headers={
+            "X-User-Text": quote(user_text),
+            "X-Bot-Response": quote(bot_response_text),
+            "X-TTS-Provider": service_name,
+            "X-Session-ID": session_id
+        }
+    )
 
-@app.get("/api/stats")
-async def get_stats(db: Session = Depends(get_db)):
-    total_queries = db.query(Interaction).count()
-    interactions = db.query(Interaction).all()
-    avg_time = sum([i.response_time_ms for i in interactions]) / total_queries if total_queries > 0 else 0
+# Sentences synthesized ahead of the one the client is waiting for
+SSE_TTS_AHEAD = int(os.getenv("SSE_TTS_AHEAD", "2"))
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/process-text/sse")
+async def process_text_sse(request: TextRequest, http_request: Request):
+    """
+    Pipelined reply over server-sent events. The LLM reply is cut into
+    sentences as it streams, and each sentence goes to TTS while later ones
+    are still being generated. Events, in order:
+      text  {"index", "text"}                 as each sentence is generated
+      audio {"index", "text", "audio_url"}    in sentence order (audio_url
+                                              is null if synthesis failed or
+                                              missed the deadline)
+      done  {"user_text", "bot_response", "session_id", "degraded"}
+    """
+    trace = start_trace("process-text-sse")
+    deadline = start_deadline("process-text-sse", http_request.headers.get(DEADLINE_HEADER))
+    user_text = request.text
+    session_id = session_id_for(http_request, request.session_id)
+    loop = asyncio.get_running_loop()
+    sentences = asyncio.Queue()
+    cancel = threading.Event()
+    
+    def produce():
+        try:
+            for sentence in split_sentences(stream_response(user_text, cancel, session_id)):
+                loop.call_soon_threadsafe(sentences.put_nowait, sentence)
+        except Exception as e:
+            print(f"CRITICAL ERROR: {str(e)}")
+        finally:
+            loop.call_soon_threadsafe(sentences.put_nowait, None)
     
+    # Admission is checked here, so an overloaded NLU stage is still a 503
+    nlu_pool.submit(produce)
+    
+    async def events():
+        texts, audio = [], []       # per sentence: text, TTS future
+        next_audio = 0              # next sentence whose audio is due
+        generating = True
+        next_sentence = asyncio.ensure_future(sentences.get())
+        first_audio_ms = None
+        try:
+            while generating or next_audio < len(texts):
+                # Keep up to SSE_TTS_AHEAD syntheses in flight
+                while len(audio) < len(texts) and len(audio) < next_audio + SSE_TTS_AHEAD:
+                    if deadline.remaining_s() == 0:
+                        # Audio for a sentence after the deadline would never be waited for
+                        deadline.degrade("tts", "no time left to synthesize")
+                        skipped = loop.create_future()
+                        skipped.set_result(None)
+                        audio.append(skipped)
+                        continue
+                    try:
+                        audio.append(tts_pool.submit(text_to_speech, texts[len(audio)]))
+                    except StageOverloaded as e:
+                        failed = loop.create_future()
+                        failed.set_exception(e)
+                        audio.append(failed)
+                
+                # Past the deadline, audio still being synthesized is not waited for
+                # (the reply itself stops at the deadline, see stream_response)
+                overdue = deadline.remaining_s() == 0
+                waiting = [next_sentence] if generating else []
+                if next_audio < len(audio) and not overdue:
+                    waiting.append(audio[next_audio])
+                if waiting:
+                    await asyncio.wait(waiting, timeout=None if overdue else deadline.remaining_s(),
+                                       return_when=asyncio.FIRST_COMPLETED)
+                overdue = deadline.remaining_s() == 0
+                
+                if generating and next_sentence.done():
+                    sentence = next_sentence.result()
+                    if sentence is None:
+                        generating = False
+                        trace.record_stage("nlu", trace.elapsed_ms() / 1000)
+                    else:
+                        yield sse_event("text", {"index": len(texts), "text": sentence})
+                        texts.append(sentence)
+                        next_sentence = asyncio.ensure_future(sentences.get())
+                
+                while next_audio < len(audio) and (audio[next_audio].done() or overdue):
+                    if not audio[next_audio].done():
+                        deadline.degrade("tts", "audio not ready in time")
+                        audio_path = None
+                    else:
+                        try:
+                            audio_path = audio[next_audio].result()
+                        except Exception as e:
+                            print(f"DEBUG: TTS failed for sentence {next_audio}: {e}")
+                            audio_path = None
+                    if first_audio_ms is None:
+                        first_audio_ms = trace.elapsed_ms()
+                        trace.record_stage("tts", first_audio_ms / 1000)
+                    yield sse_event("audio", {
+                        "index": next_audio,
+                        "text": texts[next_audio],
+                        "audio_url": f"/static/audio/{os.path.basename(audio_path)}" if audio_path else None
+                    })
+                    next_audio += 1
+            
+            bot_response_text = " ".join(texts)
+            yield sse_event("done", {
+                "user_text": user_text, "bot_response": bot_response_text, "session_id": session_id,
+                "degraded": sorted(deadline.degraded)
+            })
+            
+            # Log to DB (time to first audio segment)
+            trace.finish()
+            await interaction_writer.submit_async(dict(
+                user_text=user_text,
+                bot_response=bot_response_text,
+                response_time_ms=first_audio_ms,
+                **trace.interaction_fields()
+            ))
+        finally:
+            # Client gone or stream finished: stop generating
+            cancel.set()
+            next_sentence.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-ID": session_id}
+    )
+
+class SpeechRequest(BaseModel):
+    text: str
+    service: str = "auto"
+
+@app.post("/api/tts/stream")
+async def stream_speech(request: SpeechRequest):
+    """Synthesize text and stream the MP3 audio as it is generated"""
+    service_name, audio_chunks = await tts_pool.run(text_to_speech_stream, request.text, request.service)
+    if audio_chunks is None:
+        raise HTTPException(status_code=502, detail="All TTS services failed")
+    return StreamingResponse(
+        audio_chunks,
+        media_type="audio/mpeg",
+        headers={"X-TTS-Provider": service_name}
+    )
+
+@app.get("/api/stats")
+async def get_stats():
+    """
+    Query count and latency percentiles, overall and for the last 5 minutes,
+    hour and day. Served from the latency rollup rows, not a table scan, so
+    every worker process gives the same answer.
+    """
+    stats = await asyncio.to_thread(latency_stats.snapshot)
+    return {
+        "queries": stats["count"],
+        "avgResponseTime": round(stats["avg_ms"]),
+        "p50": stats["p50_ms"],
+        "p95": stats["p95_ms"],
+        "p99": stats["p99_ms"],
+        "windows": stats["windows"]
+    }
+
+@app.get("/api/pipeline")
+async def get_pipeline_stats():
+    """Worker pool queue depth and wait times for each pipeline stage, audio trimmed before STT, deadline budgets and provider clients loaded"""
     return {
-        "queries": total_queries,
-        "avgResponseTime": round(avg_time)
+        **pool_stats(),
+        "interaction_log": interaction_writer.stats(),
+        "transcode": transcoder.stats(),
+        "vad": vad.stats(),
+        "deadline": deadline_stats(),
+        "providers": providers.stats(),
     }
 
+@app.get("/api/tts/cache")
+async def get_tts_cache_stats():
+    """Hit/miss counters and disk usage of the synthesized audio cache, and the janitor's sweeps"""
+    return {**audio_cache.stats(), "janitor": audio_janitor.stats()}
+
+@app.get("/api/nlu/cache")
+async def get_response_cache_stats():
+    """Hit rate, by source, of the reply cache in front of the NLU chain"""
+    return response_cache.stats()
+
+@app.get("/api/nlu/llm")
+async def get_llm_hedging_stats():
+    """Hedge rate, hedge delay and per-backend win rate of the LLM calls"""
+    return llm_hedger.stats()
+
+@app.get("/api/nlu/intents")
+async def get_intent_routing_stats():
+    """Requests per routed intent (account, faq, rule, llm)"""
+    return intent_router.stats()
+
+@app.get("/api/sessions")
+async def get_session_usage():
+    """Number of conversation sessions held and their memory, in aggregate"""
+    return await asyncio.to_thread(session_manager.usage)
+
+@app.delete("/api/sessions/{session_id}")
+async def end_session(session_id: str):
+    if not await asyncio.to_thread(session_manager.store.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
+
+@app.get("/api/providers")
+async def get_provider_routing():
+    """Circuit state, error rate and EWMA latency of every STT/TTS provider"""
+    return routing_state()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latency histograms, fallbacks, FAQ hit rate, errors"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+FAQ_FIELDS = ["id", "question", "answer"]
+ACCOUNT_FIELDS = ["id", "username", "account_number", "email", "phone", "balance", "account_type", "status"]
+
+async def list_rows(request: Request, db: AsyncSession, model, allowed: list, key: str,
+                    cursor: str, limit: int, fields: str, format: str):
+    """
+    Shared body of the listing endpoints: a keyset page as JSON, or every
+    row after the cursor as NDJSON. A page comes with an ETag of its content,
+    and a 304 when the client already has it.
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    columns = parse_fields(fields, model, allowed)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(AsyncSessionLocal, model, columns, cursor),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache"}
+        )
+
+    rows, next_cursor = await fetch_page(db, model, columns, cursor, limit)
+    body = {"count": len(rows), key: rows, "next_cursor": next_cursor}
+    headers = {"ETag": content_etag(body), "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
 @app.get("/api/faqs")
-async def get_faqs(db: Session = Depends(get_db)):
-    """Get all FAQs from the database"""
-    from database import FAQ
-    faqs = db.query(FAQ).all()
-    return {
-        "count": len(faqs),
-        "faqs": [{"id": faq.id, "question": faq.question, "answer": faq.answer} for faq in faqs]
-    }
+async def get_faqs(request: Request, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                   fields: str = None, format: str = "json",
+                   db: AsyncSession = Depends(get_async_db)):
+    """
+    List FAQs by id, one page at a time: pass the returned next_cursor to get
+    the next page. fields=question,answer selects columns; format=ndjson
+    streams every row instead.
+    """
+    return await list_rows(request, db, FAQ, FAQ_FIELDS, "faqs", cursor, limit, fields, format)
 
 @app.get("/api/faqs/{faq_id}")
-async def get_faq(faq_id: int, db: Session = Depends(get_db)):
+async def get_faq(faq_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific FAQ by ID"""
-    from database import FAQ
-    faq = db.query(FAQ).filter(FAQ.id == faq_id).first()
+    faq = await db.get(FAQ, faq_id)
     if not faq:
         raise HTTPException(status_code=404, detail="FAQ not found")
     return {"id": faq.id, "question": faq.question, "answer": faq.answer}
 
 @app.get("/api/accounts")
-async def get_accounts(db: Session = Depends(get_db)):
-    """Get all accounts from the database (for demo purposes)"""
-    from database import Account
-    accounts = db.query(Account).all()
-    return {
-        "count": len(accounts),
-        "accounts": [
-            {
-                "id": acc.id,
-                "username": acc.username,
-                "account_number": acc.account_number,
-                "email": acc.email,
-                "phone": acc.phone,
-                "balance": acc.balance,
-                "account_type": acc.account_type,
-                "status": acc.status
-            } for acc in accounts
-        ]
-    }
+async def get_accounts(request: Request, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                       fields: str = None, format: str = "json",
+                       db: AsyncSession = Depends(get_async_db)):
+    """
+    List accounts (for demo purposes), paginated like /api/faqs.
+    """
+    return await list_rows(request, db, Account, ACCOUNT_FIELDS, "accounts", cursor, limit, fields, format)
 
 @app.get("/api/accounts/{account_id}")
-async def get_account(account_id: int, db: Session = Depends(get_db)):
+async def get_account(account_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific account by ID"""
-    from database import Account
-    account = db.query(Account).filter(Account.id == account_id).first()
+    account = await db.get(Account, account_id)
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     return {
@@ -220,13 +767,12 @@ async def get_account(account_id: int, db: Session = Depends(get_db)):
     }
 
 @app.get("/api/search/faq")
-async def search_faq(q: str, db: Session = Depends(get_db)):
-    """Search FAQs by keyword"""
-    from database import FAQ
-    faqs = db.query(FAQ).filter(FAQ.question.contains(q) | FAQ.answer.contains(q)).all()
+async def search_faq(q: str, limit: int = 10, db: AsyncSession = Depends(get_async_db)):
+    """Search FAQs by keyword, best match first, with matches highlighted"""
+    results = await search_faqs(db, q, max(1, min(limit, 100)))
     return {
         "query": q,
-        "count": len(faqs),
-        "results": [{"id": faq.id, "question": faq.question, "answer": faq.answer} for faq in faqs]
+        "count": len(results),
+        "results": results
     }
 